@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Benchmark of the locus-breaker on a synthetic polygenic trait.
+
+Compares ``gwasstudio.methods.locus_breaker._locus_breaker`` with the previous row-by-row
+implementation, kept below for reference, and checks that both produce the same tables.
+
+Usage:
+    python scripts/benchmark_locus_breaker.py --variants 2000000 --loci 2000
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from gwasstudio.methods.dataframe import process_dataframe
+from gwasstudio.methods.locus_breaker import _locus_breaker
+
+
+def legacy_locus_breaker(
+    tiledb_results_pd, pvalue_limit=3.3, pvalue_sig=5, hole_size=250000, locus_flanks=100000
+) -> list[pd.DataFrame]:
+    """Loop-based locus-breaker used up to version 2.16 (without the phenovar option)."""
+    tiledb_results_pd = tiledb_results_pd.copy()
+    tiledb_results_pd.loc[:, "S"] = 1.0
+    tiledb_results_pd = tiledb_results_pd[tiledb_results_pd["MLOG10P"] > pvalue_limit]
+    trait_res = []
+    trait_res_allsnp = []
+    original_data = tiledb_results_pd.copy()
+    for contig, chrom_df in tiledb_results_pd.groupby("CHR"):
+        group = (chrom_df["POS"].diff() > hole_size).cumsum()
+        for _, group_df in chrom_df.groupby(group):
+            if group_df["MLOG10P"].max() > pvalue_sig:
+                lower_pos = group_df["POS"].min()
+                start_pos = 1 if int(lower_pos) - locus_flanks < 0 else lower_pos - locus_flanks
+                end_pos = group_df["POS"].max() + locus_flanks
+                best_snp = group_df.loc[group_df["MLOG10P"].idxmax()]
+                locus = str(group_df["CHR"].iloc[0]) + ":" + str(start_pos) + ":" + str(end_pos)
+                trait_res.append([best_snp["MLOG10P"]] + best_snp.tolist())
+                expanded_snps = original_data[
+                    (original_data["CHR"] == group_df["CHR"].iloc[0])
+                    & (original_data["POS"] >= start_pos)
+                    & (original_data["POS"] <= end_pos)
+                ].drop(columns=["S"])
+                for _, snp_row in expanded_snps.iterrows():
+                    trait_res_allsnp.append([locus] + snp_row.tolist())
+
+    columns = tiledb_results_pd.columns.tolist()
+    trait_res_df = pd.DataFrame(trait_res, columns=["snp_MLOG10P"] + columns)
+    columns.remove("S")
+    return [trait_res_df, pd.DataFrame(trait_res_allsnp, columns=["locus"] + columns)]
+
+
+def synthetic_trait(n_variants: int, n_loci: int, seed: int = 0) -> pd.DataFrame:
+    """Null background with ``n_loci`` association peaks spread over 22 chromosomes."""
+    rng = np.random.default_rng(seed)
+    chrom = np.sort(rng.integers(1, 23, n_variants)).astype(np.uint8)
+    pos = np.empty(n_variants, dtype=np.uint32)
+    for c in np.unique(chrom):
+        mask = chrom == c
+        pos[mask] = np.sort(rng.choice(np.arange(1, 150_000_000, dtype=np.uint32), mask.sum(), replace=False))
+    mlog10p = -np.log10(rng.uniform(size=n_variants))
+    peaks = rng.choice(n_variants, n_loci, replace=False)
+    for peak in peaks:
+        width = rng.integers(20, 400)
+        window = slice(max(peak - width, 0), min(peak + width, n_variants))
+        distance = np.abs(np.arange(window.start, window.stop) - peak)
+        mlog10p[window] = np.maximum(mlog10p[window], rng.uniform(6, 40) * np.exp(-distance / (width / 4)))
+    df = pd.DataFrame(
+        {
+            "CHR": chrom,
+            "TRAITID": "trait",
+            "POS": pos,
+            "BETA": rng.normal(0, 0.05, n_variants).astype(np.float32),
+            "SE": np.full(n_variants, 0.01, dtype=np.float32),
+            "EAF": rng.uniform(0.01, 0.99, n_variants).astype(np.float32),
+            "EA": rng.choice(["A", "C", "G", "T"], n_variants),
+            "NEA": rng.choice(["A", "C", "G", "T"], n_variants),
+            "MLOG10P": mlog10p.astype(np.float32),
+        }
+    )
+    return process_dataframe(df)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variants", type=int, default=2_000_000, help="Number of variants of the trait")
+    parser.add_argument("--loci", type=int, default=2000, help="Number of association peaks")
+    parser.add_argument("--skip-legacy", action="store_true", help="Only time the current implementation")
+    args = parser.parse_args()
+
+    df = synthetic_trait(args.variants, args.loci)
+    print(f"{len(df)} variants, {(df['MLOG10P'] > 3.3).sum()} above the p-value limit")
+
+    start = time.perf_counter()
+    segments, intervals = _locus_breaker(df)
+    elapsed = time.perf_counter() - start
+    print(f"vectorised: {elapsed:.2f}s ({len(segments)} loci, {len(intervals)} interval SNPs)")
+
+    if not args.skip_legacy:
+        start = time.perf_counter()
+        legacy_segments, legacy_intervals = legacy_locus_breaker(df)
+        legacy_elapsed = time.perf_counter() - start
+        print(f"legacy:     {legacy_elapsed:.2f}s (speed-up: {legacy_elapsed / elapsed:.0f}x)")
+        pd.testing.assert_frame_equal(segments, legacy_segments)
+        pd.testing.assert_frame_equal(intervals, legacy_intervals)
+        print("Outputs are identical")
+
+
+if __name__ == "__main__":
+    main()
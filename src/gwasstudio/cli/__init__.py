@@ -2,6 +2,24 @@ from .export import export
 from .info import info
 from .ingest import ingest
 from .list import list_projects
+from .metadata.index import db_index
+from .metadata.migrate import migrate_metadata
 from .metadata.query import query_metadata
+from .metadata.snapshot import snapshot_metadata
+from .mongo_daemon import mongo_daemon
+from .phewas_index import phewas_index
+from .tophits import tophits
 
-__all__ = ["export", "info", "ingest", "list_projects", "query_metadata"]
+__all__ = [
+    "db_index",
+    "export",
+    "info",
+    "ingest",
+    "list_projects",
+    "migrate_metadata",
+    "mongo_daemon",
+    "phewas_index",
+    "query_metadata",
+    "snapshot_metadata",
+    "tophits",
+]
@@ -1,27 +1,44 @@
-import math
 from pathlib import Path
-from typing import Callable, List, Union
+from typing import Any, List
 
 import click
 import cloup
 import pandas as pd
 import tiledb
 from dask import delayed, compute
+from dask.utils import format_bytes, parse_bytes
 from dask.distributed import Client
 
 from gwasstudio import logger
 from gwasstudio.dask_client import manage_daskcluster, dask_deployment_types
-from gwasstudio.methods.extraction_methods import extract_full_stats, extract_regions_snps, extract_regions_leadsnps
-from gwasstudio.methods.locus_breaker import _process_locusbreaker
-from gwasstudio.methods.meta_analysis import _meta_analysis
+from gwasstudio.methods.extraction_methods import (
+    TraitFrame,
+    extract_full_stats,
+    extract_phewas,
+    extract_regions_leadsnps,
+    extract_regions_snps,
+)
+from gwasstudio.methods.locus_breaker import _process_locusbreaker, locus_table, merge_loci
+from gwasstudio.methods.meta_analysis import _meta_analysis_partition, concat_meta_analysis, meta_analysis_partitions
 from gwasstudio.mongo.models import EnhancedDataProfile
-from gwasstudio.utils import check_file_exists, write_table, write_if_not_empty
-from gwasstudio.utils.cfg import get_mongo_uri, get_tiledb_config, get_dask_batch_size, get_dask_deployment
+from gwasstudio.utils import check_file_exists, clear_dataset, write_dataset_part, write_table, write_if_not_empty
+from gwasstudio.utils.cfg import (
+    get_mongo_uri,
+    get_tiledb_config,
+    get_dask_batch_size,
+    get_dask_config,
+    get_dask_deployment,
+)
 from gwasstudio.utils.enums import MetadataEnum
+from gwasstudio.utils.export_plan import PLAN_COLUMNS, plan_group, suggest_cluster
 from gwasstudio.utils.io import read_to_bed, read_trait_snps
 from gwasstudio.utils.metadata import load_search_topics, query_mongo_obj, dataframe_from_mongo_objs
+from gwasstudio.utils.metadata_snapshot import load_metadata_snapshot, search_metadata_snapshot
 from gwasstudio.utils.mongo_manager import manage_mongo
 from gwasstudio.utils.path_joiner import join_path
+from gwasstudio.utils.tdb_pool import TileDBPoolPlugin, get_array_pool
+from gwasstudio.utils.phewas import has_phewas_index, phewas_uri
+from gwasstudio.utils.tophits import get_tophits_threshold, tophits_uri
 
 
 def create_output_prefix_dict(df: pd.DataFrame, output_prefix: str, source_id_column: str) -> dict:
@@ -70,6 +87,88 @@ def create_output_prefix_dict(df: pd.DataFrame, output_prefix: str, source_id_co
     return output_prefix_dict
 
 
+# Analyses run on each trait of a group. They share a single read of the trait when several are selected.
+TRAIT_ANALYSES = {
+    "full_stats": extract_full_stats,
+    "regions_snps": extract_regions_snps,
+    "regions_leadsnps": extract_regions_leadsnps,
+    "locusbreaker": _process_locusbreaker,
+}
+# Analyses run on all the traits of a group, one task per genome partition.
+GROUP_ANALYSES = {
+    "meta_analysis": _meta_analysis_partition,
+}
+# Output suffixes that keep the outputs of several analyses side by side.
+OUTPUT_SUFFIXES = {
+    "regions_snps": "_regions",
+    "regions_leadsnps": "_leadsnps",
+}
+# Largest number of traits written to each file of the locus-breaker datasets, lowered to the batch size.
+DATASET_PART_TRAITS = 256
+
+
+def _run_analyses(
+    uri: str,
+    cfg: dict[str, str],
+    trait: str,
+    out_prefix: str | None,
+    analyses: dict[str, dict],
+) -> dict[str, Any]:
+    """
+    Open the TileDB array on the worker and run the selected per-trait analyses on ``trait``.
+
+    With more than one analysis, the trait is read once into a :class:`TraitFrame` shared by all of them.
+
+    Returns:
+        dict: Result of each analysis, keyed by its name in ``TRAIT_ANALYSES``.
+    """
+    # Borrow a *read‑only* handle from the worker's pool.
+    with get_array_pool().open(uri, cfg, traits=trait) as arr:
+        source = TraitFrame.read(arr, trait) if len(analyses) > 1 else arr
+        return {name: TRAIT_ANALYSES[name](source, trait, out_prefix, **kwargs) for name, kwargs in analyses.items()}
+
+
+def _run_group_analysis(uri: str, cfg: dict[str, str], traits: List[str], name: str, **kwargs) -> pd.DataFrame:
+    """Open the TileDB array on the worker and run the analysis ``name`` of ``GROUP_ANALYSES`` on all ``traits``."""
+    with get_array_pool().open(uri, cfg, traits=traits) as arr:
+        return GROUP_ANALYSES[name](arr, traits, None, **kwargs)
+
+
+def _compute_in_batches(units: list[tuple[list, list]], batch_size: int, dask_client: Client) -> list:
+    """
+    Compute the units of tasks in batches of about ``batch_size`` tasks, without splitting a unit, so that
+    the tasks sharing a read of the data run in the same batch.
+
+    Each unit is a pair of lists of delayed tasks: the ones run for their outputs, and the ones whose results
+    are collected on the client.
+
+    Returns:
+        list: Collected results, in the order of the units.
+    """
+    batches = []
+    size = 0
+    for unit in units:
+        unit_size = len(unit[0]) + len(unit[1])
+        if not batches or (batch_size > 0 and size + unit_size > batch_size):
+            batches.append([])
+            size = 0
+        batches[-1].append(unit)
+        size += unit_size
+
+    collected = []
+    for batch_no, batch in enumerate(batches, 1):
+        tasks = [task for unit_tasks, _ in batch for task in unit_tasks]
+        kept = [task for _, unit_kept in batch for task in unit_kept]
+        if len(batches) == 1:
+            logger.info(f"Running all tasks in a single batch ({len(tasks) + len(kept)} items)")
+        else:
+            logger.info(f"Running batch {batch_no}/{len(batches)} ({len(tasks) + len(kept)} items)")
+        results = compute(*tasks, *kept, scheduler=dask_client)
+        collected.extend(results[len(tasks) :])
+        logger.info(f"Batch {batch_no} completed.")
+    return collected
+
+
 def _process_function_tasks(
     tiledb_uri: str,
     tiledb_cfg: dict[str, str],
@@ -79,12 +178,10 @@ def _process_function_tasks(
     output_prefix_dict: dict[str, str],
     output_format: str,
     *,
-    function_name: Callable,
-    regions_snps: str | None = None,
-    trait_snps: str | None = None,
+    analyses: dict[str, dict],
     dask_client: Client = None,
     output_prefix=None,
-    **kwargs,
+    dataset_partition: str = "",
 ) -> None:
     """
     Schedule and execute delayed export tasks.
@@ -94,27 +191,19 @@ def _process_function_tasks(
     tiledb_uri : str
         URI of the TileDB array (e.g. ``s3://my-bucket/dataset``).
         The array is opened *inside* each worker, never serialized.
-    function_name : Callable
-        One of the extraction functions (``extract_full_stats``, …).
+    analyses : dict[str, dict]
+        Keyword arguments of each selected analysis, keyed by its name in ``TRAIT_ANALYSES``
+        or ``GROUP_ANALYSES``, plus ``locus_merge`` to merge the loci found by ``locusbreaker``
+        across traits. ``regions_snps`` and ``trait_snps`` are paths to the input files.
+        With ``dataset`` set for ``locusbreaker``, its results are written to the datasets
+        ``{output_prefix}_segments`` and ``{output_prefix}_intervals`` instead of two files per trait.
+    dataset_partition : str
+        Hive-style partition of the group within these datasets, e.g. ``project=p/study=s``.
     """
     # Check Dask client
     if dask_client is None:
         raise ValueError("Missing Dask client")
 
-    # Wrapper that opens the array locally and forwards the call.
-    def _run_extraction(
-        uri: str,
-        cfg: dict[str, str],
-        traits: Union[str, List[str]],
-        out_prefix: str | None,
-        **inner_kwargs,
-    ) -> pd.DataFrame:
-        """Open the TileDB array on the worker and invoke ``function_name``."""
-        # Open a *read‑only* handle on the worker.
-        with tiledb.open(uri, mode="r", config=cfg) as arr:
-            # ``function_name`` expects the opened array as its first argument.
-            return function_name(arr, traits, out_prefix, **inner_kwargs)
-
     def _run_transformation(
         gwas_df: pd.DataFrame, meta_df: pd.DataFrame, trait_id: str, link_ids: list | None = None
     ) -> pd.DataFrame:
@@ -128,123 +217,255 @@ def _process_function_tasks(
         meta_dict = {
             f"meta_{k}": v for k, v in meta_row.drop(["data_id", "output_prefix"], errors="ignore").to_dict().items()
         }
-        if trait_snps:
+        if link_ids is not None:
             meta_dict["meta_link_id"] = "_".join(sorted(map(str, link_ids)))
 
         broadcast = {col: [val] * len(gwas_df) for col, val in meta_dict.items()}
         return gwas_df.assign(**broadcast)
 
-    # Prepare kwargs for the downstream extraction routine.
-    kwargs["attributes"] = attr.split(",") if attr else None
-
-    if regions_snps:
-        kwargs["regions_snps"] = delayed(read_to_bed)(regions_snps)
-    if trait_snps:
-        all_trait_snps = delayed(read_trait_snps)(trait_snps)
+    # Prepare kwargs for the downstream extraction routines.
+    attributes = attr.split(",") if attr else None
+    trait_analyses = {
+        name: {**kwargs, "attributes": attributes} for name, kwargs in analyses.items() if name in TRAIT_ANALYSES
+    }
+    suffixes = OUTPUT_SUFFIXES if len(trait_analyses) > 1 else {}
+    locus_dataset = trait_analyses.get("locusbreaker", {}).pop("dataset", False)
+
+    if "regions_snps" in trait_analyses:
+        trait_analyses["regions_snps"]["regions_snps"] = delayed(read_to_bed)(
+            trait_analyses["regions_snps"]["regions_snps"]
+        )
+    if "regions_leadsnps" in trait_analyses:
+        all_trait_snps = delayed(read_trait_snps)(trait_analyses["regions_leadsnps"].pop("trait_snps"))
 
     trait_id_list = group["data_id"].unique().tolist() if not isinstance(group, pd.Series) else group.unique().tolist()
     # Build the delayed tasks – each task receives the URI, not the object.
-    tasks = []
-    if function_name.__name__ == "_process_locusbreaker":
-        # Locusbreaker returns a tuple (segments, intervals).
-        for trait in trait_id_list:
-            delayed_tuple = delayed(_run_extraction)(
-                tiledb_uri,
-                tiledb_cfg,
-                trait,
-                None,
-                **kwargs,
+    # The tasks of a trait form a unit, run in the same batch so that the trait is read once.
+    units = []
+    locus_results = []
+    for trait in trait_id_list if trait_analyses else []:
+        tasks = []
+        loci = []
+        prefix = output_prefix_dict.get(trait)
+        trait_kwargs = {name: dict(kwargs) for name, kwargs in trait_analyses.items()}
+        link_ids = None
+        if "regions_leadsnps" in trait_kwargs:
+            link_ids = group.loc[group["data_id"] == trait, "link_id"].unique()
+            trait_kwargs["regions_leadsnps"]["trait_snps"] = all_trait_snps[all_trait_snps["SOURCE_ID"].isin(link_ids)]
+        # One read of the trait feeds every analysis.
+        results = delayed(_run_analyses)(tiledb_uri, tiledb_cfg, trait, prefix, trait_kwargs)
+
+        if "full_stats" in trait_analyses:
+            transformed_df = delayed(_run_transformation)(results["full_stats"], group, trait, None)
+            tasks.append(delayed(write_table)(transformed_df, prefix, logger, file_format=output_format, index=False))
+        if "regions_snps" in trait_analyses:
+            # extract_regions_snps returns a tuple (filtered variants, region p-value flags).
+            extracted_df = results["regions_snps"][0]
+            pvalue_filt_df = results["regions_snps"][1]
+            transformed_df = delayed(_run_transformation)(extracted_df, group, trait, None)
+            regions_prefix = f"{prefix}{suffixes.get('regions_snps', '')}"
+            tasks.append(
+                delayed(write_table)(transformed_df, regions_prefix, logger, file_format=output_format, index=False)
             )
-            # Extract the two DataFrames lazily.
-            seg = delayed(lambda t: t[0])(delayed_tuple)
-            intv = delayed(lambda t: t[1])(delayed_tuple)
-
-            # write each DataFrame (still delayed)
+            tasks.append(
+                delayed(write_if_not_empty)(
+                    pvalue_filt_df,
+                    f"{regions_prefix}_pvalue_filt",
+                    logger,
+                    file_format=output_format,
+                    index=False,
+                )
+            )
+        if "regions_leadsnps" in trait_analyses:
+            transformed_df = delayed(_run_transformation)(results["regions_leadsnps"], group, trait, link_ids)
+            tasks.append(
+                delayed(write_table)(
+                    transformed_df,
+                    f"{prefix}{suffixes.get('regions_leadsnps', '')}",
+                    logger,
+                    file_format=output_format,
+                    index=False,
+                )
+            )
+        if "locus_merge" in analyses:
+            # The loci of the trait are collected on the client, to be merged across traits
+            loci.append(delayed(locus_table)(trait, results["locusbreaker"][0], results["locusbreaker"][1]))
+        if "locusbreaker" in trait_analyses and locus_dataset:
+            locus_results.append((trait, results["locusbreaker"]))
+        elif "locusbreaker" in trait_analyses:
+            # Locusbreaker returns a tuple (segments, intervals).
             seg_task = delayed(write_table)(
-                seg,
-                f"{output_prefix_dict.get(trait)}_segments",
-                logger,
-                output_format,
-                index=False,
+                results["locusbreaker"][0], f"{prefix}_segments", logger, file_format=output_format, index=False
             )
             int_task = delayed(write_table)(
-                intv,
-                f"{output_prefix_dict.get(trait)}_intervals",
-                logger,
-                file_format=output_format,
-                index=False,
+                results["locusbreaker"][1], f"{prefix}_intervals", logger, file_format=output_format, index=False
             )
             tasks.extend([seg_task, int_task])
-    elif function_name.__name__ == "_meta_analysis":
-        df_metaanalysis = delayed(_run_extraction)(
-            tiledb_uri,
-            tiledb_cfg,
-            trait_id_list,
-            None,
-            **kwargs,
-        )
+        units.append((tasks, loci))
+
+    if locus_dataset:
+        # Each writer task gathers the loci of a chunk of traits into its own file of the datasets, in the
+        # batch of these traits; a chunk has at most batch_size traits, the files of a previous run are removed
+        part_traits = min(DATASET_PART_TRAITS, batch_size) if batch_size > 0 else DATASET_PART_TRAITS
+        datasets = [join_path(f"{output_prefix}_{name}", dataset_partition) for name in ["segments", "intervals"]]
+        for where in datasets:
+            clear_dataset(where, logger)
+        trait_units, units = units, []
+        for part, i in enumerate(range(0, len(locus_results), part_traits)):
+            chunk = locus_results[i : i + part_traits]
+            tasks = [task for unit_tasks, _ in trait_units[i : i + part_traits] for task in unit_tasks]
+            loci = [task for _, unit_loci in trait_units[i : i + part_traits] for task in unit_loci]
+            for j, where in enumerate(datasets):
+                tasks.append(
+                    delayed(write_dataset_part)({trait: result[j] for trait, result in chunk}, where, part, logger)
+                )
+            units.append((tasks, loci))
+
+    if "meta_analysis" in analyses:
+        # One task per chromosome (or region), each reading only its slice of every trait
+        partitions = [
+            delayed(_run_group_analysis)(
+                tiledb_uri, tiledb_cfg, trait_id_list, "meta_analysis", chrom=chrom, start=start, end=end
+            )
+            for chrom, start, end in meta_analysis_partitions(analyses["meta_analysis"].get("chunk_size", 0))
+        ]
+        df_metaanalysis = delayed(concat_meta_analysis)(partitions)
         result = delayed(write_table)(
             df_metaanalysis, f"{output_prefix}_meta_analysis", logger, file_format=output_format, index=False
         )
-        tasks.append(result)
-    elif function_name.__name__ == "extract_regions_snps":
-        for trait in trait_id_list:
-            extracted_tuple = delayed(_run_extraction)(
-                tiledb_uri,
-                tiledb_cfg,
-                trait,
-                output_prefix_dict.get(trait),
-                **kwargs,
-            )
-            extracted_df = delayed(lambda t: t[0])(extracted_tuple)
-            pvalue_filt_df = delayed(lambda t: t[1])(extracted_tuple)
-            transformed_df = delayed(_run_transformation)(extracted_df, group, trait, None)
-            result = delayed(write_table)(
-                transformed_df,
-                output_prefix_dict.get(trait),
-                logger,
-                file_format=output_format,
-                index=False,
-            )
-            result_pvalue_filt = delayed(write_if_not_empty)(
-                pvalue_filt_df,
-                f"{output_prefix_dict.get(trait)}_pvalue_filt",
-                logger,
-                file_format=output_format,
-                index=False,
-            )
-            tasks.extend([result, result_pvalue_filt])
-    else:
-        for trait in trait_id_list:
-            if trait_snps:
-                link_ids = group.loc[group["data_id"] == trait, "link_id"].unique()
-                kwargs["trait_snps"] = all_trait_snps[all_trait_snps["SOURCE_ID"].isin(link_ids)]
-            extracted_df = delayed(_run_extraction)(
-                tiledb_uri,
-                tiledb_cfg,
-                trait,
-                output_prefix_dict.get(trait),
-                **kwargs,
-            )
-            transformed_df = delayed(_run_transformation)(extracted_df, group, trait, link_ids if trait_snps else None)
-            result = delayed(write_table)(
-                transformed_df, output_prefix_dict.get(trait), logger, file_format=output_format, index=False
-            )
-            tasks.append(result)
+        units.append(([result], []))
 
-    # Handle single-batch case if batch_size <= 0 or len(tasks) <= batch_size
-    if batch_size <= 0 or len(tasks) <= batch_size:
-        logger.info(f"Running all tasks in a single batch ({len(tasks)} items)")
-        compute(*tasks, scheduler=dask_client)
-        logger.info("Single batch completed.", flush=True)
+    trait_loci = _compute_in_batches(units, batch_size, dask_client)
+
+    if "locus_merge" in analyses:
+        # Overlapping loci of all the traits are merged into regions once every trait is done
+        write_table(
+            merge_loci(trait_loci), f"{output_prefix}_locus_regions", logger, file_format=output_format, index=False
+        )
+
+
+def _route_to_tophits(tiledb_uri: str, cfg: dict[str, str], analyses: dict[str, dict], pvalue_thr: float) -> str:
+    """
+    Return the URI of the top hits array of ``tiledb_uri`` if it holds every variant the export needs.
+
+    That is the case when only the full summary statistics are exported, filtered on a threshold at least
+    as high as the one of the top hits array. Otherwise ``tiledb_uri`` is returned.
+    """
+    threshold = get_tophits_threshold(tiledb_uri, cfg)
+    if threshold is None:
+        logger.info(f"{tiledb_uri} has no top hits array")
+    elif set(analyses) != {"full_stats"} or pvalue_thr <= 0 or pvalue_thr < threshold:
+        logger.info(f"Not using the top hits array (MLOG10P > {threshold}): the export needs the full array")
     else:
-        total_batches = math.ceil(len(tasks) / batch_size)
-        for i in range(0, len(tasks), batch_size):
-            batch_no = i // batch_size + 1
-            batch = tasks[i : i + batch_size]
-            logger.info(f"Running batch {batch_no}/{total_batches} ({min(batch_size, len(tasks) - i)} items)")
-            compute(*batch, scheduler=dask_client)
-            logger.info(f"Batch {batch_no} completed.", flush=True)
+        logger.info(f"Reading the top hits array (MLOG10P > {threshold})")
+        return tophits_uri(tiledb_uri)
+    return tiledb_uri
+
+
+def _export_phewas(
+    uri: str,
+    cfg: dict[str, str],
+    meta_df: pd.DataFrame,
+    regions_file: str,
+    attr: str,
+    output_prefix: str,
+    output_format: str,
+    skip_meta: bool,
+) -> None:
+    """
+    Look up the variants or small regions of ``regions_file`` across all the traits of ``meta_df``.
+
+    The lookup runs in the client process, on the PheWAS index of each project/study when it has one,
+    and writes a single table ``{output_prefix}_phewas``.
+    """
+    regions = read_to_bed(regions_file)
+    attributes = attr.split(",") if attr else None
+    dataframes = []
+    for name, group in meta_df.groupby(MetadataEnum.get_tiledb_grouping_fields(), observed=True):
+        tiledb_uri = join_path(uri, "_".join(name))
+        if has_phewas_index(tiledb_uri, cfg):
+            tiledb_uri = phewas_uri(tiledb_uri)
+        else:
+            logger.warning(f"{tiledb_uri} has no PheWAS index: reading every trait of the selected positions")
+        logger.info(f"PheWAS lookup of {len(group)} traits in {tiledb_uri}")
+        with tiledb.open(tiledb_uri, mode="r", ctx=tiledb.Ctx(tiledb.Config(cfg))) as arr:
+            df = extract_phewas(arr, group["data_id"].astype(str).tolist(), regions, attributes=attributes)
+        if not skip_meta:
+            meta = group.drop(columns=["output_prefix"], errors="ignore").astype({"data_id": str})
+            meta = meta.add_prefix("meta_").rename(columns={"meta_data_id": "TRAITID"})
+            df = df.merge(meta, on="TRAITID", how="left")
+        dataframes.append(df)
+
+    result = pd.concat(dataframes, ignore_index=True) if dataframes else pd.DataFrame()
+    write_table(result, f"{output_prefix}_phewas", logger, file_format=output_format, index=False)
+
+
+def _plan_export(
+    uri: str,
+    cfg: dict[str, str],
+    meta_df: pd.DataFrame,
+    analyses: dict[str, dict],
+    attr: str,
+    regions_file: str | None,
+    use_tophits: bool,
+    pvalue_thr: float,
+    dask_cfg: dict,
+    output_prefix: str,
+) -> pd.DataFrame:
+    """
+    Estimate the size of the export of ``meta_df`` without reading any attribute data, log the plan
+    with a suggested cluster size and write the estimates of each trait to ``{output_prefix}_plan.csv``.
+
+    The traits are read whole unless ``regions_snps`` is the only per-trait analysis.
+    """
+    attributes = attr.split(",") if attr else None
+    trait_analyses = [name for name in analyses if name in TRAIT_ANALYSES]
+    regions = read_to_bed(regions_file) if trait_analyses == ["regions_snps"] else None
+    ctx = tiledb.Ctx(tiledb.Config(cfg))
+
+    plans = []
+    n_tasks = task_bytes = 0
+    for name, group in meta_df.groupby(MetadataEnum.get_tiledb_grouping_fields(), observed=True):
+        tiledb_uri = join_path(uri, "_".join(name))
+        if use_tophits:
+            tiledb_uri = _route_to_tophits(tiledb_uri, cfg, analyses, pvalue_thr)
+        if tiledb.object_type(tiledb_uri, ctx=ctx) != "array":
+            logger.warning(f"{tiledb_uri} does not exist, skipping it")
+            continue
+        plan = plan_group(tiledb_uri, cfg, group["data_id"].astype(str).unique().tolist(), attributes, regions)
+        if trait_analyses and not plan.empty:
+            n_tasks += len(plan)
+            task_bytes = max(task_bytes, int(plan["BYTES"].max()))
+        if "meta_analysis" in analyses:
+            # Each partition reads its slice of every trait, the traits being evenly spread over the genome
+            partitions = len(meta_analysis_partitions(analyses["meta_analysis"].get("chunk_size", 0)))
+            n_tasks += partitions
+            task_bytes = max(task_bytes, int(plan["BYTES"].sum()) // partitions)
+        logger.info(
+            f"{tiledb_uri}: {len(plan)} traits, {plan['CELLS'].sum()} cells, "
+            f"{format_bytes(int(plan['BYTES'].sum()))}, {plan['FRAGMENTS'].sum()} fragment reads"
+        )
+        plans.append(plan)
+
+    plan = pd.concat(plans, ignore_index=True) if plans else pd.DataFrame(columns=PLAN_COLUMNS)
+    cluster = suggest_cluster(
+        task_bytes, n_tasks, parse_bytes(dask_cfg["memory_per_worker"]), dask_cfg["cores_per_worker"]
+    )
+    logger.info(
+        f"Export plan: {len(plan)} traits, {plan['CELLS'].sum()} cells, {format_bytes(int(plan['BYTES'].sum()))}, "
+        f"{plan['FRAGMENTS'].sum()} fragment reads in {n_tasks} read tasks"
+    )
+    if not cluster["fits"]:
+        logger.warning(
+            f"The largest task needs about {format_bytes(cluster['task_memory'])}, "
+            f"more than the {dask_cfg['memory_per_worker']} of memory per worker"
+        )
+    logger.info(
+        f"Suggested cluster: {cluster['workers']} workers running {cluster['tasks_per_worker']} tasks each "
+        f"(largest task about {format_bytes(cluster['task_memory'])}), batch size {cluster['batch_size']}"
+    )
+    write_table(plan, f"{output_prefix}_plan", logger, file_format="csv", index=False)
+    return plan
 
 
 HELP_DOC = """
@@ -267,10 +488,32 @@ Export summary statistics from TileDB datasets with various filtering options.
         default="BETA,SE,EAF,MLOG10P,EA,NEA",
         help="string delimited by comma with the attributes to export",
     ),
+    cloup.option(
+        "--fragment-cache-size",
+        default="0",
+        help="Size of the local cache of S3 fragments in the Dask local directory, e.g. 50GiB (default: 0, disabled)",
+    ),
+    cloup.option(
+        "--full-stats",
+        default=False,
+        is_flag=True,
+        help="Export the full summary statistics together with the other selected analyses",
+    ),
+    cloup.option(
+        "--dry-run",
+        default=False,
+        is_flag=True,
+        help="Estimate the size of the export and suggest a cluster size, without exporting anything",
+    ),
 )
 @cloup.option_group(
     "Meta-analysis options",
     cloup.option("--meta-analysis", default=False, is_flag=True, help="Option to run meta-analysis"),
+    cloup.option(
+        "--meta-chunk-size",
+        default=0,
+        help="Size (in bp) of the regions processed by each meta-analysis task (default: 0, whole chromosomes)",
+    ),
 )
 @cloup.option_group(
     "Locusbreaker options",
@@ -298,6 +541,18 @@ Export summary statistics from TileDB datasets with various filtering options.
         default=100000,
         help="Flanking regions (in bp) to extend each locus in both directions (default: 100000)",
     ),
+    cloup.option(
+        "--locus-merge",
+        default=False,
+        is_flag=True,
+        help="Merge the overlapping loci of all the traits into pleiotropic regions (implies --locusbreaker)",
+    ),
+    cloup.option(
+        "--locusbreaker-dataset",
+        default=False,
+        is_flag=True,
+        help="Write the loci of all the traits to two parquet datasets instead of two files per trait",
+    ),
 )
 @cloup.option_group(
     "Regions or SNP ID filtering options",
@@ -324,6 +579,14 @@ Export summary statistics from TileDB datasets with various filtering options.
         help="Estimate effective population size (Work in progress, not fully implemented yet)",
     ),
 )
+@cloup.option_group(
+    "PheWAS options",
+    cloup.option(
+        "--phewas",
+        default=None,
+        help="Bed (or CHR,POS) file with SNPs or small regions to look up across all the selected traits",
+    ),
+)
 @cloup.option_group(
     "Trait-specific lead-SNP search options",
     cloup.option(
@@ -349,6 +612,12 @@ Export summary statistics from TileDB datasets with various filtering options.
         default=0.0,
         help="Minimum -log10(p-value) threshold to filter significant SNPs",
     ),
+    cloup.option(
+        "--use-tophits",
+        default=False,
+        is_flag=True,
+        help="Read the top hits array instead of the full one when --pvalue-thr is at least its threshold",
+    ),
 )
 @cloup.option_group(
     "Option to plot results",
@@ -383,6 +652,11 @@ Export summary statistics from TileDB datasets with various filtering options.
         is_flag=True,
         help="Perform exact match on query values (default: False).",
     ),
+    cloup.option(
+        "--metadata-snapshot",
+        default=None,
+        help="Search the metadata snapshot written by meta-snapshot at this path, instead of MongoDB",
+    ),
 )
 @click.pass_context
 def export(
@@ -392,18 +666,26 @@ def export(
     attr: str,
     output_prefix: str,
     output_format: str,
+    fragment_cache_size: str,
+    full_stats: bool,
+    dry_run: bool,
     pvalue_sig: float,
     pvalue_limit: float,
     pvalue_thr: float,
+    use_tophits: bool,
     hole_size: int,
     phenovar: bool,
     nest: bool,
     maf: float,
     locus_flanks: int,
     locusbreaker: bool,
+    locus_merge: bool,
+    locusbreaker_dataset: bool,
     meta_analysis: bool,
+    meta_chunk_size: int,
     get_regions_snps: str | None,
     pvalue_filt: float,
+    phewas: str | None,
     get_regions_leadsnps: str | None,
     cis_flanks: int,
     trans_flanks: int,
@@ -413,6 +695,7 @@ def export(
     s_value: int,
     case_sensitive: bool,
     exact_match: bool,
+    metadata_snapshot: str | None,
 ) -> None:
     """Export summary statistics based on selected options."""
     cfg = get_tiledb_config(ctx)
@@ -433,11 +716,19 @@ def export(
                 "Plotting option is enabled but too many data_ids are provided in the search file. Please limit to 20 data_ids."
             )
             exit(1)
-    # Query MongoDB
-    with manage_mongo(ctx):
-        mongo_uri = get_mongo_uri(ctx)
-        obj = EnhancedDataProfile(uri=mongo_uri)
-        objs = query_mongo_obj(search_topics, obj, case_sensitive=case_sensitive, exact_match=exact_match)
+    # Query MongoDB, or the metadata snapshot
+    if metadata_snapshot:
+        if not check_file_exists(metadata_snapshot, logger):
+            exit(1)
+        snapshot = load_metadata_snapshot(metadata_snapshot)
+        objs = search_metadata_snapshot(snapshot, search_topics, case_sensitive, exact_match)
+    else:
+        with manage_mongo(ctx):
+            mongo_uri = get_mongo_uri(ctx)
+            obj = EnhancedDataProfile(uri=mongo_uri)
+            objs = query_mongo_obj(
+                search_topics, obj, case_sensitive=case_sensitive, exact_match=exact_match, fields=output_fields
+            )
 
     if get_regions_leadsnps:
         meta_df = dataframe_from_mongo_objs(output_fields, objs, search_topics=search_topics, exact_match=exact_match)
@@ -455,18 +746,81 @@ def export(
     source_id_column = MetadataEnum.get_source_id_field()
     output_prefix_dict = create_output_prefix_dict(meta_df, output_prefix, source_id_column=source_id_column)
 
+    # Collect the selected analyses; full summary statistics are exported when none is selected
+    analyses = {}
+    locusbreaker = locusbreaker or locus_merge
+    if full_stats or not (locusbreaker or get_regions_snps or get_regions_leadsnps or meta_analysis or phewas):
+        analyses["full_stats"] = dict(pvalue_thr=pvalue_thr, plot_out=plot_out, color_thr=color_thr, s_value=s_value)
+    if get_regions_snps:
+        analyses["regions_snps"] = dict(
+            regions_snps=get_regions_snps,
+            pvalue_filt=pvalue_filt,
+            plot_out=plot_out,
+            color_thr=color_thr,
+            s_value=s_value,
+        )
+    if get_regions_leadsnps:
+        analyses["regions_leadsnps"] = dict(
+            trait_snps=get_regions_leadsnps, cis_flanks=cis_flanks, trans_flanks=trans_flanks
+        )
+    if locusbreaker:
+        analyses["locusbreaker"] = dict(
+            maf=maf,
+            hole_size=hole_size,
+            pvalue_sig=pvalue_sig,
+            pvalue_limit=pvalue_limit,
+            phenovar=phenovar,
+            locus_flanks=locus_flanks,
+            dataset=locusbreaker_dataset,
+        )
+    if locus_merge:
+        analyses["locus_merge"] = {}
+    if meta_analysis:
+        analyses["meta_analysis"] = dict(chunk_size=meta_chunk_size)
+    logger.info(f"Selected analyses: {', '.join(analyses)}")
+
+    if dry_run:
+        _plan_export(
+            uri,
+            cfg,
+            meta_df,
+            analyses,
+            attr,
+            get_regions_snps,
+            use_tophits,
+            pvalue_thr,
+            get_dask_config(ctx),
+            output_prefix,
+        )
+        return
+
+    if phewas:
+        # Lookups of a few variants do not need the Dask cluster
+        _export_phewas(uri, cfg, meta_df, phewas, attr, output_prefix, output_format, skip_meta)
+        if not analyses:
+            return
+
     # Process according to selected options
     if get_dask_deployment(ctx) not in dask_deployment_types:
         logger.error(f"A valid dask deployment type must be set from: {dask_deployment_types}")
         raise SystemExit(1)
 
     with manage_daskcluster(ctx) as client:
+        # Keep TileDB contexts and array handles open on the workers across tasks
+        client.register_plugin(
+            TileDBPoolPlugin(
+                cache_size=parse_bytes(fragment_cache_size),
+                cache_dir=get_dask_config(ctx).get("local_directory"),
+            )
+        )
         batch_size = get_dask_batch_size(ctx)
         grouped = meta_df.groupby(MetadataEnum.get_tiledb_grouping_fields(), observed=False)
         for name, group in grouped:
             group_name = "_".join(name)
             logger.info(f"Processing the group {group_name}")
             tiledb_uri = join_path(uri, group_name)
+            if use_tophits:
+                tiledb_uri = _route_to_tophits(tiledb_uri, cfg, analyses, pvalue_thr)
             logger.debug(f"tiledb_uri: {tiledb_uri}")
 
             # Build a per‑group output‑prefix dict
@@ -488,54 +842,12 @@ def export(
                 output_format,
             ]
 
-            # Dispatch the appropriate extraction routine
-            match (locusbreaker, get_regions_snps, get_regions_leadsnps, meta_analysis):
-                case (True, _, _, _):
-                    _process_function_tasks(
-                        *common_args,
-                        function_name=_process_locusbreaker,
-                        maf=maf,
-                        hole_size=hole_size,
-                        pvalue_sig=pvalue_sig,
-                        pvalue_limit=pvalue_limit,
-                        phenovar=phenovar,
-                        locus_flanks=locus_flanks,
-                        dask_client=client,
-                    )
-                case (_, str() as bed_fp, _, _):
-                    _process_function_tasks(
-                        *common_args,
-                        function_name=extract_regions_snps,
-                        regions_snps=bed_fp,
-                        pvalue_filt=pvalue_filt,
-                        plot_out=plot_out,
-                        color_thr=color_thr,
-                        s_value=s_value,
-                        dask_client=client,
-                    )
-                case (_, _, str() as traitsnp_fp, _):
-                    _process_function_tasks(
-                        *common_args,
-                        function_name=extract_regions_leadsnps,
-                        trait_snps=traitsnp_fp,
-                        cis_flanks=cis_flanks,
-                        trans_flanks=trans_flanks,
-                        dask_client=client,
-                    )
-                case (_, _, _, True):
-                    _process_function_tasks(
-                        *common_args,
-                        function_name=_meta_analysis,
-                        output_prefix=output_prefix,
-                        dask_client=client,
-                    )
-                case _:
-                    _process_function_tasks(
-                        *common_args,
-                        function_name=extract_full_stats,
-                        pvalue_thr=pvalue_thr,
-                        plot_out=plot_out,
-                        color_thr=color_thr,
-                        s_value=s_value,
-                        dask_client=client,
-                    )
+            _process_function_tasks(
+                *common_args,
+                analyses=analyses,
+                output_prefix=output_prefix,
+                dask_client=client,
+                dataset_partition="/".join(
+                    f"{field}={value}" for field, value in zip(MetadataEnum.get_tiledb_grouping_fields(), name)
+                ),
+            )
@@ -16,11 +16,13 @@ from gwasstudio.utils.cfg import (
     get_mongo_uri,
 )
 from gwasstudio.utils.enums import MetadataEnum
-from gwasstudio.utils.metadata import load_metadata, ingest_metadata
+from gwasstudio.utils.metadata import load_metadata, ingest_metadata, ingest_trait_stats
 from gwasstudio.utils.mongo_manager import manage_mongo
 from gwasstudio.utils.path_joiner import join_path
+from gwasstudio.utils.phewas import consolidate_phewas_index, resolve_phewas_index
 from gwasstudio.utils.s3 import does_uri_path_exist
 from gwasstudio.utils.tdb_schema import TileDBSchemaCreator
+from gwasstudio.utils.tophits import resolve_tophits_threshold
 
 help_doc = """
 Ingest data in a TileDB-unified dataset.
@@ -51,15 +53,41 @@ Ingest data in a TileDB-unified dataset.
         default="both",
         help="Choose between metadata ingestion, data ingestion, or both.",
     ),
+    cloup.option(
+        "--bulk-metadata",
+        is_flag=True,
+        default=False,
+        help="Upsert the metadata documents in bulk batches over a single connection, instead of one at a time",
+    ),
+    cloup.option(
+        "--create-indexes",
+        is_flag=True,
+        default=False,
+        help="Create the missing indexes of the metadata collection before the ingestion",
+    ),
     cloup.option(
         "--pvalue",
         is_flag=True,
         default=True,
         help="Indicate whether to ingest the p-value from the summary statistics instead of calculating it (Default: True).",
     ),
+    cloup.option(
+        "--tophits-thr",
+        type=float,
+        default=None,
+        help="Also store the variants with a -log10(p-value) above this threshold in a top hits array, e.g. 5",
+    ),
+    cloup.option(
+        "--phewas-index",
+        is_flag=True,
+        default=False,
+        help="Also store the data in a variant-major PheWAS index, for lookups of variants across traits",
+    ),
 )
 @click.pass_context
-def ingest(ctx, file_path, delimiter, uri, ingestion_type, pvalue):
+def ingest(
+    ctx, file_path, delimiter, uri, ingestion_type, bulk_metadata, create_indexes, pvalue, tophits_thr, phewas_index
+):
     """
     Ingest data into a TileDB-unified dataset.
 
@@ -73,7 +101,11 @@ def ingest(ctx, file_path, delimiter, uri, ingestion_type, pvalue):
         delimiter (str): Character or regex pattern to treat as the delimiter.
         uri (str): Destination path where to store the tiledb dataset.
         ingestion_type (str): Choose between metadata ingestion, data ingestion, or both.
+        bulk_metadata (bool): Upsert the metadata documents in bulk batches.
+        create_indexes (bool): Create the missing indexes of the metadata collection before the ingestion.
         pvalue (bool): Indicate whether to ingest the p-value from the summary statistics instead of calculating it.
+        tophits_thr (float): Threshold of the top hits array created with a new TileDB dataset.
+        phewas_index (bool): Whether to create a PheWAS index with a new TileDB dataset.
 
     Raises:
         ValueError: If the file does not exist or required columns are missing.
@@ -94,10 +126,11 @@ def ingest(ctx, file_path, delimiter, uri, ingestion_type, pvalue):
     if ingestion_type in ["metadata", "both"]:
         with manage_mongo(ctx):
             mongo_uri = get_mongo_uri(ctx)
-            ingest_metadata(df, mongo_uri)
+            ingest_metadata(df, mongo_uri, bulk=bulk_metadata, with_indexes=create_indexes)
 
     if ingestion_type in ["data", "both"]:
         scheme, netloc, path = parse_uri(uri)
+        trait_stats = {}
         with manage_daskcluster(ctx):
             grouped = df.groupby(MetadataEnum.get_tiledb_grouping_fields(), observed=False)
             for name, group in grouped:
@@ -107,15 +140,23 @@ def ingest(ctx, file_path, delimiter, uri, ingestion_type, pvalue):
                 tiledb_uri = join_path(uri, group_name)
                 logger.debug(f"tiledb_uri: {tiledb_uri}")
                 if scheme == "s3":
-                    ingest_to_s3(ctx, input_file_list, tiledb_uri, pvalue)
+                    stats = ingest_to_s3(ctx, input_file_list, tiledb_uri, pvalue, tophits_thr, phewas_index)
                 else:
                     # Assuming file system ingestion if not S3
-                    ingest_to_fs(ctx, input_file_list, tiledb_uri, pvalue)
+                    stats = ingest_to_fs(ctx, input_file_list, tiledb_uri, pvalue, tophits_thr, phewas_index)
+                trait_stats[name] = stats
+
+        if ingestion_type == "both":
+            # With the data only, the statistics stay in the metadata of the TileDB datasets
+            with manage_mongo(ctx):
+                mongo_uri = get_mongo_uri(ctx)
+                for name, stats in trait_stats.items():
+                    ingest_trait_stats(dict(zip(MetadataEnum.get_tiledb_grouping_fields(), name)), stats, mongo_uri)
 
         logger.info("Ingestion done")
 
 
-def ingest_to_s3(ctx, input_file_list, uri, pvalue):
+def ingest_to_s3(ctx, input_file_list, uri, pvalue, tophits_thr=None, phewas_index=False):
     """
     Ingest data into an S3-based TileDB dataset.
 
@@ -127,12 +168,21 @@ def ingest_to_s3(ctx, input_file_list, uri, pvalue):
         input_file_list (list): List of file paths to be ingested.
         uri (str): Destination path where to store the tiledb dataset in S3.
         pvalue (bool): Indicate whether to ingest the p-value from the summary statistics instead of calculating it.
+        tophits_thr (float): Threshold of the top hits array to create with a new dataset.
+        phewas_index (bool): Whether to create a PheWAS index with a new dataset.
+
+    Returns:
+        dict: The summary statistics of each ingested trait, by TRAITID.
     """
     cfg = get_tiledb_config(ctx)
 
-    if not does_uri_path_exist(uri, cfg):
+    new_array = not does_uri_path_exist(uri, cfg)
+    if new_array:
         logger.info("Creating TileDB schema")
         TileDBSchemaCreator(uri, cfg, pvalue).create_schema()
+    tophits_thr = resolve_tophits_threshold(uri, cfg, tophits_thr, new_array)
+    phewas_index = resolve_phewas_index(uri, cfg, phewas_index, new_array, pvalue)
+    trait_stats = {}
 
     if get_dask_deployment(ctx) in dask_deployment_types:
         batch_size = get_dask_batch_size(ctx, capacity_mode=True)
@@ -148,23 +198,27 @@ def ingest_to_s3(ctx, input_file_list, uri, pvalue):
                 logger.warning(f"Skipping files: {skipped_files}")
             # Create a list of delayed tasks
             tasks = [
-                delayed(process_and_ingest)(file_path, uri, cfg, pvalue)
+                delayed(process_and_ingest)(file_path, uri, cfg, pvalue, tophits_thr, phewas_index)
                 for file_path in batch_files
                 if batch_files[file_path]
             ]
             # Submit tasks and wait for completion
-            compute(*tasks)
+            trait_stats.update(compute(*tasks))
             logger.info(f"Batch {batch_no} completed.", flush=True)
     else:
         for file_path in input_file_list:
             if Path(file_path).exists():
                 logger.debug(f"processing {file_path}")
-                process_and_ingest(file_path, uri, cfg, pvalue)
+                trait_id, stats = process_and_ingest(file_path, uri, cfg, pvalue, tophits_thr, phewas_index)
+                trait_stats[trait_id] = stats
             else:
                 logger.warning(f"skipping {file_path}")
+    if phewas_index:
+        consolidate_phewas_index(uri, cfg)
+    return trait_stats
 
 
-def ingest_to_fs(ctx, input_file_list, uri, pvalue):
+def ingest_to_fs(ctx, input_file_list, uri, pvalue, tophits_thr=None, phewas_index=False):
     """
     Ingest data into a local file system-based TileDB dataset.
 
@@ -176,12 +230,21 @@ def ingest_to_fs(ctx, input_file_list, uri, pvalue):
         input_file_list (list): List of file paths to be ingested.
         uri (str): Destination path where to store the tiledb dataset in the local file system.
         pvalue (bool): Indicate whether to ingest the p-value from the summary statistics instead of calculating it.
+        tophits_thr (float): Threshold of the top hits array to create with a new dataset.
+        phewas_index (bool): Whether to create a PheWAS index with a new dataset.
+
+    Returns:
+        dict: The summary statistics of each ingested trait, by TRAITID.
     """
     cfg = get_tiledb_sm_config()
     _, __, path = parse_uri(uri)
-    if not Path(path).exists():
+    new_array = not Path(path).exists()
+    if new_array:
         logger.info("Creating TileDB schema")
         TileDBSchemaCreator(uri, {}, pvalue).create_schema()
+    tophits_thr = resolve_tophits_threshold(uri, {}, tophits_thr, new_array)
+    phewas_index = resolve_phewas_index(uri, {}, phewas_index, new_array, pvalue)
+    trait_stats = {}
 
     if get_dask_deployment(ctx) in dask_deployment_types:
         batch_size = get_dask_batch_size(ctx, capacity_mode=True)
@@ -197,17 +260,21 @@ def ingest_to_fs(ctx, input_file_list, uri, pvalue):
                 logger.warning(f"Skipping files: {skipped_files}")
             # Create a list of delayed tasks
             tasks = [
-                delayed(process_and_ingest)(file_path, uri, cfg, pvalue)
+                delayed(process_and_ingest)(file_path, uri, cfg, pvalue, tophits_thr, phewas_index)
                 for file_path in batch_files
                 if batch_files[file_path]
             ]
             # Submit tasks and wait for completion
-            compute(*tasks)
+            trait_stats.update(compute(*tasks))
             logger.info(f"Batch {batch_no} completed.", flush=True)
     else:
         for file_path in input_file_list:
             if Path(file_path).exists():
                 logger.debug(f"processing {file_path}")
-                process_and_ingest(file_path, uri, {}, pvalue)
+                trait_id, stats = process_and_ingest(file_path, uri, {}, pvalue, tophits_thr, phewas_index)
+                trait_stats[trait_id] = stats
             else:
                 logger.warning(f"{file_path} not found. Skipping it")
+    if phewas_index:
+        consolidate_phewas_index(uri, {})
+    return trait_stats
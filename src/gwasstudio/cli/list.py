@@ -7,39 +7,40 @@ import cloup
 from gwasstudio.config_manager import ConfigurationManager
 from gwasstudio.mongo.models import EnhancedDataProfile
 from gwasstudio.utils.cfg import get_mongo_uri
-from gwasstudio.utils.metadata import query_mongo_obj
 from gwasstudio.utils.mongo_manager import manage_mongo
 
 HELP_DOC = """List every category → project → study hierarchy stored in the MongoDB."""
 
 
-def _collect_objects(cm: ConfigurationManager, profile: EnhancedDataProfile) -> list[dict]:
+def _count_studies(cm: ConfigurationManager, profile: EnhancedDataProfile) -> list[dict]:
     """
-    Query MongoDB for all objects belonging to the data‑categories defined in
-    ``cm`` and return them as a flat list of dictionaries.
+    Count the documents of each category, project and study, for the data-categories defined in ``cm``.
+
+    The documents are grouped by MongoDB with a single aggregation, so that only the groups are returned.
     """
     categories = cm.get_data_category_list
-    return [obj for cat in categories for obj in query_mongo_obj({"category": cat}, profile)]
+    if not categories:
+        return []
+    return profile.count_by(["category", "project", "study"], {"category": {"$in": list(categories)}})
 
 
-def _build_category_map(objs: Iterable[dict]) -> dict[str, dict[str, set[str]]]:
+def _build_category_tree(groups: Iterable[dict]) -> dict[str, dict[str, dict[str, int]]]:
     """
-    Transform a flat list of MongoDB objects into a nested mapping::
+    Transform the counts of :func:`_count_studies` into a nested mapping::
 
         {
             "category": {
-                "project": {"study1", "study2", ...},
+                "project": {"study1": count1, "study2": count2, ...},
                 ...
             },
             ...
         }
-
-    ``defaultdict`` removes the need for repeated ``if key not in …`` checks.
     """
-    cat_map: defaultdict[str, defaultdict[str, set[str]]] = defaultdict(lambda: defaultdict(set))
-    for obj in objs:
-        cat_map[obj["category"]][obj["project"]].add(obj["study"])
-    return cat_map
+    tree: defaultdict[str, defaultdict[str, dict[str, int]]] = defaultdict(lambda: defaultdict(dict))
+    for group in groups:
+        studies = tree[group["category"]][group["project"]]
+        studies[group["study"]] = studies.get(group["study"], 0) + group["count"]
+    return tree
 
 
 @cloup.command("list", no_args_is_help=False, help=HELP_DOC)
@@ -47,7 +48,7 @@ def _build_category_map(objs: Iterable[dict]) -> dict[str, dict[str, set[str]]]:
 def list_projects(ctx: click.Context) -> None:
     """
     List every *category → project → study* hierarchy stored in the MongoDB
-    configured for the current Click context.
+    configured for the current Click context, with the number of documents of each node.
     """
     cm = ConfigurationManager()
 
@@ -55,12 +56,13 @@ def list_projects(ctx: click.Context) -> None:
         mongo_uri = get_mongo_uri(ctx)
         profile = EnhancedDataProfile(uri=mongo_uri)
 
-        raw_objects = _collect_objects(cm, profile)
+        groups = _count_studies(cm, profile)
 
-    cat_map = _build_category_map(raw_objects)
+    tree = _build_category_tree(groups)
 
-    for category, projects in cat_map.items():
-        click.echo(f"Category: {category}")
+    for category, projects in tree.items():
+        total = sum(count for studies in projects.values() for count in studies.values())
+        click.echo(f"Category: {category} ({total})")
         for project, studies in projects.items():
-            studies_str = ", ".join(sorted(studies))
-            click.echo(f"  Project: {project}\n\tStudies: {studies_str}")
+            studies_str = ", ".join(f"{study} ({count})" for study, count in sorted(studies.items()))
+            click.echo(f"  Project: {project} ({sum(studies.values())})\n\tStudies: {studies_str}")
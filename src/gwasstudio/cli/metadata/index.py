@@ -0,0 +1,40 @@
+import click
+import cloup
+
+from gwasstudio.mongo.connection_manager import get_mec
+from gwasstudio.mongo.indexes import create_indexes, index_status
+from gwasstudio.mongo.models import DataProfile
+from gwasstudio.utils.cfg import get_mongo_uri
+from gwasstudio.utils.mongo_manager import manage_mongo
+
+help_doc = """
+Show or create the indexes of the metadata collection
+"""
+
+
+@cloup.command("db-index", no_args_is_help=False, help=help_doc)
+@cloup.option("--create", default=False, is_flag=True, help="Create the missing indexes")
+@click.pass_context
+def db_index(ctx, create):
+    """
+    Shows the indexes declared on the metadata records and whether they exist in the collection.
+
+    The indexes are created once, with ``--create`` or by ``gwasstudio ingest --create-indexes``; on a
+    large collection, their creation can take a while.
+
+    Args:
+        ctx (click.Context): Click context object
+        create (bool): Create the missing indexes before showing them
+
+    Returns:
+        None
+    """
+    with manage_mongo(ctx):
+        with get_mec(uri=get_mongo_uri(ctx)):
+            if create:
+                click.echo(f"{create_indexes(DataProfile)} indexes created")
+            indexes = index_status(DataProfile)
+
+    for index in indexes:
+        keys = ", ".join(f"{field}: {direction}" for field, direction in index["keys"])
+        click.echo(f"{index['status']:<8} {index['name']}  {{{keys}}}")
@@ -0,0 +1,46 @@
+import click
+import cloup
+
+from gwasstudio.utils.cfg import get_mongo_uri
+from gwasstudio.utils.metadata import BULK_BATCH_SIZE, migrate_json_fields
+from gwasstudio.utils.mongo_manager import manage_mongo
+
+help_doc = """
+Migrate the JSON fields (trait, total, notes, stats) of the metadata records between JSON strings and
+embedded documents
+"""
+
+
+@cloup.command("meta-migrate", no_args_is_help=True, help=help_doc)
+@cloup.option(
+    "--to",
+    "target",
+    required=True,
+    type=click.Choice(["embedded", "json"]),
+    help="Store the JSON fields as embedded documents, indexed and filtered server-side, or as JSON strings",
+)
+@cloup.option(
+    "--batch-size",
+    default=BULK_BATCH_SIZE,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of records updated by each bulk write",
+)
+@click.pass_context
+def migrate_metadata(ctx, target, batch_size):
+    """
+    Converts the JSON fields of the existing metadata records to the storage selected by ``--to``.
+
+    Set the ``embedded_json`` option of the MongoDB configuration to match the new storage: records
+    stored in the other format are not matched by the metadata queries.
+
+    Args:
+        ctx (click.Context): Click context object
+        target (str): Storage of the JSON fields, ``embedded`` or ``json``
+        batch_size (int): Number of records updated by each bulk write
+
+    Returns:
+        None
+    """
+    with manage_mongo(ctx):
+        migrate_json_fields(target == "embedded", get_mongo_uri(ctx), batch_size)
@@ -8,6 +8,7 @@ from gwasstudio.mongo.models import EnhancedDataProfile
 from gwasstudio.utils import check_file_exists, write_table
 from gwasstudio.utils.cfg import get_mongo_uri
 from gwasstudio.utils.metadata import load_search_topics, query_mongo_obj, dataframe_from_mongo_objs
+from gwasstudio.utils.metadata_snapshot import load_metadata_snapshot, search_metadata_snapshot
 from gwasstudio.utils.mongo_manager import manage_mongo
 
 help_doc = """
@@ -20,8 +21,19 @@ Query metadata records from MongoDB
 @cloup.option("--output-prefix", default="out", help="Prefix to be used for naming the output files")
 @cloup.option("--case-sensitive", default=False, is_flag=True, help="Enable case sensitive search")
 @cloup.option("--exact-match", default=False, is_flag=True, help="Enable exact match search")
+@cloup.option(
+    "--explain",
+    default=False,
+    is_flag=True,
+    help="Log the query plan and whether the query is covered by an index (enabled by --verbosity loud)",
+)
+@cloup.option(
+    "--metadata-snapshot",
+    default=None,
+    help="Search the metadata snapshot written by meta-snapshot at this path, instead of MongoDB",
+)
 @click.pass_context
-def query_metadata(ctx, search_file, output_prefix, case_sensitive, exact_match):
+def query_metadata(ctx, search_file, output_prefix, case_sensitive, exact_match, explain, metadata_snapshot):
     """
     Queries metadata records from MongoDB based on the search topics specified in the provided template file.
 
@@ -34,6 +46,8 @@ def query_metadata(ctx, search_file, output_prefix, case_sensitive, exact_match)
         output_prefix (str): Path to write the query results to
         case_sensitive (bool): Enable case-sensitive search
         exact_match (bool): Enable exact match search
+        explain (bool): Log the query plan
+        metadata_snapshot (str): Path of a metadata snapshot to search instead of MongoDB
 
     Returns:
         None
@@ -45,10 +59,24 @@ def query_metadata(ctx, search_file, output_prefix, case_sensitive, exact_match)
     search_topics, output_fields = load_search_topics(search_file)
     logger.debug(search_topics)
 
-    with manage_mongo(ctx):
-        mongo_uri = get_mongo_uri(ctx)
-        obj = EnhancedDataProfile(uri=mongo_uri)
-        objs = query_mongo_obj(search_topics, obj, case_sensitive=case_sensitive, exact_match=exact_match)
+    if metadata_snapshot:
+        if not check_file_exists(metadata_snapshot, logger):
+            exit(1)
+        snapshot = load_metadata_snapshot(metadata_snapshot)
+        objs = search_metadata_snapshot(snapshot, search_topics, case_sensitive, exact_match)
+    else:
+        with manage_mongo(ctx):
+            mongo_uri = get_mongo_uri(ctx)
+            obj = EnhancedDataProfile(uri=mongo_uri)
+            explain = explain or ctx.find_root().params.get("verbosity") == "loud"
+            objs = query_mongo_obj(
+                search_topics,
+                obj,
+                case_sensitive=case_sensitive,
+                exact_match=exact_match,
+                explain=explain,
+                fields=output_fields,
+            )
 
     # write metadata query result
     path = Path(output_prefix)
@@ -0,0 +1,36 @@
+import click
+import cloup
+
+from gwasstudio.utils.cfg import get_mongo_uri
+from gwasstudio.utils.metadata_snapshot import write_metadata_snapshot
+from gwasstudio.utils.mongo_manager import manage_mongo
+
+help_doc = """
+Write a snapshot of the metadata records to a parquet file, to search them without MongoDB
+"""
+
+
+@cloup.command("meta-snapshot", no_args_is_help=False, help=help_doc)
+@cloup.option(
+    "--output",
+    default="metadata_snapshot.parquet",
+    show_default=True,
+    help="Path of the parquet file to write the metadata records to",
+)
+@click.pass_context
+def snapshot_metadata(ctx, output):
+    """
+    Writes all the metadata records to a parquet file.
+
+    The snapshot is searched by the ``--metadata-snapshot`` option of ``export`` and ``meta-query``,
+    which then run without MongoDB. Write a new snapshot after each metadata ingestion.
+
+    Args:
+        ctx (click.Context): Click context object
+        output (str): Path of the parquet file
+
+    Returns:
+        None
+    """
+    with manage_mongo(ctx):
+        write_metadata_snapshot(output, get_mongo_uri(ctx))
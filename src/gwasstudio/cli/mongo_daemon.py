@@ -0,0 +1,30 @@
+import click
+import cloup
+
+from gwasstudio.utils.mongo_manager import MongoDBManager
+
+HELP_DOC = """
+Show or stop the embedded MongoDB daemon, started by the commands run with --mongo-deployment daemon
+"""
+
+
+@cloup.command("mongo-daemon", no_args_is_help=False, help=HELP_DOC)
+@cloup.option("--stop", default=False, is_flag=True, help="Stop the daemon")
+def mongo_daemon(stop: bool) -> None:
+    """
+    Show whether the embedded MongoDB daemon of this node is running, or stop it.
+
+    With ``--mongo-deployment daemon``, the first command starts the embedded server and the next ones,
+    including concurrent ones, reuse it instead of starting their own.
+    """
+    mdb = MongoDBManager(daemon=True)
+    if stop:
+        stopped = mdb.stop_daemon()
+        click.echo("MongoDB daemon stopped" if stopped else "No MongoDB daemon running")
+        return
+    pid = mdb.daemon_pid()
+    if pid is None:
+        click.echo("No MongoDB daemon running")
+    else:
+        status = "ready" if mdb.ping() else "not answering"
+        click.echo(f"MongoDB daemon running (pid {pid}, port {mdb.port}, {status})")
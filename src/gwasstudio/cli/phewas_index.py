@@ -0,0 +1,32 @@
+import click
+import cloup
+
+from gwasstudio.utils.cfg import get_tiledb_config
+from gwasstudio.utils.phewas import backfill_phewas_index
+
+HELP_DOC = """
+Build the variant-major PheWAS index of existing TileDB datasets, replacing any previous one.
+"""
+
+
+@cloup.command("phewas-index", no_args_is_help=True, help=HELP_DOC)
+@cloup.option_group(
+    "PheWAS index options",
+    cloup.option(
+        "--uri",
+        required=True,
+        multiple=True,
+        help="URI of a project/study TileDB dataset, e.g. s3://tiledb/project_study. Can be repeated",
+    ),
+    cloup.option(
+        "--chunk-size",
+        default=1000000,
+        help="Size (in bp) of the regions copied at once, with all their traits (default: 1000000)",
+    ),
+)
+@click.pass_context
+def phewas_index(ctx: click.Context, uri: tuple[str, ...], chunk_size: int) -> None:
+    """Backfill the PheWAS index of each TileDB dataset."""
+    cfg = get_tiledb_config(ctx)
+    for dataset_uri in uri:
+        backfill_phewas_index(dataset_uri, cfg, chunk_size=chunk_size)
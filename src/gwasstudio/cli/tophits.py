@@ -0,0 +1,43 @@
+import click
+import cloup
+
+from gwasstudio import logger
+from gwasstudio.utils.cfg import get_tiledb_config
+from gwasstudio.utils.tophits import backfill_tophits, get_tophits_threshold, tophits_uri
+
+HELP_DOC = """
+Build the top hits array of existing TileDB datasets, replacing any previous one.
+"""
+
+
+@cloup.command("tophits", no_args_is_help=True, help=HELP_DOC)
+@cloup.option_group(
+    "Top hits options",
+    cloup.option(
+        "--uri",
+        required=True,
+        multiple=True,
+        help="URI of a project/study TileDB dataset, e.g. s3://tiledb/project_study. Can be repeated",
+    ),
+    cloup.option(
+        "--tophits-thr",
+        type=float,
+        default=None,
+        help="-log10(p-value) threshold of the variants to keep (default: the threshold of the current array)",
+    ),
+    cloup.option(
+        "--chunk-size",
+        default=25000000,
+        help="Size (in bp) of the regions read at once (default: 25000000)",
+    ),
+)
+@click.pass_context
+def tophits(ctx: click.Context, uri: tuple[str, ...], tophits_thr: float | None, chunk_size: int) -> None:
+    """Backfill the top hits array of each TileDB dataset."""
+    cfg = get_tiledb_config(ctx)
+    for dataset_uri in uri:
+        threshold = tophits_thr if tophits_thr is not None else get_tophits_threshold(dataset_uri, cfg)
+        if threshold is None:
+            logger.error(f"{tophits_uri(dataset_uri)} does not exist: --tophits-thr is required")
+            raise SystemExit(1)
+        backfill_tophits(dataset_uri, cfg, threshold, chunk_size=chunk_size)
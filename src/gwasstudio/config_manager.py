@@ -54,6 +54,8 @@ class ConfigurationManager(metaclass=SingletonConfigurationManager):
         mdb_connection = c.get("mdbc", {})
         self.mdbc_db = kwargs.get("db", mdb_connection.get("db"))
         self.mdbc_uri = kwargs.get("uri", mdb_connection.get("uri"))
+        self.mdbc_pool_size = kwargs.get("pool_size", mdb_connection.get("pool_size", 100))
+        self.mdbc_embedded_json = kwargs.get("embedded_json", mdb_connection.get("embedded_json", False))
 
         self.data_category_list = c.get("data_category", [])
         self.ancestry_list = c.get("ancestry", [])
@@ -77,6 +79,14 @@ class ConfigurationManager(metaclass=SingletonConfigurationManager):
     def get_mdbc_uri(self):
         return self.mdbc_uri
 
+    @property
+    def get_mdbc_pool_size(self):
+        return self.mdbc_pool_size
+
+    @property
+    def get_mdbc_embedded_json(self):
+        return self.mdbc_embedded_json
+
     @property
     def get_data_category_list(self):
         return self.data_category_list
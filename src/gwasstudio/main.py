@@ -4,7 +4,19 @@ import click
 import cloup
 
 from gwasstudio import __appname__, __version__, context_settings, log_file, logger
-from gwasstudio.cli import list_projects, info, ingest, export, query_metadata
+from gwasstudio.cli import (
+    db_index,
+    list_projects,
+    info,
+    ingest,
+    export,
+    query_metadata,
+    migrate_metadata,
+    mongo_daemon,
+    snapshot_metadata,
+    tophits,
+    phewas_index,
+)
 from gwasstudio.utils.mongo_manager import mongo_deployment_types
 
 
@@ -191,7 +203,13 @@ def main():
     cli_init.add_command(export)
     cli_init.add_command(ingest)
     cli_init.add_command(query_metadata)
+    cli_init.add_command(migrate_metadata)
+    cli_init.add_command(db_index)
+    cli_init.add_command(snapshot_metadata)
+    cli_init.add_command(mongo_daemon)
     cli_init.add_command(list_projects)
+    cli_init.add_command(tophits)
+    cli_init.add_command(phewas_index)
 
     cli_init(obj={})
 
@@ -7,7 +7,7 @@ import tiledb
 from gwasstudio import logger
 from gwasstudio.methods.dataframe import process_dataframe
 from gwasstudio.methods.manhattan_plot import _plot_manhattan
-from gwasstudio.utils.snps import is_multiallelic
+from gwasstudio.utils.snps import multiallelic_mask, variant_key
 from gwasstudio.utils.tdb_schema import AttributeEnum as an, DimensionEnum as dn
 
 TILEDB_DIMS = dn.get_names()
@@ -45,6 +45,71 @@ def tiledb_array_query(
     return attrs, query
 
 
+def _dim_mask(values: pd.Series, selection: Any) -> np.ndarray:
+    """Boolean mask of ``values`` selected by a TileDB-style index: a scalar, an inclusive slice or a list of them."""
+    if isinstance(selection, slice):
+        mask = np.ones(len(values), dtype=bool)
+        if selection.start is not None:
+            mask &= (values >= selection.start).to_numpy()
+        if selection.stop is not None:
+            mask &= (values <= selection.stop).to_numpy()
+        return mask
+    if isinstance(selection, (list, tuple, np.ndarray)):
+        mask = np.zeros(len(values), dtype=bool)
+        for item in selection:
+            mask |= _dim_mask(values, item)
+        return mask
+    return (values == selection).to_numpy()
+
+
+class _TraitFrameQuery:
+    """Result of :meth:`TraitFrame.query`; ``query.df[chr, trait, pos]`` filters the cached cells."""
+
+    def __init__(self, df: pd.DataFrame):
+        self._df = df
+
+    @property
+    def df(self) -> "_TraitFrameQuery":
+        return self
+
+    def __getitem__(self, key: tuple) -> pd.DataFrame:
+        mask = np.ones(len(self._df), dtype=bool)
+        for dim, selection in zip(TILEDB_DIMS, key):
+            mask &= _dim_mask(self._df[dim], selection)
+        return self._df[mask].reset_index(drop=True)
+
+
+class TraitFrame:
+    """
+    In-memory copy of the cells of a single trait that can stand in for the TileDB array.
+
+    It supports the subset of the query API used by the extraction methods (``query(dims, attrs).df[...]``
+    with scalar, slice or multi-range indexes), so that several analyses of the same trait share one read.
+
+    Args:
+        df (pd.DataFrame): All dimensions and attributes of the trait, as returned by ``query().df``.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self._df = df.reset_index(drop=True)
+
+    @classmethod
+    def read(cls, tiledb_array: tiledb.Array, trait: str) -> "TraitFrame":
+        """Read every cell of ``trait`` from ``tiledb_array``."""
+        return cls(tiledb_array.query().df[:, trait, :])
+
+    def query(self, dims: Tuple[str] = TILEDB_DIMS, attrs: Tuple[str] | None = None) -> _TraitFrameQuery:
+        available = [col for col in self._df.columns if col not in TILEDB_DIMS]
+        if attrs:
+            missing = set(attrs) - set(available)
+            if missing:
+                raise tiledb.TileDBError(f"Attributes not found: {', '.join(sorted(missing))}")
+            # TileDB returns the attributes in schema order, whatever the requested order
+            available = [col for col in available if col in attrs]
+        columns = [dim for dim in TILEDB_DIMS if dim in dims] + available
+        return _TraitFrameQuery(self._df[columns])
+
+
 def extract_full_stats(
     tiledb_array: tiledb.Array,
     trait: str,
@@ -246,52 +311,162 @@ def extract_regions_leadsnps(
     trait_snps = trait_snps.groupby("CHR")
     dataframes = []
     for chr, group in trait_snps:
-        # Query largest region
-        min_pos = min(group["START"])
-        max_pos = max(group["END"])
-        tiledb_query_df = tiledb_query.df[chr, trait, min_pos:max_pos]
-        if tiledb_query_df.empty:
-            for sid in group["SOURCEID_SNP"]:
-                dataframes.append({col: np.nan for col in expected_cols} | {"SOURCEID_SNP": sid})
-            continue
+        # Query only the (merged) flank windows, not the whole span of the chromosome
+        windows = _merge_windows(group["START"].to_numpy(), group["END"].to_numpy())
+        tiledb_query_df = tiledb_query.df[chr, trait, windows]
+        dataframes.append(_search_leadsnps(tiledb_query_df, group, expected_cols))
 
-        # Loop SNPs within this chromosome
-        for _, row in group.iterrows():
-            src = row["SOURCEID_SNP"]
-            region = tiledb_query_df[(tiledb_query_df.POS >= row.START) & (tiledb_query_df.POS <= row.END)]
-            if region.empty:
-                dataframes.append({col: np.nan for col in expected_cols} | {"SOURCEID_SNP": src})
-                continue
+    if not dataframes:
+        return pd.DataFrame(columns=expected_cols)
+    return pd.concat(dataframes, ignore_index=True)
 
-            # Lead SNP
-            lead = region[region["MLOG10P"] == region["MLOG10P"].max()]
-            lead = process_dataframe(lead)
-            if len(lead) > 1:  # if multiple lead SNPs
-                lead["is_multi"] = lead["SNPID"].apply(is_multiallelic)
-                mono = lead[~lead["is_multi"]]
-                if len(mono) > 0:
-                    lead = mono.iloc[0]  # keep first bi-allelic
-                else:
-                    lead = lead.iloc[0]  # keep first multi-allelic
-            else:
-                lead = lead.iloc[0]
-
-            # Exact SNP
-            exact = region[(region.POS == row.POS) & (region.EA == row.EA) & (region.NEA == row.NEA)]
-            exact = process_dataframe(pd.DataFrame([exact.iloc[0]])).iloc[0] if not exact.empty else None
-
-            dataframes.append(
-                {
-                    "SOURCEID_SNP": src,
-                    "SNPID_LEAD": lead["SNPID"],
-                    "MLOG10P_LEAD": lead["MLOG10P"],
-                    "BETA_LEAD": lead["BETA"],
-                    "SE_LEAD": lead["SE"],
-                    "SNPID_EXACT": exact["SNPID"] if exact is not None else np.nan,
-                    "MLOG10P_EXACT": exact["MLOG10P"] if exact is not None else np.nan,
-                    "BETA_EXACT": exact["BETA"] if exact is not None else np.nan,
-                    "SE_EXACT": exact["SE"] if exact is not None else np.nan,
-                }
-            )
 
-    return pd.DataFrame(dataframes)
+def extract_phewas(
+    tiledb_array: tiledb.Array,
+    traits: list[str],
+    regions_snps: pd.DataFrame,
+    attributes: Tuple[str] = None,
+) -> pd.DataFrame:
+    """
+    Extract a list of SNPs or small genomic regions across several traits.
+
+    With a variant-major array (a PheWAS index, ordered by CHR, POS and TRAITID) only the tiles of the
+    selected positions are read. Otherwise, the positions of every trait of the array are read.
+
+    Args:
+        tiledb_array: The TileDB array to query.
+        traits (list[str]): The traits to keep.
+        regions_snps (pd.DataFrame): The genomic regions or SNPs to extract, as returned by ``read_to_bed``.
+        attributes (list[str], optional): A list of attributes to include in the output. Defaults to None.
+
+    Returns:
+        pd.DataFrame: The variants of the traits, in the column order of ``extract_full_stats`` with TRAITID.
+    """
+    variant_major = tiledb_array.schema.domain.dim(1).name == dn.DIM3.get_value()
+    snp_filter = (regions_snps["END"] == regions_snps["START"] + 1).all()
+    attributes, tiledb_query = tiledb_array_query(tiledb_array, attrs=attributes)
+    dataframes = []
+    for chr, group in regions_snps.groupby("CHR"):
+        if snp_filter:
+            positions = sorted(set(group["START"].astype(int)))
+        else:
+            positions = _merge_windows(np.maximum(group["START"].to_numpy(), 1), group["END"].to_numpy())
+        if variant_major:
+            tiledb_query_df = tiledb_query.df[chr, positions, :]
+        else:
+            tiledb_query_df = tiledb_query.df[chr, :, positions]
+        dataframes.append(tiledb_query_df[tiledb_query_df["TRAITID"].isin(traits)])
+
+    if not dataframes:
+        return pd.DataFrame(columns=["SNPID", *TILEDB_DIMS, *attributes])
+    tiledb_query_df = pd.concat(dataframes, ignore_index=True)
+    # Same row order with or without a PheWAS index: all the traits of a variant together
+    tiledb_query_df = tiledb_query_df.sort_values(["CHR", "POS", "TRAITID"], kind="stable", ignore_index=True)
+    columns = [*TILEDB_DIMS] + [col for col in tiledb_query_df.columns if col not in TILEDB_DIMS]
+    return process_dataframe(tiledb_query_df.reindex(columns=columns), drop_tid=False)
+
+
+def _merge_windows(starts: np.ndarray, ends: np.ndarray) -> list[slice]:
+    """
+    Merge overlapping or adjacent closed intervals ``[starts, ends]`` into a list of slices.
+
+    The result is suitable for a TileDB multi-range subarray read, so that the amount of data read is
+    proportional to the total window size rather than to the span between the first and last window.
+
+    Args:
+        starts (np.ndarray): Interval start positions.
+        ends (np.ndarray): Interval end positions (inclusive).
+
+    Returns:
+        list[slice]: Sorted, non-overlapping inclusive ranges.
+    """
+    order = np.argsort(starts, kind="stable")
+    starts = np.asarray(starts, dtype=np.int64)[order]
+    ends = np.maximum.accumulate(np.asarray(ends, dtype=np.int64)[order])
+    # A new window begins where the start is past the furthest end seen so far (+1 for adjacency)
+    new_window = np.r_[True, starts[1:] > ends[:-1] + 1]
+    first = np.flatnonzero(new_window)
+    last = np.r_[first[1:] - 1, len(starts) - 1]
+    return [slice(int(s), int(e)) for s, e in zip(starts[first], ends[last])]
+
+
+def _segment_min(values: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    Return the minimum of ``values`` within each half-open window ``[starts, ends)``.
+
+    Windows may overlap; they are interleaved into a single ``np.minimum.reduceat`` call and every
+    other result is kept. Empty windows must be filtered out by the caller.
+    """
+    bounds = np.column_stack((starts, ends)).ravel()
+    padded = np.append(values, values.max(initial=0) + 1)
+    return np.minimum.reduceat(padded, bounds)[::2]
+
+
+def _search_leadsnps(region_df: pd.DataFrame, group: pd.DataFrame, expected_cols: list[str]) -> pd.DataFrame:
+    """
+    Find the lead and the exact SNP of every lead-SNP query on a single chromosome.
+
+    The lead SNP is the variant with the highest MLOG10P within ``[START, END]``; ties are broken in favour
+    of the first bi-allelic variant, then of the first variant. The exact SNP is the first variant matching
+    POS, EA and NEA of the query.
+
+    Args:
+        region_df (pd.DataFrame): Variants of one trait on one chromosome, covering all the query windows.
+        group (pd.DataFrame): Queries on that chromosome with SOURCEID_SNP, POS, EA, NEA, START and END.
+        expected_cols (list[str]): Output columns.
+
+    Returns:
+        pd.DataFrame: One row per query, in the order of ``group``.
+    """
+    result = pd.DataFrame({"SOURCEID_SNP": group["SOURCEID_SNP"].to_numpy()})
+    result = result.reindex(columns=expected_cols)
+    if region_df.empty:
+        return result
+
+    region_df = region_df.sort_values("POS", kind="stable", ignore_index=True)
+    positions = region_df["POS"].to_numpy()
+    lo = np.searchsorted(positions, group["START"].to_numpy(), side="left")
+    hi = np.searchsorted(positions, group["END"].to_numpy(), side="right")
+    found = lo < hi
+
+    # Rank variants by (MLOG10P desc, bi-allelic first, original order) so that the best
+    # variant of a window is the one with the lowest rank.
+    order = np.lexsort(
+        (
+            np.arange(len(region_df)),
+            multiallelic_mask(region_df["EA"], region_df["NEA"]),
+            -region_df["MLOG10P"].to_numpy(dtype=np.float64),
+        )
+    )
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+
+    # The ranks are a permutation, so the lowest rank of a window maps back to its variant through ``order``.
+    lead_idx = np.full(len(group), -1)
+    if found.any():
+        lead_idx[found] = order[_segment_min(rank, lo[found], hi[found])]
+
+    # Exact SNP: first variant with the same POS, EA and NEA as the query, matched on integer keys.
+    variant_keys = variant_key(region_df["CHR"], positions, region_df["EA"], region_df["NEA"])
+    query_keys = variant_key(group["CHR"], group["POS"], group["EA"], group["NEA"])
+    by_key = np.argsort(variant_keys, kind="stable")
+    first = np.minimum(np.searchsorted(variant_keys[by_key], query_keys, side="left"), len(by_key) - 1)
+    exact_idx = np.where(variant_keys[by_key[first]] == query_keys, by_key[first], -1)
+    # Guard against allele hash collisions
+    hit = exact_idx >= 0
+    same_alleles = (region_df["EA"].to_numpy()[exact_idx[hit]] == group["EA"].to_numpy()[hit]) & (
+        region_df["NEA"].to_numpy()[exact_idx[hit]] == group["NEA"].to_numpy()[hit]
+    )
+    exact_idx[np.flatnonzero(hit)[~same_alleles]] = -1
+
+    for suffix, idx in (("LEAD", lead_idx), ("EXACT", exact_idx)):
+        hit = idx >= 0
+        if not hit.any():
+            continue
+        snps = process_dataframe(region_df.iloc[idx[hit]].reset_index(drop=True))
+        for col in ("SNPID", "MLOG10P", "BETA", "SE"):
+            values = pd.Series(np.nan, index=result.index, dtype=object if col == "SNPID" else np.float64)
+            values[hit] = snps[col].to_numpy()
+            result[f"{col}_{suffix}"] = values
+
+    return result
@@ -1,9 +1,48 @@
 import numpy as np
 import pandas as pd
+import tiledb
 
 from gwasstudio import logger
 from gwasstudio.methods.compute_pheno_variance import compute_pheno_variance
-from gwasstudio.methods.dataframe import process_dataframe
+from gwasstudio.methods.dataframe import _build_snpid, process_dataframe
+from gwasstudio.methods.extraction_methods import _merge_windows
+from gwasstudio.utils.tdb_schema import TileDBSchemaCreator
+
+
+def _significant_loci(
+    chrom: np.ndarray,
+    pos: np.ndarray,
+    mlog10p: np.ndarray,
+    pvalue_sig: float,
+    hole_size: int,
+    locus_flanks: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Find the loci of variants already filtered on the p-value limit.
+
+    :return: Row of the lead variant, chromosome, start and end (inclusive, with flanks) of each locus
+    """
+    # Segments: runs of variants of the same chromosome (in input order) without a gap above hole_size
+    rows = np.argsort(chrom, kind="stable")
+    breaks = np.r_[True, chrom[rows][1:] != chrom[rows][:-1]]
+    breaks[1:] |= np.diff(pos[rows]).astype(np.float64) > hole_size
+    segment_starts = np.flatnonzero(breaks)
+    segment = np.cumsum(breaks) - 1
+    segment_max = np.maximum.reduceat(mlog10p[rows], segment_starts)
+    lower_pos = np.minimum.reduceat(pos[rows], segment_starts).astype(np.int64)
+    upper_pos = np.maximum.reduceat(pos[rows], segment_starts).astype(np.int64)
+
+    # The lead of a segment is its first variant with the highest MLOG10P
+    lead_rows = np.flatnonzero(mlog10p[rows] == segment_max[segment])
+    _, first_lead = np.unique(segment[lead_rows], return_index=True)
+    loci = np.flatnonzero(segment_max > pvalue_sig)
+    leads = rows[lead_rows[first_lead[loci]]]
+
+    # Extend each significant segment by locus_flanks in both directions
+    locus_chrom = chrom[leads].astype(np.int64)
+    start_pos = np.where(lower_pos[loci] - locus_flanks < 0, 1, lower_pos[loci] - locus_flanks)
+    end_pos = upper_pos[loci] + locus_flanks
+    return leads, locus_chrom, start_pos, end_pos
 
 
 def _locus_breaker(
@@ -48,79 +87,205 @@ def _locus_breaker(
 
     # Filter rows based on the p_limit threshold
     tiledb_results_pd = tiledb_results_pd[tiledb_results_pd["MLOG10P"] > pvalue_limit]
-    tiledb_results_pd.loc[:, "SNPID"] = (
-        tiledb_results_pd["CHR"].astype(str)
-        + ":"
-        + tiledb_results_pd["POS"].astype(str)
-        + ":"
-        + tiledb_results_pd["EA"]
-        + ":"
-        + tiledb_results_pd["NEA"]
-    )
-    original_data = tiledb_results_pd.copy()
+    if "SNPID" not in tiledb_results_pd.columns:
+        # Only render the identifiers of the variants left after filtering
+        tiledb_results_pd.loc[:, "SNPID"] = _build_snpid(tiledb_results_pd)
 
     # If no rows remain after filtering, return empty DataFrames
     if tiledb_results_pd.empty:
         return [pd.DataFrame(expected_schema), pd.DataFrame(expected_schema)]
 
-    # Group by 'contig' (chromosome) first, then calculate regions within each chromosome
-    trait_res = []
-    trait_res_allsnp = []
-    original_data = tiledb_results_pd.copy()
-    for contig, chrom_df in tiledb_results_pd.groupby("CHR"):
-        # Find regions where gaps between positions exceed hole_size within each chromosome
-        gaps = chrom_df["POS"].diff() > hole_size
-        group = gaps.cumsum()
-
-        # Group by the identified regions within the chromosome
-        for _, group_df in chrom_df.groupby(group):
-            if group_df["MLOG10P"].max() > pvalue_sig:
-                lower_pos = group_df["POS"].min()
-                if int(lower_pos) - locus_flanks < 0:
-                    start_pos = 1
-                else:
-                    start_pos = lower_pos - locus_flanks
-                end_pos = group_df["POS"].max() + locus_flanks
-                best_snp = group_df.loc[group_df["MLOG10P"].idxmax()]
-                locus = str(group_df["CHR"].iloc[0]) + ":" + str(start_pos) + ":" + str(end_pos)
-
-                line_res = [start_pos, end_pos, best_snp["POS"], best_snp["MLOG10P"]] + best_snp.tolist()
-                trait_res.append(line_res)
-                expanded_snps = original_data[
-                    (original_data["CHR"] == group_df["CHR"].iloc[0])
-                    & (original_data["POS"] >= start_pos)
-                    & (original_data["POS"] <= end_pos)
-                ]
-                expanded_snps = expanded_snps.drop(columns=["S"])
-                # Store the interval with the best SNP
-                # Collect all SNPs within the region
-                for _, snp_row in expanded_snps.iterrows():
-                    snp_res = [
-                        locus,
-                    ] + snp_row.tolist()
-                    trait_res_allsnp.append(snp_res)
-
-    # Convert results to a DataFrame
-    columns = [
-        "snp_pos",
-        "start",
-        "end",
-        "snp_MLOG10P",
-    ] + tiledb_results_pd.columns.tolist()
-
-    trait_res_df = pd.DataFrame(trait_res, columns=columns)
-
-    # Drop specific columns including 'start' and 'end'
-    trait_res_df = trait_res_df.drop(columns=["snp_pos", "start", "end"])
-    columns = ["locus"] + tiledb_results_pd.columns.tolist()
+    tiledb_results_pd = tiledb_results_pd.reset_index(drop=True)
+    chrom = tiledb_results_pd["CHR"].to_numpy()
+    pos = tiledb_results_pd["POS"].to_numpy()
+    leads, locus_chrom, start_pos, end_pos = _significant_loci(
+        chrom, pos, tiledb_results_pd["MLOG10P"].to_numpy(), pvalue_sig, hole_size, locus_flanks
+    )
+
+    columns = tiledb_results_pd.columns.tolist()
     columns.remove("S")
-    trait_res_allsnp_df = pd.DataFrame(trait_res_allsnp, columns=columns)
-    # trait_res_allsnp_df = trait_res_allsnp_df.drop(trait_res_allsnp_df.columns[0], axis=1)
-    # trait_res_allsnp_df = trait_res_allsnp_df.drop(columns=["snp_pos", "snp_MLOG10P"])
+    if len(leads) == 0:
+        return [
+            pd.DataFrame(columns=["snp_MLOG10P"] + tiledb_results_pd.columns.tolist()),
+            pd.DataFrame(columns=["locus"] + columns),
+        ]
+
+    trait_res_df = tiledb_results_pd.iloc[leads].reset_index(drop=True)
+    trait_res_df.insert(0, "snp_MLOG10P", trait_res_df["MLOG10P"].to_numpy())
+
+    # Intervals: all the variants within each locus, in input order
+    by_position = np.lexsort((pos, chrom))
+    sorted_keys = (chrom[by_position].astype(np.int64) << 32) | pos[by_position].astype(np.int64)
+    lo = np.searchsorted(sorted_keys, (locus_chrom << 32) | start_pos, side="left")
+    hi = np.searchsorted(sorted_keys, (locus_chrom << 32) | end_pos, side="right")
+    counts = hi - lo
+    locus_idx = np.repeat(np.arange(len(leads)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    snps = by_position[np.repeat(lo, counts) + offsets]
+    order = np.lexsort((snps, locus_idx))
+    locus_names = np.array([f"{c}:{s}:{e}" for c, s, e in zip(locus_chrom, start_pos, end_pos)], dtype=object)
+
+    trait_res_allsnp_df = tiledb_results_pd.iloc[snps[order]].drop(columns=["S"]).reset_index(drop=True)
+    # Interval tables have always been built from Python scalars, i.e. with 64-bit numeric columns
+    trait_res_allsnp_df = trait_res_allsnp_df.astype(
+        {
+            col: np.int64 if dtype.kind in "iu" else np.float64
+            for col, dtype in trait_res_allsnp_df.dtypes.items()
+            if dtype.kind in "iuf"
+        }
+    )
+    trait_res_allsnp_df.insert(0, "locus", locus_names[locus_idx[order]])
 
     return [trait_res_df, trait_res_allsnp_df]
 
 
+LOCUS_COLUMNS = ["TRAITID", "CHR", "START", "END", "SNPID", "MLOG10P"]
+REGION_COLUMNS = [
+    "REGION",
+    "CHR",
+    "START",
+    "END",
+    "N_TRAITS",
+    "N_LOCI",
+    "TRAITS",
+    "LEAD_SNPS",
+    "LEAD_MLOG10P",
+    "TOP_TRAIT",
+    "TOP_SNPID",
+    "TOP_MLOG10P",
+]
+
+
+def locus_table(trait: str, segments: pd.DataFrame, intervals: pd.DataFrame) -> pd.DataFrame:
+    """
+    Summarise the loci found by the locus-breaker for a trait, one row per locus.
+
+    :param trait: Trait of the loci
+    :param segments: Lead variants of the loci, as returned by ``_locus_breaker``
+    :param intervals: Variants of the loci, as returned by ``_locus_breaker``
+    :return: DataFrame with the columns ``LOCUS_COLUMNS``
+    """
+    if segments.empty:
+        return pd.DataFrame(columns=LOCUS_COLUMNS)
+    # Intervals follow the order of the segments, with one locus name per segment
+    bounds = intervals["locus"].drop_duplicates().str.split(":", expand=True).astype(np.int64).to_numpy()
+    return pd.DataFrame(
+        {
+            "TRAITID": trait,
+            "CHR": bounds[:, 0],
+            "START": bounds[:, 1],
+            "END": bounds[:, 2],
+            "SNPID": segments["SNPID"].to_numpy(),
+            "MLOG10P": segments["MLOG10P"].to_numpy(np.float64),
+        }
+    )
+
+
+def merge_loci(loci: list[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Merge the overlapping loci of several traits into regions.
+
+    The loci are sorted by start and swept once, starting a new region whenever a locus starts after
+    the furthest end seen so far, so the merge runs in O(n log n) over the total number of loci.
+
+    :param loci: Tables of loci, as returned by ``locus_table``
+    :return: DataFrame with the columns ``REGION_COLUMNS``, one row per region. ``TRAITS``, ``LEAD_SNPS``
+        and ``LEAD_MLOG10P`` list the loci of the region by start, separated by ``;``
+    """
+    loci = [df for df in loci if not df.empty]
+    if not loci:
+        return pd.DataFrame(columns=REGION_COLUMNS)
+    loci = pd.concat(loci, ignore_index=True)
+
+    # Chromosome and position packed in a single key, so that regions never span two chromosomes
+    chrom = loci["CHR"].to_numpy(np.int64)
+    start_key = (chrom << 32) | loci["START"].to_numpy(np.int64)
+    end_key = (chrom << 32) | loci["END"].to_numpy(np.int64)
+    order = np.lexsort((end_key, start_key))
+    reach = np.maximum.accumulate(end_key[order])
+    new_region = np.r_[True, start_key[order][1:] > reach[:-1]]
+    loci = loci.iloc[order].reset_index(drop=True)
+    loci["REGION"] = np.cumsum(new_region) - 1
+
+    grouped = loci.groupby("REGION", sort=True)
+    top = loci.loc[grouped["MLOG10P"].idxmax()].set_index("REGION")
+    regions = grouped.agg(
+        CHR=("CHR", "first"),
+        START=("START", "min"),
+        END=("END", "max"),
+        N_TRAITS=("TRAITID", "nunique"),
+        N_LOCI=("TRAITID", "size"),
+        TRAITS=("TRAITID", lambda x: ";".join(map(str, x))),
+        LEAD_SNPS=("SNPID", ";".join),
+        LEAD_MLOG10P=("MLOG10P", lambda x: ";".join(f"{v:g}" for v in x)),
+    )
+    regions["TOP_TRAIT"] = top["TRAITID"]
+    regions["TOP_SNPID"] = top["SNPID"]
+    regions["TOP_MLOG10P"] = top["MLOG10P"]
+    regions["REGION"] = (
+        regions["CHR"].astype(str) + ":" + regions["START"].astype(str) + ":" + regions["END"].astype(str)
+    )
+    return regions[REGION_COLUMNS].reset_index(drop=True)
+
+
+def _float32_bound(value: float, upper: bool = False) -> float:
+    """Round ``value`` to float32 away from the accepted range, so that a query condition is never stricter."""
+    bound = np.float32(value)
+    if (bound > value) if not upper else (bound < value):
+        bound = np.nextafter(bound, np.float32(np.inf if upper else -np.inf))
+    return float(bound)
+
+
+def _read_locus_windows(
+    tiledb_array: tiledb.Array,
+    trait: str,
+    maf: float,
+    pvalue_limit: float,
+    pvalue_sig: float,
+    hole_size: int,
+    locus_flanks: int,
+) -> pd.DataFrame:
+    """
+    Read the variants of a trait needed by the locus-breaker, in two phases.
+
+    The first phase reads only the positions, MLOG10P and EAF of the variants passing the p-value limit
+    and the MAF filter, pushed down to TileDB as a query condition, and finds the loci. The second phase
+    reads all the attributes, only within the loci. The filters are applied again in pandas by the
+    caller, so the result of the locus-breaker is the same as with a full read of the trait.
+
+    :return: DataFrame with the same columns as ``tiledb_array.query().df``
+    """
+    cond = (
+        f"MLOG10P >= {_float32_bound(pvalue_limit)}"
+        f" and EAF >= {_float32_bound(maf)} and EAF <= {_float32_bound(1 - maf, upper=True)}"
+    )
+    candidates = tiledb_array.query(dims=("CHR", "POS"), attrs=("MLOG10P", "EAF"), cond=cond).df[:, trait, :]
+    candidates = candidates[
+        (candidates["EAF"] >= maf) & (candidates["EAF"] <= (1 - maf)) & (candidates["MLOG10P"] > pvalue_limit)
+    ]
+    query = tiledb_array.query(cond=cond)
+    if candidates.empty:
+        # Read a single cell, so that the frame has its columns: it holds nothing that passes the filters
+        return query.df[1, trait, 1:1]
+
+    chrom = candidates["CHR"].to_numpy()
+    pos = candidates["POS"].to_numpy()
+    _, locus_chrom, start_pos, end_pos = _significant_loci(
+        chrom, pos, candidates["MLOG10P"].to_numpy(), pvalue_sig, hole_size, locus_flanks
+    )
+    logger.debug(f"{len(candidates)} variants above the p-value limit, {len(locus_chrom)} loci")
+    if len(locus_chrom) == 0:
+        # Same as above with a candidate variant, for the locus-breaker to return the same empty tables
+        return query.df[int(chrom[0]), trait, int(pos[0]) : int(pos[0])]
+
+    end_pos = np.minimum(end_pos, TileDBSchemaCreator.POS_DOMAIN[1])
+    frames = [
+        query.df[int(c), trait, _merge_windows(start_pos[locus_chrom == c], end_pos[locus_chrom == c])]
+        for c in np.unique(locus_chrom)
+    ]
+    return pd.concat(frames, ignore_index=True)
+
+
 def _process_locusbreaker(
     tiledb_unified,
     trait,
@@ -135,7 +300,13 @@ def _process_locusbreaker(
 ):
     """Process data using the locus breaker algorithm."""
     logger.info("Running locus breaker")
-    subset_SNPs_pd = tiledb_unified.query().df[:, trait, :]
+    if isinstance(tiledb_unified, tiledb.Array) and tiledb_unified.schema.has_attr("MLOG10P"):
+        subset_SNPs_pd = _read_locus_windows(
+            tiledb_unified, trait, maf, pvalue_limit, pvalue_sig, hole_size, locus_flanks
+        )
+    else:
+        # MLOG10P is computed from BETA and SE, or the trait is already in memory
+        subset_SNPs_pd = tiledb_unified.query().df[:, trait, :]
 
     subset_SNPs_pd = subset_SNPs_pd[(subset_SNPs_pd["EAF"] >= maf) & (subset_SNPs_pd["EAF"] <= (1 - maf))]
 
@@ -1,123 +1,211 @@
-from functools import reduce
 import numpy as np
 import pandas as pd
 from scipy import stats
-from gwasstudio.methods.extraction_methods import tiledb_array_query
 
+from gwasstudio.methods.dataframe import _build_snpid
+from gwasstudio.utils.snps import KEY_ALLELE_BITS, KEY_POS_BITS, key_pos
+from gwasstudio.utils.tdb_schema import TileDBSchemaCreator
 
-def _meta_analysis(tiledb_array, trait_list, out_prefix=None, **kwargs):
-    """
-    Meta-analysis for two or more GWAS traits using inverse variance method.
-    """
-    # Ensure both dataframes have the required columns
-    merged_list = []
-    collected_trait_names = []  # Collect names here to avoid NaN issues later
+META_ANALYSIS_COLUMNS = ["SNP", "TRAITID", "BETA", "SE", "P", "I_SQUARED", "Z_SCORE"]
 
-    attributes = kwargs.get("attributes")
-    attributes, tiledb_query = tiledb_array_query(tiledb_array, attrs=attributes)
 
-    for trait in trait_list:
-        df = tiledb_query.df[:, trait, :]
-
-        # Create SNP identifier
-        df["SNP"] = df["CHR"].astype(str) + ":" + df["POS"].astype(str) + ":" + df["EA"] + ":" + df["NEA"]
-
-        # Safely grab the TRAITID for this dataframe
-        if not df.empty and "TRAITID" in df.columns:
-            # Drop NaNs just in case, take the first valid one, or fallback to input trait
-            valid_ids = df["TRAITID"].dropna()
-            if not valid_ids.empty:
-                collected_trait_names.append(str(valid_ids.iloc[0]))
-            else:
-                collected_trait_names.append(str(trait))
-        else:
-            collected_trait_names.append(str(trait))
-
-        merged_list.append(df)
-
-    # Merge dataframes (Outer Join / Union)
-    merged_df = reduce(
-        lambda left, right_i: pd.merge(
-            left,
-            right_i[1].add_suffix(f"_{right_i[0] + 1}").rename(columns={f"SNP_{right_i[0] + 1}": "SNP"}),
-            on="SNP",
-            how="outer",
-        ),
-        enumerate(merged_list[1:]),
-        merged_list[0],
-    )
+def meta_analysis_partitions(chunk_size: int = 0) -> list[tuple[int, int | None, int | None]]:
+    """
+    Split the genome into independent meta-analysis partitions.
 
-    variant_names = merged_df["SNP"].values
+    Args:
+        chunk_size (int): Size in bp of the regions each chromosome is split into. 0 keeps whole chromosomes.
 
-    # FIX: range() should go up to len(trait_list) to include the last study
-    # Study 0 is base, Study 1 is suffix_1, Study 2 is suffix_2, etc.
-    effect_sizes = np.column_stack(
-        [merged_df["BETA"].values] + [merged_df[f"BETA_{i + 1}"].values for i in range(0, len(trait_list) - 1)]
-    )
+    Returns:
+        list[tuple[int, int | None, int | None]]: ``(chromosome, start, end)`` tuples, with inclusive bounds;
+        ``None`` bounds cover the whole chromosome.
+    """
+    chroms = range(TileDBSchemaCreator.CHROM_DOMAIN[0], TileDBSchemaCreator.CHROM_DOMAIN[1] + 1)
+    if chunk_size <= 0:
+        return [(chrom, None, None) for chrom in chroms]
+    pos_min, pos_max = TileDBSchemaCreator.POS_DOMAIN
+    return [
+        (chrom, start, min(start + chunk_size - 1, pos_max))
+        for chrom in chroms
+        for start in range(pos_min, pos_max + 1, chunk_size)
+    ]
+
+
+class _InverseVarianceAccumulator:
+    """
+    Fixed-effect (inverse-variance) meta-analysis over integer variant keys.
 
-    standard_error = np.column_stack(
-        [merged_df["SE"].values] + [merged_df[f"SE_{i + 1}"].values for i in range(0, len(trait_list) - 1)]
-    )
+    Studies are added one at a time, each reduced to its sorted valid keys, effects and weights. The
+    variant keys of all the studies are then merged once into a sorted universe, and every study is
+    folded into arrays of that fixed size with a single ``searchsorted``: for every variant the sum of
+    weights, the weighted mean effect and Cochran's Q are updated with the weighted incremental (West)
+    algorithm.
+    """
 
-    # Use the robustly collected names instead of querying the merged DF (which has NaNs)
-    trait_names = collected_trait_names
-
-    # Remove variants where ALL studies have NaN values
-    not_all_nan = ~np.all(np.isnan(effect_sizes), axis=1)
-    effect_sizes = effect_sizes[not_all_nan]
-    standard_error = standard_error[not_all_nan]
-    variant_names = variant_names[not_all_nan]
-
-    # Calculate variance
-    variance = standard_error**2
-
-    # Weight effect sizes by inverse variance
-    # Note: invalid='ignore' suppresses warnings for NaN division (missing studies)
-    with np.errstate(divide="ignore", invalid="ignore"):
-        effect_size_divided_by_variance = effect_sizes / variance
-        one_divided_by_variance = 1 / variance
-
-    # Sum across studies (NaNs are treated as 0, effectively ignoring missing studies)
-    effect_size_divided_by_variance_total = np.nansum(effect_size_divided_by_variance, axis=1)
-    one_divided_by_variance_total = np.nansum(one_divided_by_variance, axis=1)
-
-    # Meta-analyzed effect sizes and standard errors
-    # Handle potential divide by zero if a row was theoretically all NaN (though filtered above)
-    with np.errstate(divide="ignore", invalid="ignore"):
-        meta_analysed_effect_sizes = effect_size_divided_by_variance_total / one_divided_by_variance_total
-        meta_analysed_standard_error = np.sqrt(1 / one_divided_by_variance_total)
-
-    # Calculate heterogeneity (I²)
-    # Broadcast meta_effect to match shape of study effects
-    effect_size_deviations_from_mean = np.power(effect_sizes - meta_analysed_effect_sizes[:, np.newaxis], 2)
-
-    # Weighted sum of squared deviations
-    effect_size_deviations = np.nansum(one_divided_by_variance * effect_size_deviations_from_mean, axis=1)
-
-    # Degrees of freedom: number of non-NaN studies minus 1
-    degrees_of_freedom = np.sum(~np.isnan(effect_sizes), axis=1) - 1
-
-    with np.errstate(divide="ignore", invalid="ignore"):
-        i_squared = ((effect_size_deviations - degrees_of_freedom) / effect_size_deviations) * 100
-
-        # Handle cases where I² is NaN or negative
-        i_squared[np.isnan(i_squared)] = 0  # Often 0 if Q is close to df, or if only 1 study
-        i_squared[i_squared < 0] = 0
-
-    # Calculate meta-analysis p-values
-    z_scores = meta_analysed_effect_sizes / meta_analysed_standard_error
-    meta_p_values = 2 * (1 - stats.norm.cdf(np.abs(z_scores)))
-
-    # Create results dataframe
-    results_df = pd.DataFrame(
-        {
-            "SNP": variant_names,
-            "TRAITID": "_".join(trait_names),
-            "BETA": meta_analysed_effect_sizes,
-            "SE": meta_analysed_standard_error,
-            "P": meta_p_values,
+    def __init__(self):
+        self.studies: list[tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+
+    def add(self, keys: np.ndarray, beta: np.ndarray, se: np.ndarray) -> None:
+        """Add one study. ``keys`` must be unique; variants with a missing effect or standard error are skipped."""
+        beta = np.asarray(beta, dtype=np.float64)
+        with np.errstate(divide="ignore"):
+            weight = 1 / np.square(np.asarray(se, dtype=np.float64))
+        valid = np.isfinite(beta) & np.isfinite(weight) & (weight > 0)
+        keys, beta, weight = keys[valid], beta[valid], weight[valid]
+        order = np.argsort(keys, kind="stable")
+        self.studies.append((keys[order], beta[order], weight[order]))
+
+    def result(self) -> dict[str, np.ndarray]:
+        """
+        Return the keys, in ascending order, with the meta-analysed effect, standard error, p-value, I² and
+        z-score.
+        """
+        if self.studies:
+            keys = np.unique(np.concatenate([study_keys for study_keys, _, _ in self.studies]))
+        else:
+            keys = np.empty(0, dtype=np.int64)
+        total_weight = np.zeros(len(keys))
+        mean = np.zeros(len(keys))
+        q = np.zeros(len(keys))
+        n = np.zeros(len(keys), dtype=np.int64)
+        for study_keys, beta, weight in self.studies:
+            idx = np.searchsorted(keys, study_keys)
+            total = total_weight[idx] + weight
+            delta = beta - mean[idx]
+            updated = mean[idx] + delta * weight / total
+            q[idx] += weight * delta * (beta - updated)
+            mean[idx] = updated
+            total_weight[idx] = total
+            n[idx] += 1
+
+        degrees_of_freedom = n - 1
+        se = np.sqrt(1 / total_weight)
+        z_scores = mean / se
+        with np.errstate(divide="ignore", invalid="ignore"):
+            i_squared = (q - degrees_of_freedom) / q * 100
+        # 0 when Q is not above its degrees of freedom or with a single study
+        i_squared[~(i_squared > 0) | (degrees_of_freedom == 0)] = 0
+        return {
+            "KEY": keys,
+            "BETA": mean,
+            "SE": se,
+            "P": 2 * (1 - stats.norm.cdf(np.abs(z_scores))),
             "I_SQUARED": i_squared,
             "Z_SCORE": z_scores,
         }
+
+
+class _AlleleCodes:
+    """
+    Exact integer codes of the (EA, NEA) pairs seen in a partition, shared by all its traits.
+
+    Unlike the allele hash of :func:`~gwasstudio.utils.snps.variant_key`, two different pairs never share
+    a code, so that variants at the same position are never merged by a hash collision.
+    """
+
+    def __init__(self):
+        self.alleles = pd.MultiIndex.from_arrays([[], []])
+
+    def encode(self, ea: pd.Series, nea: pd.Series) -> np.ndarray:
+        """Return the codes of the pairs, adding the ones not seen yet."""
+        pairs = pd.MultiIndex.from_arrays([np.asarray(ea, dtype=object), np.asarray(nea, dtype=object)])
+        codes = self.alleles.get_indexer(pairs)
+        new = codes < 0
+        if new.any():
+            self.alleles = self.alleles.append(pairs[new].unique())
+            codes[new] = self.alleles.get_indexer(pairs[new])
+        if len(self.alleles) >= 1 << KEY_ALLELE_BITS:
+            raise ValueError(f"More than {1 << KEY_ALLELE_BITS} allele pairs in a meta-analysis partition")
+        return codes.astype(np.int64)
+
+    def decode(self, keys: np.ndarray) -> pd.MultiIndex:
+        """Return the (EA, NEA) pairs of the variant keys built from the codes."""
+        return self.alleles[keys & ((1 << KEY_ALLELE_BITS) - 1)]
+
+
+def _meta_analysis_partition(
+    tiledb_array,
+    trait_list,
+    out_prefix=None,
+    chrom: int = 1,
+    start: int | None = None,
+    end: int | None = None,
+    **kwargs,
+) -> pd.DataFrame:
+    """
+    Inverse-variance meta-analysis of ``trait_list`` on one chromosome, or one region of it.
+
+    Each trait is read on its own, restricted to the partition and to the attributes needed; variants
+    are aligned on 64-bit keys with the layout of :func:`~gwasstudio.utils.snps.variant_key`, whose
+    allele part is the exact code of the (EA, NEA) pair in the partition rather than a hash.
+
+    Args:
+        tiledb_array: The TileDB array to query.
+        trait_list (list[str]): Traits to meta-analyse.
+        out_prefix (str, optional): Unused, kept for the signature of the export functions.
+        chrom (int): Chromosome of the partition.
+        start (int, optional): First position of the partition (inclusive).
+        end (int, optional): Last position of the partition (inclusive).
+
+    Returns:
+        pd.DataFrame: One row per variant found in at least one trait, ordered by variant key: by position,
+        then by allele pair in the order the pairs are first met in the partition. Rows are not in the
+        lexical order of the SNP identifiers given by the former merge-based implementation.
+    """
+    accumulator = _InverseVarianceAccumulator()
+    allele_codes = _AlleleCodes()
+    query = tiledb_array.query(dims=("POS",), attrs=("BETA", "SE", "EA", "NEA"))
+    for trait in trait_list:
+        df = query.df[chrom, trait, slice(start, end)]
+        if df.empty:
+            continue
+        pos = df["POS"].to_numpy().astype(np.int64)
+        keys = (
+            (np.int64(chrom) << (KEY_POS_BITS + KEY_ALLELE_BITS))
+            | (pos << KEY_ALLELE_BITS)
+            | allele_codes.encode(df["EA"], df["NEA"])
+        )
+        # Duplicated variants within a study are counted once
+        keys, first = np.unique(keys, return_index=True)
+        accumulator.add(keys, df["BETA"].to_numpy()[first], df["SE"].to_numpy()[first])
+
+    result = accumulator.result()
+    keys = result.pop("KEY")
+    if len(keys) == 0:
+        return pd.DataFrame(columns=META_ANALYSIS_COLUMNS)
+
+    # Render the string identifiers only for the output
+    alleles = allele_codes.decode(keys)
+    snp = _build_snpid(
+        pd.DataFrame(
+            {
+                "CHR": chrom,
+                "POS": key_pos(keys),
+                "EA": alleles.get_level_values(0),
+                "NEA": alleles.get_level_values(1),
+            }
+        )
     )
-    return results_df
+    return pd.DataFrame({"SNP": snp, "TRAITID": "_".join(map(str, trait_list)), **result})
+
+
+def _meta_analysis(tiledb_array, trait_list, out_prefix=None, chunk_size: int = 0, **kwargs) -> pd.DataFrame:
+    """
+    Meta-analysis for two or more GWAS traits using inverse variance method.
+
+    The partitions of :func:`meta_analysis_partitions` are processed one after the other; the export
+    command runs them as parallel tasks instead.
+    """
+    results = [
+        _meta_analysis_partition(tiledb_array, trait_list, out_prefix, chrom=chrom, start=start, end=end)
+        for chrom, start, end in meta_analysis_partitions(chunk_size)
+    ]
+    return concat_meta_analysis(results)
+
+
+def concat_meta_analysis(results: list[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate the results of the meta-analysis partitions."""
+    results = [df for df in results if not df.empty]
+    if not results:
+        return pd.DataFrame(columns=META_ANALYSIS_COLUMNS)
+    return pd.concat(results, ignore_index=True)
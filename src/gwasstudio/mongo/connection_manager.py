@@ -1,12 +1,74 @@
 """
 Manager to handle Mongoengine's connection
+
+The connection, with its pool of sockets, is shared by the whole process: entering a connection manager
+opens it if needed and exiting it leaves it open for the next operation. Each process, e.g. each Dask
+worker, has its own connection, which is closed at exit or by :func:`close_connection`.
 """
 
+import atexit
+import os
+import threading
+
 from mongoengine import connect, disconnect
 
+from gwasstudio import logger
 from gwasstudio.config_manager import ConfigurationManager
 
 
+class _SharedConnection:
+    """Reference-counted MongoDB connection of the current process."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self.uri = None
+        self.pool_size = None
+        self.pid = None
+        self.refs = 0
+
+    def acquire(self, uri: str, pool_size: int) -> None:
+        """Open the connection to ``uri`` if needed and take a reference to it."""
+        with self._lock:
+            if self.pid is not None and self.pid != os.getpid():
+                # A client inherited from the parent process must not be used after a fork
+                logger.debug("Forked process: opening a new MongoDB connection")
+                disconnect()
+                self._reset()
+            if self.uri is not None and (self.uri, self.pool_size) != (uri, pool_size):
+                if self.refs > 0:
+                    raise RuntimeError(f"The MongoDB connection to {self.uri} is in use, cannot connect to {uri}")
+                self.close()
+            if self.uri is None:
+                logger.debug(f"Opening a MongoDB connection with a pool of {pool_size} connections")
+                connect(host=uri, maxPoolSize=pool_size)
+                self.uri, self.pool_size, self.pid = uri, pool_size, os.getpid()
+            self.refs += 1
+
+    def release(self) -> None:
+        """Drop a reference to the connection, which stays open."""
+        with self._lock:
+            self.refs = max(0, self.refs - 1)
+
+    def close(self) -> None:
+        """Close the connection."""
+        with self._lock:
+            if self.uri is not None and self.pid == os.getpid():
+                disconnect()
+            self._reset()
+
+
+_shared_connection = _SharedConnection()
+atexit.register(_shared_connection.close)
+
+
+def close_connection():
+    """Close the MongoDB connection of the current process, e.g. before stopping the server."""
+    _shared_connection.close()
+
+
 def get_mec(uri=None):
     return MongoEngineConnectionManager(
         uri=uri,
@@ -25,9 +87,10 @@ class MongoEngineConnectionManager:
             self.uri = cm.get_mdbc_uri
         else:
             self.uri = kwargs.get("uri")
+        self.pool_size = kwargs.get("pool_size") or cm.get_mdbc_pool_size
 
     def __enter__(self):
-        connect(host=self.uri)
+        _shared_connection.acquire(self.uri, self.pool_size)
 
     def __exit__(self, exc_type, exc_value, exc_traceback):
-        disconnect()
+        _shared_connection.release()
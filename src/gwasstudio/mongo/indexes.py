@@ -0,0 +1,86 @@
+"""
+Indexes of the metadata collection
+
+The indexes are declared in the ``meta`` of the documents (see :func:`gwasstudio.mongo.models.data_profile_indexes`)
+and are created explicitly, once, by ``gwasstudio db-index --create`` or ``gwasstudio ingest --create-indexes``.
+The functions of this module need an open connection, e.g. within a
+:class:`~gwasstudio.mongo.connection_manager.MongoEngineConnectionManager`.
+"""
+
+from mongoengine import Document
+
+from gwasstudio import logger
+
+# Stages of a query plan reading the documents, instead of answering from the index keys only
+FETCH_STAGES = {"COLLSCAN", "FETCH"}
+
+
+def _index_name(keys: list) -> str:
+    return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+
+def index_status(document: type[Document]) -> list[dict]:
+    """
+    Compare the indexes declared on ``document`` with the ones of its collection.
+
+    Returns:
+        list[dict]: One item per index, with its ``name``, ``keys`` and ``status``: ``present``,
+        ``missing`` (declared but not created) or ``extra`` (created but not declared).
+    """
+    comparison = document.compare_indexes()
+    missing, extra = comparison["missing"], comparison["extra"]
+    return [
+        {
+            "name": _index_name(keys),
+            "keys": keys,
+            "status": "missing" if keys in missing else "extra" if keys in extra else "present",
+        }
+        for keys in document.list_indexes() + extra
+    ]
+
+
+def create_indexes(document: type[Document]) -> int:
+    """
+    Create the missing indexes declared on ``document``.
+
+    Returns:
+        int: Number of indexes created.
+    """
+    missing = document.compare_indexes()["missing"]
+    if missing:
+        logger.info(f"Creating {len(missing)} indexes on {document._get_collection_name()}")
+        document.ensure_indexes()
+    return len(missing)
+
+
+def plan_summary(explain: dict) -> dict:
+    """
+    Summarize the winning plan of the ``explain`` output of a query.
+
+    Returns:
+        dict: ``stages`` of the plan, from its root, ``indexes`` used, whether the query was ``covered``
+        (answered from the index keys only) and, if the plan was executed, the ``keys_examined``,
+        ``docs_examined`` and ``returned`` documents.
+    """
+    winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+    # With the slot-based execution engine, the stages are under queryPlan
+    plans = [winning_plan.get("queryPlan", winning_plan)]
+    stages, indexes = [], []
+    while plans:
+        plan = plans.pop(0)
+        stages.append(plan.get("stage"))
+        if "indexName" in plan:
+            indexes.append(plan["indexName"])
+        plans.extend([plan["inputStage"]] if "inputStage" in plan else plan.get("inputStages", []))
+
+    summary = {
+        "stages": stages,
+        "indexes": indexes,
+        "covered": bool(indexes) and not FETCH_STAGES.intersection(stages),
+    }
+    stats = explain.get("executionStats")
+    if stats:
+        summary["keys_examined"] = stats.get("totalKeysExamined")
+        summary["docs_examined"] = stats.get("totalDocsExamined")
+        summary["returned"] = stats.get("nReturned")
+    return summary
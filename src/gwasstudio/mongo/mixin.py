@@ -1,5 +1,7 @@
 import datetime
 import json
+import re
+from enum import Enum
 
 from mongoengine.errors import NotUniqueError
 from mongoengine.queryset.visitor import Q
@@ -8,6 +10,52 @@ from gwasstudio import logger
 from gwasstudio.utils import find_item
 
 
+def _contains(value, flags: int) -> re.Pattern:
+    return re.compile(re.escape(str(value)), flags)
+
+
+def _json_clause(field: str, item: dict, embedded: bool, exact_match: bool, flags: int) -> dict:
+    """
+    Return the filter of the documents whose JSON ``field`` can match all the key-values of ``item``.
+
+    An embedded document is filtered on each key, which can use an index; a JSON string can only be
+    filtered on containing the values, the keys being checked by :func:`_json_item_matches`.
+    """
+    if not item:
+        return {}
+    if not embedded:
+        return {"$and": [{field: _contains(value, flags)} for value in item.values()]}
+    clauses = []
+    for key, value in item.items():
+        if exact_match:
+            pattern = re.compile(f"^{re.escape(str(value))}$", flags)
+            clauses.append({f"{field}.{key}": pattern if isinstance(value, str) else {"$in": [pattern, value]}})
+        else:
+            clauses.append({f"{field}.{key}": _contains(value, flags)})
+    return {"$and": clauses}
+
+
+def _json_item_matches(doc: dict, field: str, item: dict, embedded: bool, exact_match: bool, flags: int) -> bool:
+    """Return whether the JSON ``field`` of ``doc``, returned by the filter of :func:`_json_clause`, matches ``item``."""
+    if embedded:
+        return True
+    serialized = doc.get(field) or "{}"
+    if not isinstance(serialized, str):
+        serialized = json.dumps(serialized)
+    if not all(_contains(value, flags).search(serialized) for value in item.values()):
+        return False
+    data = json.loads(serialized)
+    if exact_match:
+        # exact_match: exact match for all JSON fields' key-values
+        return all(str(find_item(data, key)).strip() == str(value).strip() for key, value in item.items())
+    # not exact_match: substring match for JSON fields
+    return any(
+        value.casefold() in str(find_item(data, key.split(".").pop()) or "").casefold()
+        for key, value in item.items()
+        if isinstance(value, str)
+    )
+
+
 class MongoMixin:
     def __init_subclass__(cls, **kwargs):
         attr_to_check = ["mdb_obj", "klass", "mec", "pk", "unique_key"]
@@ -110,36 +158,21 @@ class MongoMixin:
 
         with self.mec:
             if len(jds.keys()) > 0:  # there are JSON fields to query
+                flags = 0 if case_sensitive else re.IGNORECASE
                 for jdk, jdv in jds.items():
-                    query_fields_contains = {f"{jdk}__{contains_op}.{key}": value for key, value in jdv.items()}
-
-                    for key, value in query_fields_contains.items():
-                        query_field_contains = key.split(".")[0]
-                        queries.append(Q(**{query_field_contains: value}))
+                    embedded = self.klass._fields[jdk].embedded
+                    queries.append(Q(__raw__=_json_clause(jdk, jdv, embedded, exact_match, flags)))
 
                     # Use & operator to combine all the queries with AND logic
                     query_args = Q()
                     for q in queries:
                         query_args = query_args & q
                     logger.debug(query_args)
-                    all_docs = list(self.klass.objects(query_args).as_pymongo())
-                    if exact_match:
-                        # exact_math: exact match for all JSON fields' key-values
-                        for qr in all_docs:
-                            data = json.loads(qr.get(jdk, "{}"))
-                            if all(str(find_item(data, k)).strip() == str(v).strip() for k, v in jdv.items()):
-                                docs.append(qr)
-                    else:
-                        # not exact_match: substring match for JSON fields
-                        docs.extend(
-                            qr
-                            for qr in all_docs
-                            if any(
-                                value.casefold() in find_item(json.loads(qr[jdk]), key.split(".").pop()).casefold()
-                                for key, value in jdv.items()
-                                if isinstance(value, str)
-                            )
-                        )
+                    docs.extend(
+                        qr
+                        for qr in self.klass.objects(query_args).as_pymongo()
+                        if _json_item_matches(qr, jdk, jdv, embedded, exact_match, flags)
+                    )
             else:
                 for query_arg in queries:
                     logger.debug(query_arg)
@@ -148,6 +181,106 @@ class MongoMixin:
 
         return docs
 
+    def _search_filter(self, case_sensitive: bool, exact_match: bool, criteria: dict) -> tuple[dict, dict]:
+        """
+        Compile the search ``criteria`` into a single MongoDB filter.
+
+        Returns:
+            tuple[dict, dict]: The filter, and the lists of key-value dictionaries of the JSON fields
+            searched, to check the documents returned against.
+        """
+        flags = 0 if case_sensitive else re.IGNORECASE
+
+        def _exact(value):
+            value = value.value if isinstance(value, Enum) else value
+            return value if case_sensitive else re.compile(f"^{re.escape(str(value))}$", flags)
+
+        json_fields = self.klass.json_dict_fields()
+        jds = {}
+        clauses = []
+        for key, value in criteria.items():
+            if key == "text":
+                # Words of the trait descriptions, searched with the text index
+                clauses.append({"$text": {"$search": str(value), "$caseSensitive": case_sensitive}})
+            elif key in json_fields:
+                jds[key] = value if isinstance(value, list) else [value]
+                embedded = self.klass._fields[key].embedded
+                clauses.append({"$or": [_json_clause(key, item, embedded, exact_match, flags) for item in jds[key]]})
+            elif key == "data_ids" or isinstance(value, list):
+                field = "data_id" if key == "data_ids" else key
+                clauses.append({field: {"$in": [_exact(v) for v in value]}})
+            else:
+                clauses.append({key: _exact(value)})
+        logger.debug(clauses)
+        return {"$and": clauses}, jds
+
+    def search(self, case_sensitive=False, exact_match=False, only=None, **criteria):
+        """
+        Find the documents matching all the search criteria with a single query.
+
+        The results are the ones of :meth:`query` run on each criterion, intersected: a list of values
+        (``data_ids``, or a list for a regular field) matches any of them, and a JSON field matches
+        any of its list of key-value dictionaries. The ``text`` criterion matches the documents whose
+        trait has any of its words.
+
+        Args:
+            case_sensitive (bool, optional): Whether the query should be case-sensitive. Defaults to False.
+            exact_match (bool, optional): Whether the query should force exact matches for all JSON fields. Defaults to False.
+            only (list, optional): Fields of the documents to return, all if None. The JSON fields searched
+                are always returned.
+            **criteria: Search criteria, as in a search file.
+
+        Returns:
+            list: A list of query results.
+        """
+        if not criteria:
+            return []
+        query, jds = self._search_filter(case_sensitive, exact_match, criteria)
+        flags = 0 if case_sensitive else re.IGNORECASE
+
+        def _matches(doc, key, items):
+            embedded = self.klass._fields[key].embedded
+            return any(_json_item_matches(doc, key, item, embedded, exact_match, flags) for item in items)
+
+        with self.mec:
+            # The queryset needs the connection, opened by the connection manager
+            queryset = self.klass.objects(__raw__=query)
+            if only is not None:
+                # The JSON fields searched are checked against the items of the search
+                queryset = queryset.only(*set(only).union(jds))
+            docs = [
+                doc for doc in queryset.as_pymongo() if all(_matches(doc, key, items) for key, items in jds.items())
+            ]
+        logger.debug(f"found {len(docs)} documents")
+        return docs
+
+    def explain(self, case_sensitive=False, exact_match=False, **criteria):
+        """
+        Return the ``explain`` output of the query run by :meth:`search` with the same arguments.
+        """
+        query, _ = self._search_filter(case_sensitive, exact_match, criteria)
+        with self.mec:
+            return self.klass.objects(__raw__=query).explain()
+
+    def count_by(self, fields: list[str], match: dict | None = None) -> list[dict]:
+        """
+        Count the documents of each combination of values of ``fields`` with a single aggregation.
+
+        Args:
+            fields (list[str]): Fields to group the documents by.
+            match (dict, optional): Filter of the documents to count, all if None.
+
+        Returns:
+            list[dict]: The values of ``fields`` of each group, with its ``count``, sorted by ``fields``.
+        """
+        pipeline = [{"$match": match}] if match else []
+        pipeline += [
+            {"$group": {"_id": {field: f"${field}" for field in fields}, "count": {"$sum": 1}}},
+            {"$sort": {f"_id.{field}": 1 for field in fields}},
+        ]
+        with self.mec:
+            return [{**group["_id"], "count": group["count"]} for group in self.klass.objects.aggregate(pipeline)]
+
     def modify(self, **kwargs):
         """
         Perform an atomic update of the document in the database and
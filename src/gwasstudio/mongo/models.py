@@ -18,12 +18,37 @@ Ancestry = Enum("Ancestry", {item.replace(" ", "_").upper(): item for item in cm
 Build = Enum("Build", {item.replace(" ", "_").upper(): item for item in cm.get_build_list})
 
 
+def embedded_json() -> bool:
+    """Whether the JSON fields are stored as embedded documents instead of JSON strings."""
+    return bool(cm.get_mdbc_embedded_json)
+
+
+def load_json(value) -> dict:
+    """Return the value of a JSON field as stored in MongoDB, a JSON string or an embedded document, as a dict."""
+    if value is None:
+        return {}
+    return json.loads(value) if isinstance(value, str) else value
+
+
 class JSONField(StringField):
+    """
+    A dictionary stored as a JSON string or, if :func:`embedded_json`, as an embedded document.
+
+    Both representations are read back as dictionaries.
+    """
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
+    @property
+    def embedded(self) -> bool:
+        return embedded_json()
+
     def to_mongo(self, value):
         if value is not None:
+            value = self.to_python(value)
+            if embedded_json():
+                return value
             try:
                 return json.dumps(value)
             except TypeError as e:
@@ -38,11 +63,55 @@ class JSONField(StringField):
                 raise ValidationError("Invalid JSON string: {}".format(e))
         return value
 
+    def prepare_query_value(self, op, value):
+        # Updates store the value like a save does
+        if op == "set" and value is not None:
+            return self.to_mongo(self.to_python(value))
+        return super().prepare_query_value(op, value)
+
     def validate(self, value):
         if value is not None and not isinstance(value, (str, dict, list)):
             raise ValidationError("Invalid JSON value")
 
 
+# Keys of the JSON fields indexed when they are stored as embedded documents
+EMBEDDED_JSON_INDEXES = (
+    "trait.code",
+    "trait.desc",
+    "trait.gene_ids",
+    "trait.protein_ids",
+    "trait.seqid",
+    "notes.source_id",
+)
+
+
+def data_profile_indexes() -> list:
+    """
+    Return the indexes of the DataProfile documents, as mongoengine index specifications.
+
+    They cover the searches on category, project, study, build, population and tags, and the ``text``
+    search on the trait descriptions.
+    """
+    indexes = [
+        {"fields": ["category", "project", "study"]},
+        {"fields": ["project", "study"]},
+        {"fields": ["study"]},
+        {"fields": ["build"]},
+        {"fields": ["population"]},
+        {"fields": ["tags"]},
+        # A JSON string is indexed with its keys, an embedded document on its description only
+        {
+            "fields": ["$trait.desc" if embedded_json() else "$trait"],
+            "name": "trait_text",
+            "default_language": "none",
+            "cls": False,
+        },
+    ]
+    if embedded_json():
+        indexes.extend({"fields": [key]} for key in EMBEDDED_JSON_INDEXES)
+    return indexes
+
+
 class Metadata(Document):
     creation_date = DateTimeField(default=datetime.datetime.now())
     modification_date = DateTimeField()
@@ -71,13 +140,18 @@ class DataProfile(Metadata):
     references = ListField(ReferenceField(Publication))
     build = EnumField(Build)
     notes = JSONField()
+    stats = JSONField()
+
+    # The indexes are created once by `gwasstudio db-index --create`, not at the first query of a process
+    meta = {"indexes": data_profile_indexes(), "auto_create_index": False}
 
     @staticmethod
     def json_dict_fields() -> tuple:
         """
         Returns a tuple of field names in this metadata class that store JSON-formatted data.
 
-        These fields are stored as strings in MongoDB, where each string contains a valid JSON object.
+        These fields are stored in MongoDB as strings, where each string contains a valid JSON object, or as
+        embedded documents if :func:`embedded_json`.
         The purpose of this method is to provide a convenient way to access these JSON-formatted fields.
 
         :return: A tuple of field names (str) that store JSON-formatted data
@@ -110,6 +184,7 @@ class EnhancedDataProfile(MongoMixin):
             references=kwargs.get("references", []),
             build=kwargs.get("build", None),
             notes=kwargs.get("notes", None),
+            stats=kwargs.get("stats", None),
         )
 
     # required attributes
@@ -13,9 +13,15 @@ from typing import Any, Dict
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import tiledb
+from pyarrow import fs
 
 from gwasstudio.utils.hashing import Hashing
+from gwasstudio.utils.phewas import write_phewas_index
+from gwasstudio.utils.tophits import write_tophits
+from gwasstudio.utils.trait_stats import compute_trait_stats, write_trait_stats
 
 
 def check_file_exists(input_file: str, logger: object) -> bool:
@@ -104,7 +110,14 @@ def parse_uri(uri: str) -> tuple[str, str, str]:
         raise ValueError(f"Invalid URI: {uri}") from e
 
 
-def process_and_ingest(file_path: str, uri: str, cfg: dict, ingest_pval: bool) -> None:
+def process_and_ingest(
+    file_path: str,
+    uri: str,
+    cfg: dict,
+    ingest_pval: bool,
+    tophits_thr: float | None = None,
+    phewas_index: bool = False,
+) -> tuple[str, dict]:
     """
     Process a single file and ingest it in a TileDB
 
@@ -112,6 +125,11 @@ def process_and_ingest(file_path: str, uri: str, cfg: dict, ingest_pval: bool) -
         file_path (str): The path where the file to ingest is stored
         uri (str): The path where the TileDB is stored.
         cfg (dict): A configuration dictionary to use for connecting to S3.
+        tophits_thr (float, optional): Threshold of the top hits array of the TileDB, None if it has none.
+        phewas_index (bool, optional): Whether to also write the data to the PheWAS index of the TileDB.
+
+    Returns:
+        tuple[str, dict]: The TRAITID of the file and its summary statistics, also stored in the TileDB metadata.
     """
 
     def read_gwas_file(file_path, ingest_pval=False):
@@ -159,7 +177,8 @@ def process_and_ingest(file_path: str, uri: str, cfg: dict, ingest_pval: bool) -
 
     # Add trait_id based on the checksum_dict
     hg = Hashing()
-    df["TRAITID"] = hg.compute_hash(fpath=file_path)
+    trait_id = hg.compute_hash(fpath=file_path)
+    df["TRAITID"] = trait_id
     # Store the processed data in TileDB
     ctx = tiledb.Ctx(tiledb.Config(cfg))
     tiledb.from_pandas(
@@ -169,6 +188,13 @@ def process_and_ingest(file_path: str, uri: str, cfg: dict, ingest_pval: bool) -
         mode="append",
         ctx=ctx,
     )
+    if tophits_thr is not None:
+        write_tophits(df, uri, cfg, tophits_thr)
+    if phewas_index:
+        write_phewas_index(df, uri, cfg)
+    stats = compute_trait_stats(df)
+    write_trait_stats(uri, cfg, trait_id, stats)
+    return trait_id, stats
 
 
 def write_table(
@@ -246,3 +272,67 @@ def write_if_not_empty(
         log_msg=log_msg,
         **kwargs,
     )
+
+
+def _dataset_directory(where: str) -> tuple[fs.FileSystem, str]:
+    return fs.FileSystem.from_uri(where if "://" in where else str(pathlib.Path(where).absolute()))
+
+
+def clear_dataset(where: str, logger: object) -> None:
+    """
+    Remove the files of a parquet dataset, so that none of a previous run is left among the new parts.
+
+    :param where: Directory of the dataset (or of one of its partitions), local or remote.
+    :param logger: The logger object used for logging messages.
+    """
+    filesystem, directory = _dataset_directory(where)
+    if filesystem.get_file_info(directory).type != fs.FileType.NotFound:
+        logger.info(f"Removing the files of {where}")
+        filesystem.delete_dir_contents(directory, missing_dir_ok=True)
+
+
+def write_dataset_part(
+    frames: Dict[str, pd.DataFrame],
+    where: str,
+    part: int,
+    logger: object,
+    key: str = "TRAITID",
+    compression: bool = True,
+) -> int:
+    """
+    Write several DataFrames as a single file of a parquet dataset, with one row group per DataFrame.
+
+    Each DataFrame is tagged with its dictionary key in the ``key`` column, so that the dataset can be
+    filtered on it. Several writers can fill the same dataset directory concurrently, as long as each
+    one is given a different ``part`` number. Empty DataFrames are skipped and no file is written if
+    all of them are empty.
+
+    :param frames: DataFrames to write, keyed by the value of the ``key`` column.
+    :param where: Directory of the dataset (or of one of its partitions), local or remote.
+    :param part: Number of the file within ``where``.
+    :param logger: The logger object used for logging messages.
+    :param key: Name of the column holding the dictionary keys.
+    :param compression: Compression flag indicating whether to compress the file.
+    :return: Number of rows written.
+    """
+    tables = [
+        pa.Table.from_pandas(df.assign(**{key: name})[[key] + df.columns.tolist()], preserve_index=False)
+        for name, df in frames.items()
+        if df is not None and not df.empty
+    ]
+    if not tables:
+        logger.info(f"Nothing to write to part {part} of {where}")
+        return 0
+
+    filesystem, directory = _dataset_directory(where)
+    filesystem.create_dir(directory, recursive=True)
+    output_path = f"{directory}/part-{part:05d}.parquet"
+    logger.info(f"Saving {len(tables)} tables to {output_path}")
+
+    schema = tables[0].schema.remove_metadata()
+    with pq.ParquetWriter(
+        output_path, schema, filesystem=filesystem, compression="snappy" if compression else "none"
+    ) as writer:
+        for table in tables:
+            writer.write_table(table.select(schema.names).cast(schema))
+    return sum(table.num_rows for table in tables)
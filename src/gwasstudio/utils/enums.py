@@ -62,6 +62,11 @@ class MetadataEnum(BaseEnum):
     SOMALOGIC_ID = ("trait_seqid", DataType.STRING_PA)
     TISSUE = ("trait_tissue", DataType.CATEGORY)
     UNIT = ("trait_unit", DataType.STRING_PA)
+    N_VARIANTS = ("stats_n_variants", DataType.UINT64_PA)
+    MAX_MLOG10P = ("stats_max_mlog10p", DataType.FLOAT_PA)
+    MIN_PVALUE = ("stats_min_pvalue", DataType.FLOAT_PA)
+    LAMBDA_GC = ("stats_lambda_gc", DataType.FLOAT_PA)
+    N_SIGNIFICANT = ("stats_n_significant", DataType.UINT64_PA)
 
     @classmethod
     def required_fields(cls):
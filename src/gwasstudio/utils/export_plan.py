@@ -0,0 +1,159 @@
+"""
+Export plan
+===========
+Estimates of the size of an export, computed without reading any attribute data.
+
+The cells of each trait come from the statistics stored at ingestion time (see
+:mod:`gwasstudio.utils.trait_stats`) or, for traits ingested before them, from the cell counts of the
+fragments holding the trait. The fragment reads come from the non-empty domains of the fragments.
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+import tiledb
+
+from gwasstudio.utils.tdb_schema import DimensionEnum
+from gwasstudio.utils.trait_stats import read_trait_stats
+
+PLAN_COLUMNS = ["URI", "TRAITID", "CELLS", "BYTES", "FRAGMENTS", "SOURCE"]
+# In-memory size of a variable-sized value (a Python string in a DataFrame)
+VAR_CELL_BYTES = 64
+# Ratio between the peak memory of a task and the size of the data it reads
+MEMORY_OVERHEAD = 3
+# Tasks each worker thread should run, at least, to be worth its startup
+MIN_TASKS_PER_THREAD = 4
+
+
+def cell_bytes(schema: tiledb.ArraySchema, attributes: list[str] | None) -> int:
+    """Return the in-memory size of a cell of ``schema`` with its dimensions and ``attributes`` (all if None)."""
+    fields = list(schema.domain) + [
+        schema.attr(i) for i in range(schema.nattr) if attributes is None or schema.attr(i).name in attributes
+    ]
+    return sum(VAR_CELL_BYTES if field.isvar else np.dtype(field.dtype).itemsize for field in fields)
+
+
+def _overlap(regions: pd.DataFrame, chrom: int, start: int, end: int) -> int:
+    """Return the number of bp of ``regions`` (CHR, START, END) within ``chrom:start-end``."""
+    on_chrom = regions[regions["CHR"] == chrom]
+    lengths = np.minimum(on_chrom["END"], end) - np.maximum(on_chrom["START"], start) + 1
+    return int(np.clip(lengths, 0, None).sum())
+
+
+def _region_fraction(pos_range: dict, regions: pd.DataFrame | None) -> float:
+    """
+    Return the fraction of the variants of a trait within ``regions``, assuming the variants are evenly
+    spread over the positions of ``pos_range`` (the min and max POS of each chromosome).
+    """
+    if regions is None:
+        return 1.0
+    span = sum(end - start + 1 for start, end in pos_range.values())
+    covered = sum(_overlap(regions, int(chrom), start, end) for chrom, (start, end) in pos_range.items())
+    return min(1.0, covered / span) if span else 0.0
+
+
+def plan_group(
+    uri: str, cfg: dict, traits: list[str], attributes: list[str] | None, regions: pd.DataFrame | None = None
+) -> pd.DataFrame:
+    """
+    Estimate the cells, the in-memory bytes and the fragments read for each trait of the array at ``uri``.
+
+    Args:
+        uri (str): URI of a project/study array.
+        cfg (dict): TileDB configuration.
+        traits (list[str]): TRAITIDs to export.
+        attributes (list[str] | None): Attributes to export, all if None.
+        regions (pd.DataFrame | None): Regions (CHR, START, END) to export, the whole traits if None.
+
+    Returns:
+        pd.DataFrame: One row per trait, with the ``PLAN_COLUMNS``.
+    """
+    ctx = tiledb.Ctx(tiledb.Config(cfg))
+    stats = read_trait_stats(uri, cfg)
+    with tiledb.open(uri, mode="r", ctx=ctx) as arr:
+        width = cell_bytes(arr.schema, attributes)
+        dims = [dim.name for dim in arr.schema.domain]
+    chrom_dim, trait_dim, pos_dim = (dim.get_value() for dim in DimensionEnum)
+    fragments = [
+        (dict(zip(dims, frag.nonempty_domain)), frag.cell_num) for frag in tiledb.array_fragments(uri, ctx=ctx)
+    ]
+    # Fragments sorted by their lowest TRAITID: with the running maximum of their highest one, the fragments
+    # that can hold a trait are a contiguous range, found by binary search
+    lows = np.array([str(box[trait_dim][0]) for box, _ in fragments], dtype=object)
+    order = np.argsort(lows, kind="stable")
+    fragments = [fragments[i] for i in order]
+    lows = lows[order]
+    highs = np.array([str(box[trait_dim][1]) for box, _ in fragments], dtype=object)
+    reach = np.maximum.accumulate(highs) if len(highs) else highs
+    cells = np.array([cells for _, cells in fragments], dtype=float)
+
+    # Traits known to the array, to share the cells of fragments holding several traits
+    known = np.unique(np.asarray(list(stats) + list(traits), dtype=object))
+    shares = np.maximum(1, np.searchsorted(known, highs, side="right") - np.searchsorted(known, lows, side="left"))
+    if regions is not None:
+        # Fragments read for the regions, whichever the trait
+        in_regions = np.array(
+            [
+                any(
+                    _overlap(regions, chrom, int(box[pos_dim][0]), int(box[pos_dim][1])) > 0
+                    for chrom in range(int(box[chrom_dim][0]), int(box[chrom_dim][1]) + 1)
+                )
+                for box, _ in fragments
+            ],
+            dtype=bool,
+        )
+
+    rows = []
+    for trait in traits:
+        first, last = np.searchsorted(reach, trait, side="left"), np.searchsorted(lows, trait, side="right")
+        candidates = np.arange(first, last)
+        trait_fragments = candidates[(highs[first:last] >= trait).astype(bool)] if last > first else candidates
+        if trait in stats:
+            source = "stats"
+            n_cells = stats[trait]["n_variants"]
+            pos_range = stats[trait]["pos_range"]
+        else:
+            source = "fragments"
+            n_cells, pos_range = float(np.sum(cells[trait_fragments] / shares[trait_fragments])), {}
+            for i in trait_fragments:
+                box = fragments[i][0]
+                chrom_lo, chrom_hi = (int(b) for b in box[chrom_dim])
+                for chrom in range(chrom_lo, chrom_hi + 1):
+                    start, end = pos_range.get(str(chrom), (math.inf, 0))
+                    pos_range[str(chrom)] = (min(start, int(box[pos_dim][0])), max(end, int(box[pos_dim][1])))
+        if regions is not None:
+            trait_fragments = trait_fragments[in_regions[trait_fragments]]
+        n_cells = round(n_cells * _region_fraction(pos_range, regions))
+        rows.append([uri, trait, n_cells, n_cells * width, len(trait_fragments), source])
+    return pd.DataFrame(rows, columns=PLAN_COLUMNS)
+
+
+def suggest_cluster(task_bytes: int, n_tasks: int, memory_per_worker: int, threads_per_worker: int) -> dict:
+    """
+    Suggest the Dask workers and batch size of an export.
+
+    The threads of a worker run tasks concurrently, so a worker runs as many tasks as fit in its memory.
+    There are enough workers for each thread to run at least ``MIN_TASKS_PER_THREAD`` tasks, and each
+    batch is one round of tasks over all the threads.
+
+    Args:
+        task_bytes (int): Size of the data read by the largest task.
+        n_tasks (int): Number of read tasks.
+        memory_per_worker (int): Memory of a worker.
+        threads_per_worker (int): Threads of a worker.
+
+    Returns:
+        dict: ``task_memory`` (peak memory of the largest task), ``tasks_per_worker``, ``workers``,
+        ``batch_size`` and ``fits`` (whether the largest task fits in the memory of a worker).
+    """
+    task_memory = task_bytes * MEMORY_OVERHEAD
+    tasks_per_worker = max(1, min(threads_per_worker, memory_per_worker // max(1, task_memory)))
+    workers = max(1, math.ceil(n_tasks / (tasks_per_worker * MIN_TASKS_PER_THREAD)))
+    return {
+        "task_memory": task_memory,
+        "tasks_per_worker": tasks_per_worker,
+        "workers": workers,
+        "batch_size": workers * tasks_per_worker,
+        "fits": task_memory <= memory_per_worker,
+    }
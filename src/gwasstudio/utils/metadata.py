@@ -1,15 +1,25 @@
+import datetime
+import itertools
 import json
+import time
 from pathlib import Path
 from typing import Any, Dict, List, Hashable
 
+import numpy as np
 import pandas as pd
+from pymongo import UpdateOne
 from ruamel.yaml import YAML
 
 from gwasstudio import logger
-from gwasstudio.mongo.models import EnhancedDataProfile, DataProfile
+from gwasstudio.mongo.connection_manager import get_mec
+from gwasstudio.mongo.indexes import create_indexes, plan_summary
+from gwasstudio.mongo.models import EMBEDDED_JSON_INDEXES, EnhancedDataProfile, DataProfile, embedded_json, load_json
 from gwasstudio.utils import lower_and_replace, Hashing
 from gwasstudio.utils.enums import MetadataEnum
 
+# Number of documents written by each bulk write of the metadata
+BULK_BATCH_SIZE = 1000
+
 
 def load_search_topics(search_file: str) -> Any | None:
     """
@@ -71,52 +81,59 @@ def query_mongo_obj(
     data_profile: EnhancedDataProfile,
     case_sensitive: bool = False,
     exact_match: bool = False,
+    explain: bool = False,
+    fields: List[str] | None = None,
 ) -> List[Dict[str, Any]]:
     """
     Query the data profile object to find matching results based on search criteria.
 
+    All the criteria are compiled into a single MongoDB query, with the list-valued criteria as ``$in`` and
+    ``$or`` clauses, so that the intersection of the criteria is computed by the server.
+
     Args:
         search_criteria (Dict[str, Any]): Dictionary containing search criteria.
         data_profile (EnhancedDataProfile): Data profile object to be queried.
         case_sensitive (bool): Flag to enable case-sensitive search. Default is False.
         exact_match (bool): Flag to enable exact match search. Default is False.
+        explain (bool): Flag to log the query plan, with the indexes used. Default is False.
+        fields (List[str] | None): Columns of the :func:`dataframe_from_mongo_objs` built from the results,
+            to return only the document fields they need. Default is None, all the fields.
 
     Returns:
         List[Dict[str, Any]]: List of matched data profile entries.
     """
-    matched_entries = []
-    keys_to_search = tuple(DataProfile.json_dict_fields())
-
     logger.debug(search_criteria)
 
-    # Iterate over search criteria
-    for key, value in search_criteria.items():
-        # Create query dictionary and execute data profile query
-        if key in keys_to_search:
-            query_results = []
-            for item in value:
-                query_dict = {key: item}
-                logger.debug(query_dict)
-                query_results.extend(data_profile.query(case_sensitive, exact_match, **query_dict))
-            matched_entries.append(query_results)
-        else:
-            query_dict = {key: value}
-            logger.debug(query_dict)
-            query_results = data_profile.query(case_sensitive, exact_match, **query_dict)
-            matched_entries.append(query_results)
+    if explain and search_criteria:
+        summary = plan_summary(data_profile.explain(case_sensitive, exact_match, **search_criteria))
+        coverage = "covered by" if summary["covered"] else "using" if summary["indexes"] else "not using"
+        logger.info(f"Query plan: {' <- '.join(summary['stages'])}, {coverage} indexes {summary['indexes']}")
+        if "docs_examined" in summary:
+            logger.info(
+                f"{summary['keys_examined']} index keys and {summary['docs_examined']} documents examined,"
+                f" {summary['returned']} returned"
+            )
 
-    # Create a dictionary of matched entries with their IDs as keys
-    results_dict = {str(entry["_id"]): entry for entry_list in matched_entries for entry in entry_list}
+    start = time.perf_counter()
+    only = None if fields is None else projection_fields(fields)
+    results = data_profile.search(case_sensitive, exact_match, only, **search_criteria)
+    logger.info(f"{len(results)} metadata documents found in {time.perf_counter() - start:.3f} s")
+    return results
 
-    # Find common IDs among matched entries
-    common_ids = set(str(entry["_id"]) for entry in matched_entries[0])
-    for entry_list in matched_entries[1:]:
-        common_ids.intersection_update(str(entry["_id"]) for entry in entry_list)
 
-    # Filter final results by common IDs
-    final_results = [entry for entry_id, entry in results_dict.items() if entry_id in common_ids]
+def projection_fields(fields: List[str]) -> List[str]:
+    """
+    Return the document fields needed to build the columns ``fields`` of :func:`dataframe_from_mongo_objs`.
 
-    return final_results
+    A column of a JSON field, e.g. ``trait_desc``, needs the whole field; unknown columns need no field.
+    """
+    json_dict_fields = set(DataProfile.json_dict_fields())
+    projection = set()
+    for field in fields:
+        field = field.replace(".", "_")
+        main_key = field.split("_", 1)[0]
+        projection.add(main_key if main_key in json_dict_fields else field)
+    return sorted(projection.intersection(DataProfile._fields))
 
 
 def dataframe_from_mongo_objs(
@@ -170,20 +187,21 @@ def dataframe_from_mongo_objs(
         elif len(link_keys_in_search) > 1:
             raise ValueError("Only one of 'trait' or 'notes' is allowed in search_topics")
 
+    columns = [field.replace(".", "_") for field in fields]  # replace '.' with '_' (if any) to match data types
+    split_columns = [column.split("_", 1) for column in columns]
+    # Parse the JSON fields of each document once, whatever the number of their columns
+    parsed = {
+        main_key: [load_json(obj.get(main_key)) for obj in objs]
+        for main_key in {parts[0] for parts in split_columns if len(parts) == 2 and parts[0] in json_dict_fields}
+    }
+
     results = {}
-    for field in fields:
-        field = field.replace(".", "_")  # replace '.' with '_' (if any) to match data types
-        main_key, *rest = field.split("_", 1)
-        sub_key = rest[0] if rest else None
-
-        values = []
-        for obj in objs:
-            if main_key in json_dict_fields and sub_key:
-                json_dict = json.loads(obj.get(main_key, "{}"))
-                values.append(json_dict.get(sub_key))
-            else:
-                values.append(obj.get(field))
-        results[field] = pd.Series(values, dtype=data_types.get(field, "object"))
+    for column, parts in zip(columns, split_columns):
+        if len(parts) == 2 and parts[0] in parsed:
+            values = [json_dict.get(parts[1]) for json_dict in parsed[parts[0]]]
+        else:
+            values = [obj.get(column) for obj in objs]
+        results[column] = pd.Series(values, dtype=data_types.get(column, "object"))
 
     meta_df = pd.DataFrame(data=results)
 
@@ -194,17 +212,17 @@ def dataframe_from_mongo_objs(
             # for substring match, a metadata column can have multiple matches with searched IDs
             # (e.g. multiProt "P29459|P29460" matches with both "P29459" and "P29460")
             # thus, the metadata is expanded for each searched ID
-            searched_ids = {
-                v for item in search_topics[link_key] for v in item.values()
-            }  # extract searched trait/notes
-            expanded_rows = []
-            for _, row in meta_df.iterrows():
-                matched = [sid for sid in searched_ids if sid in str(row[link_column])]
-                for link_id in matched:
-                    new_row = row.copy()
-                    new_row["link_id"] = link_id
-                    expanded_rows.append(new_row)
-            meta_df = pd.DataFrame(expanded_rows)
+            searched_ids = list(dict.fromkeys(v for item in search_topics[link_key] for v in item.values()))
+            link_values = meta_df[link_column].astype("string[pyarrow]").fillna("")
+            positions, link_ids = [], []
+            for searched_id in searched_ids:
+                matched = np.flatnonzero(link_values.str.contains(str(searched_id), regex=False).to_numpy(dtype=bool))
+                positions.append(matched)
+                link_ids.append(np.full(len(matched), searched_id, dtype=object))
+            positions, link_ids = np.concatenate(positions), np.concatenate(link_ids)
+            # Each row is repeated for its matches, in the order of the searched IDs
+            order = np.argsort(positions, kind="stable")
+            meta_df = meta_df.iloc[positions[order]].assign(link_id=link_ids[order])
 
     return meta_df
 
@@ -272,8 +290,33 @@ def process_row(row: tuple[Any]) -> dict[Hashable, Any]:
     }
 
 
-def ingest_metadata(df: pd.DataFrame, mongo_uri: str = None) -> None:
-    """Ingest data into the MongoDB collection."""
+def ingest_metadata(
+    df: pd.DataFrame,
+    mongo_uri: str = None,
+    bulk: bool = False,
+    batch_size: int = BULK_BATCH_SIZE,
+    with_indexes: bool = False,
+) -> dict[str, int] | None:
+    """
+    Ingest data into the MongoDB collection.
+
+    Args:
+        df (pd.DataFrame): Metadata table, one row per document.
+        mongo_uri (str, optional): MongoDB URI.
+        bulk (bool, optional): Upsert the documents in batches of ``batch_size`` over a single connection,
+            instead of saving them one at a time.
+        batch_size (int, optional): Number of documents of each bulk batch.
+        with_indexes (bool, optional): Create the missing indexes of the collection before the ingestion.
+            Otherwise they are created once, by ``gwasstudio db-index --create``.
+
+    Returns:
+        dict[str, int] | None: With ``bulk``, the number of ``inserted`` and ``updated`` documents.
+    """
+    if with_indexes:
+        with get_mec(uri=mongo_uri):
+            create_indexes(DataProfile)
+    if bulk:
+        return bulk_ingest_metadata(df, mongo_uri, batch_size)
 
     def _document_generator(df):
         for row in df.itertuples(index=False):
@@ -296,3 +339,112 @@ def ingest_metadata(df: pd.DataFrame, mongo_uri: str = None) -> None:
         # Print the row counter every 100 rows
         if processed_rows % 100 == 0:
             logger.info(f"{processed_rows} documents processed")
+
+
+def _upsert(doc: dict, modification_date: datetime.datetime) -> UpdateOne:
+    """
+    Return the upsert of the document ``doc`` (from :func:`process_row`), keyed on project, study and data_id.
+
+    The fields of an existing document are overwritten, the others (e.g. its ``stats``) are kept.
+    """
+    profile = DataProfile(**{key: value for key, value in doc.items() if key in DataProfile._fields})
+    profile.modification_date = modification_date
+    profile.validate()
+    fields = profile.to_mongo().to_dict()
+    fields.pop("_id", None)
+    creation_date = fields.pop("creation_date", modification_date)
+    key = {"project": profile.project, "study": profile.study, "data_id": profile.data_id}
+    return UpdateOne(key, {"$set": fields, "$setOnInsert": {"creation_date": creation_date}}, upsert=True)
+
+
+def bulk_ingest_metadata(df: pd.DataFrame, mongo_uri: str = None, batch_size: int = BULK_BATCH_SIZE) -> dict[str, int]:
+    """
+    Upsert the metadata documents of ``df`` with one bulk write per batch of ``batch_size`` documents.
+
+    Returns:
+        dict[str, int]: Number of ``inserted`` and ``updated`` documents.
+    """
+    logger.info(f"Starting bulk metadata ingestion: {len(df)} documents to ingest")
+    counts = {"inserted": 0, "updated": 0}
+    now = datetime.datetime.now()
+    requests = (_upsert(process_row(row), now) for row in df.itertuples(index=False))
+    with get_mec(uri=mongo_uri):
+        collection = DataProfile._get_collection()
+        while batch := list(itertools.islice(requests, batch_size)):
+            result = collection.bulk_write(batch, ordered=True)
+            counts["inserted"] += result.upserted_count
+            counts["updated"] += result.matched_count
+            logger.info(f"{counts['inserted'] + counts['updated']} documents processed")
+    logger.info(f"{counts['inserted']} documents inserted, {counts['updated']} updated")
+    return counts
+
+
+def ingest_trait_stats(group: Dict[str, str], stats: Dict[str, dict], mongo_uri: str = None) -> int:
+    """
+    Store the summary statistics computed at ingestion time in the metadata documents of their traits.
+
+    Args:
+        group (Dict[str, str]): Values of the TileDB grouping fields of the traits (see
+            :meth:`MetadataEnum.get_tiledb_grouping_fields`), e.g. their project and study.
+        stats (Dict[str, dict]): The statistics of each trait, by data_id.
+        mongo_uri (str, optional): MongoDB URI.
+
+    Returns:
+        int: Number of documents updated; traits without a metadata document are skipped.
+    """
+    updated = 0
+    for data_id, trait_stats in stats.items():
+        obj = EnhancedDataProfile(uri=mongo_uri, data_id=data_id, **group)
+        updated += bool(obj.modify(stats=json.dumps(trait_stats)))
+    logger.info(f"Summary statistics of {updated}/{len(stats)} traits stored in the metadata")
+    return updated
+
+
+def migrate_json_fields(embedded: bool, mongo_uri: str = None, batch_size: int = BULK_BATCH_SIZE) -> int:
+    """
+    Convert the JSON fields of the metadata documents between JSON strings and embedded documents.
+
+    With ``embedded``, the ``EMBEDDED_JSON_INDEXES`` are created, so that the queries on these keys are
+    indexed. The ``embedded_json`` option of the configuration must match the storage of the documents.
+
+    Args:
+        embedded (bool): Convert the JSON strings to embedded documents, or the embedded documents back to
+            JSON strings.
+        mongo_uri (str, optional): MongoDB URI.
+        batch_size (int, optional): Number of documents of each bulk write.
+
+    Returns:
+        int: Number of documents converted.
+    """
+    if embedded != embedded_json():
+        logger.warning(
+            f"The configuration stores the JSON fields as {'embedded documents' if embedded_json() else 'JSON strings'}:"
+            " set 'embedded_json' accordingly before querying the migrated documents"
+        )
+    fields = DataProfile.json_dict_fields()
+    stored_type = str if embedded else dict
+
+    def _convert(value):
+        return load_json(value) if embedded else json.dumps(value)
+
+    converted = 0
+    with get_mec(uri=mongo_uri):
+        collection = DataProfile._get_collection()
+        # Only the documents with a field still to convert
+        query = {"$or": [{field: {"$type": "string" if embedded else "object"}} for field in fields]}
+        docs = collection.find(query, {field: 1 for field in fields})
+        requests = (
+            UpdateOne(
+                {"_id": doc["_id"]},
+                {"$set": {f: _convert(v) for f, v in doc.items() if f in fields and isinstance(v, stored_type)}},
+            )
+            for doc in docs
+        )
+        while batch := list(itertools.islice(requests, batch_size)):
+            converted += collection.bulk_write(batch, ordered=False).modified_count
+            logger.info(f"{converted} documents converted")
+        if embedded:
+            for key in EMBEDDED_JSON_INDEXES:
+                collection.create_index(key)
+            logger.info(f"Indexes on {', '.join(EMBEDDED_JSON_INDEXES)} created")
+    return converted
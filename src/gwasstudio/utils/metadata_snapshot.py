@@ -0,0 +1,144 @@
+"""
+Metadata snapshot
+=================
+A copy of the metadata records in a parquet file, searched locally instead of MongoDB.
+
+The snapshot has a column per field of the records, with the JSON fields as JSON strings, as stored in
+MongoDB by default. Once loaded, the keys of the JSON fields are also in ``<field>.<key>`` columns, e.g.
+``trait.desc``, which the searches filter on.
+
+The searches of a snapshot match the ones of :meth:`gwasstudio.mongo.mixin.MongoMixin.search`, with the
+items of the JSON fields matched key by key, as when the JSON fields are stored as embedded documents.
+"""
+
+import json
+import re
+from enum import Enum
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from gwasstudio import logger
+from gwasstudio.mongo.connection_manager import get_mec
+from gwasstudio.mongo.models import DataProfile, load_json
+
+# Fields of the records left out of a snapshot
+SNAPSHOT_EXCLUDED_FIELDS = ("_id", "_cls", "references")
+
+
+def write_metadata_snapshot(path: str | Path, mongo_uri: str = None) -> int:
+    """
+    Write the DataProfile records to the parquet file at ``path``.
+
+    Returns:
+        int: Number of records written.
+    """
+    json_fields = DataProfile.json_dict_fields()
+    with get_mec(uri=mongo_uri):
+        docs = list(DataProfile.objects().as_pymongo())
+    records = [
+        {
+            key: json.dumps(value) if key in json_fields and not isinstance(value, str) else value
+            for key, value in doc.items()
+            if key not in SNAPSHOT_EXCLUDED_FIELDS
+        }
+        for doc in docs
+    ]
+    snapshot = pd.DataFrame.from_records(records)
+    snapshot.to_parquet(path, index=False)
+    logger.info(f"{len(snapshot)} metadata records written to {path}")
+    return len(snapshot)
+
+
+def load_metadata_snapshot(path: str | Path) -> pd.DataFrame:
+    """Load the snapshot at ``path``, with the keys of its JSON fields as ``<field>.<key>`` columns."""
+    snapshot = pd.read_parquet(path)
+    keys = []
+    for field in set(DataProfile.json_dict_fields()).intersection(snapshot.columns):
+        parsed = pd.DataFrame.from_records([load_json(value) for value in snapshot[field]], index=snapshot.index)
+        keys.append(parsed.astype("string[pyarrow]").add_prefix(f"{field}."))
+    logger.debug(f"{len(snapshot)} metadata records loaded from {path}")
+    return pd.concat([snapshot, *keys], axis=1)
+
+
+def _text(values: pd.Series, case_sensitive: bool) -> pd.Series:
+    text = values.astype("string[pyarrow]")
+    return text if case_sensitive else text.str.lower()
+
+
+def _matches(values: pd.Series, searched: list, case_sensitive: bool, exact: bool) -> pd.Series:
+    """Return whether each of ``values`` matches any of ``searched``, exactly or as a substring."""
+    searched = [str(value.value if isinstance(value, Enum) else value) for value in searched]
+    if not case_sensitive:
+        searched = [value.lower() for value in searched]
+    text = _text(values, case_sensitive)
+    if exact:
+        return text.isin(searched).fillna(False).astype(bool)
+    mask = pd.Series(False, index=values.index)
+    for value in searched:
+        mask |= text.str.contains(value, regex=False).fillna(False).astype(bool)
+    return mask
+
+
+def _field_mask(snapshot: pd.DataFrame, field: str, searched: list, case_sensitive: bool, exact: bool) -> pd.Series:
+    """Return whether the ``field`` of each record matches any of ``searched``; a list field, with any item."""
+    if field not in snapshot.columns:
+        return pd.Series(False, index=snapshot.index)
+    values = snapshot[field]
+    if field in DataProfile.listfield_names():
+        items = values.explode()
+        mask = _matches(items, searched, case_sensitive, exact)
+        return mask.groupby(level=0).any().reindex(snapshot.index, fill_value=False)
+    return _matches(values, searched, case_sensitive, exact)
+
+
+def search_metadata_snapshot(
+    snapshot: pd.DataFrame, search_criteria: dict | None, case_sensitive: bool = False, exact_match: bool = False
+) -> list[dict]:
+    """
+    Search the records of a snapshot loaded by :func:`load_metadata_snapshot`.
+
+    Args:
+        snapshot (pd.DataFrame): The snapshot.
+        search_criteria (dict | None): Search criteria, as in a search file.
+        case_sensitive (bool): Flag to enable case-sensitive search. Default is False.
+        exact_match (bool): Flag to enable exact match search for the JSON fields. Default is False.
+
+    Returns:
+        list[dict]: The matching records, as returned by MongoDB.
+    """
+    if not search_criteria:
+        return []
+    json_fields = DataProfile.json_dict_fields()
+    mask = pd.Series(True, index=snapshot.index)
+    for key, value in search_criteria.items():
+        if key == "text":
+            # Whole words of the traits, as the text index
+            flags = 0 if case_sensitive else re.IGNORECASE
+            words = "|".join(re.escape(word) for word in str(value).split())
+            text = snapshot["trait"].astype("string[pyarrow]").str.contains(rf"\b(?:{words})\b", flags=flags)
+            mask &= text.fillna(False).astype(bool)
+        elif key in json_fields:
+            # Any of the items, with all their keys
+            json_mask = pd.Series(False, index=snapshot.index)
+            for item in value if isinstance(value, list) else [value]:
+                item_mask = pd.Series(True, index=snapshot.index)
+                for sub_key, sub_value in item.items():
+                    item_mask &= _field_mask(snapshot, f"{key}.{sub_key}", [sub_value], case_sensitive, exact_match)
+                json_mask |= item_mask
+            mask &= json_mask
+        else:
+            field = "data_id" if key == "data_ids" else key
+            mask &= _field_mask(snapshot, field, value if isinstance(value, list) else [value], case_sensitive, True)
+
+    documents = [column for column in snapshot.columns if "." not in column]
+    matched = snapshot.loc[mask, documents].astype(object)
+    matched = matched.where(matched.notna(), None)
+    records = matched.to_dict("records")
+    for record in records:
+        for field in DataProfile.listfield_names():
+            if isinstance(record.get(field), np.ndarray):
+                record[field] = record[field].tolist()
+    logger.info(f"{len(records)} metadata records found in the snapshot")
+    return records
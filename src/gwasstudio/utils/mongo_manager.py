@@ -1,11 +1,23 @@
+import fcntl
+import os
+import signal
+import socket
 import subprocess
 import time
 from contextlib import contextmanager
+from pathlib import Path
+
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
 
 from gwasstudio import logger, mongo_db_path, mongo_db_logpath
+from gwasstudio.mongo.connection_manager import close_connection
 from gwasstudio.utils.cfg import get_mongo_deployment, get_mongo_uri
 
-mongo_deployment_types = ["embedded", "standalone"]
+mongo_deployment_types = ["embedded", "daemon", "standalone"]
+# Delays between the pings of a starting server, and of a stopping server's process, in seconds
+READY_BACKOFF_START = 0.05
+READY_BACKOFF_MAX = 0.5
 
 
 @contextmanager
@@ -13,6 +25,10 @@ def manage_mongo(ctx):
     """
     Context manager to handle the lifecycle of MongoDB server.
 
+    With the ``embedded`` deployment, the server is started and stopped by each command. With the ``daemon``
+    deployment, the server is started by the first command and left running for the next ones, until
+    ``gwasstudio mongo-daemon --stop``.
+
     Args:
         ctx: The context object containing configuration details.
 
@@ -22,11 +38,12 @@ def manage_mongo(ctx):
     Raises:
         Exception: If an error occurs during the MongoDB server management.
     """
-    embedded_mongo = (get_mongo_deployment(ctx) == "embedded") and (
+    deployment = get_mongo_deployment(ctx)
+    embedded_mongo = (deployment in ("embedded", "daemon")) and (
         (get_mongo_uri(ctx) is None) or ("localhost:27018" in get_mongo_uri(ctx))
     )
     logger.debug(f"Embedded MongoDB: {embedded_mongo}")
-    mdb = MongoDBManager()
+    mdb = MongoDBManager(daemon=deployment == "daemon")
     if embedded_mongo:
         mdb.start()
     try:
@@ -35,10 +52,53 @@ def manage_mongo(ctx):
         logger.error(f"Error occurred: {e}")
         raise
     finally:
-        if embedded_mongo:
+        if embedded_mongo and not mdb.daemon:
+            # The pooled connection would outlive the server
+            close_connection()
             mdb.stop()
 
 
+def _backoff(timeout: float):
+    """Yield the successive delays of the retries within ``timeout`` seconds, from READY_BACKOFF_START, doubling."""
+    deadline = time.monotonic() + timeout
+    delay = READY_BACKOFF_START
+    while (remaining := deadline - time.monotonic()) > 0:
+        yield min(delay, remaining)
+        delay = min(delay * 2, READY_BACKOFF_MAX)
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        # A child of this process has exited once reaped
+        if os.waitpid(pid, os.WNOHANG)[0] == pid:
+            return False
+    except ChildProcessError:
+        pass
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Running, under another user
+        return True
+    return True
+
+
+def _cmdline(pid: int) -> list[str] | None:
+    """Return the command line of the process ``pid``, None if it cannot be read, e.g. without ``/proc``."""
+    try:
+        return Path(f"/proc/{pid}/cmdline").read_bytes().decode(errors="replace").split("\0")[:-1]
+    except OSError:
+        return None
+
+
+def _option(cmdline: list[str], name: str) -> str | None:
+    try:
+        return cmdline[cmdline.index(name) + 1]
+    except (ValueError, IndexError):
+        return None
+
+
 class MongoDBManager:
     """
     Initialize the embedded MongoDBManager with the given database path and log path.
@@ -48,69 +108,183 @@ class MongoDBManager:
         logpath (str): The path to the MongoDB log file.
         port (int): The port on which the MongoDB server will run. Default is 27018.
         timeout (int): The timeout period for starting the MongoDB server. Default is 5 seconds.
+        daemon (bool): Keep the server running after the command, for the next ones. Its process is recorded in
+            a pidfile next to the database, whose lock is held while the server is started or stopped.
     """
 
-    def __init__(self, dbpath=mongo_db_path, logpath=mongo_db_logpath, port=27018, timeout=5):
+    def __init__(self, dbpath=mongo_db_path, logpath=mongo_db_logpath, port=27018, timeout=5, daemon=False):
         self.dbpath = dbpath
         self.process = None
         self.logpath = logpath
         self.host = "localhost"
         self.port = port
         self.timeout = timeout
+        self.daemon = daemon
+        self.pidfile = Path(dbpath).with_name("mongod.pid")
+
+    def _command(self) -> list[str]:
+        return [
+            "mongod",
+            "--dbpath",
+            str(self.dbpath),
+            "--logpath",
+            str(self.logpath),
+            "--logappend",
+            "--port",
+            str(self.port),
+        ]
+
+    def ping(self, timeout: float = 1) -> bool:
+        """Return whether the server answers a ping within ``timeout`` seconds."""
+        try:
+            # Fails at once while the server is not listening, unlike a ping
+            socket.create_connection((self.host, self.port), timeout=timeout).close()
+        except OSError:
+            return False
+        client = MongoClient(self.host, self.port, directConnection=True, serverSelectionTimeoutMS=int(timeout * 1000))
+        try:
+            client.admin.command("ping")
+            return True
+        except PyMongoError:
+            return False
+        finally:
+            client.close()
+
+    def wait_until_ready(self, process=None) -> bool:
+        """
+        Wait for the server to answer a ping, for up to ``timeout`` seconds.
+
+        Args:
+            process (subprocess.Popen, optional): Process of the server, to stop waiting if it exits.
+
+        Returns:
+            bool: Whether the server is ready.
+        """
+        for delay in _backoff(self.timeout):
+            if process is not None and process.poll() is not None:
+                logger.error("MongoDB server stopped unexpectedly.")
+                return False
+            if self.ping():
+                logger.info(f"MongoDB server on {self.host}:{self.port} is running and ready to accept connections.")
+                return True
+            time.sleep(delay)
+        logger.error("MongoDB server did not start within the timeout period.")
+        return False
+
+    @contextmanager
+    def _lock(self):
+        """Hold the lock of the pidfile, shared by the commands of every process on the node."""
+        with open(self.pidfile.with_suffix(".lock"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _is_daemon(self, pid: int) -> bool:
+        """
+        Return whether the process ``pid`` is the server of this database, and not a process reusing its pid
+        after a crash or a reboot: its command has the ``--dbpath`` and ``--port`` of this server or, where the
+        command line is not available, the server answers a ping.
+        """
+        if not _is_alive(pid):
+            return False
+        cmdline = _cmdline(pid)
+        if not cmdline:
+            # Not readable, or empty while the process is being executed
+            return self.ping()
+        command = self._command()
+        return (
+            Path(cmdline[0]).name == Path(command[0]).name
+            and _option(cmdline, "--dbpath") == _option(command, "--dbpath")
+            and _option(cmdline, "--port") == _option(command, "--port")
+        )
+
+    def daemon_pid(self) -> int | None:
+        """
+        Return the process of the daemon, None if it is not running. A stale pidfile is removed.
+
+        Raises:
+            RuntimeError: If the daemon runs on another node, sharing the database path.
+        """
+        try:
+            host, pid, port = self.pidfile.read_text().split()
+        except (FileNotFoundError, ValueError):
+            return None
+        if host != socket.gethostname():
+            raise RuntimeError(f"The MongoDB daemon of {self.dbpath} runs on {host}, stop it there first")
+        if not self._is_daemon(int(pid)):
+            logger.debug(f"Removing the stale pidfile of the MongoDB daemon (pid {pid})")
+            self.pidfile.unlink(missing_ok=True)
+            return None
+        return int(pid)
 
     def start(self):
         """
-        Start the MongoDB server.
+        Start the MongoDB server, or in daemon mode reuse the running one.
 
         Raises:
             Exception: If the MongoDB server fails to start.
         """
+        if self.daemon:
+            self.start_daemon()
+            return
         try:
             # Start the MongoDB server
-            self.process = subprocess.Popen(
-                ["mongod", "--dbpath", self.dbpath, "--logpath", self.logpath, "--logappend", "--port", str(self.port)],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-            )
+            self.process = subprocess.Popen(self._command(), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
             logger.debug("Attempting to start embedded MongoDB server...")
+            self.wait_until_ready(self.process)
+        except Exception as e:
+            logger.error(f"Failed to start MongoDB server: {e}")
 
-            # Check if the server is running
-            # Wait for the server to start
-            start_time = time.time()
-            while time.time() - start_time < self.timeout:
-                return_code = self.process.poll()
-                if return_code is not None:
-                    logger.error("MongoDB server stopped unexpectedly.")
-                    break
-
-                # Check if the server is ready to accept connections
-                try:
-                    # Attempt to connect to the MongoDB server
-                    # Run mongostat with one iteration (-n 1) and timeout
-                    result = subprocess.run(
-                        ["mongostat", "--host", f"{self.host}:{self.port}", "-n", "1"],
-                        capture_output=True,
-                        text=True,
-                        timeout=self.timeout,
-                    )
-                    # If mongostat returns output containing stats, server is up
-                    if result.returncode == 0 and "insert" in result.stdout:
-                        logger.info(
-                            f"MongoDB server on {self.host}:{self.port} is running and ready to accept connections."
-                        )
-                        break
-                except subprocess.TimeoutExpired:
-                    logger.info("mongostat command timed out. Server may be down or unreachable.")
-                    break
+    def start_daemon(self):
+        """
+        Start the MongoDB daemon, unless it is running, and wait for it to be ready.
 
-                # Sleep for a short period before checking again
-                time.sleep(1)
+        Raises:
+            RuntimeError: If the running daemon does not answer.
+        """
+        with self._lock():
+            pid = self.daemon_pid()
+            if pid is not None:
+                logger.debug(f"Reusing the MongoDB daemon (pid {pid})")
+                if not self.wait_until_ready():
+                    raise RuntimeError(
+                        f"The MongoDB daemon (pid {pid}) does not answer, stop it with `gwasstudio mongo-daemon --stop`"
+                    )
+                return
+            # A new session, so that the server outlives the command and its signals
+            process = subprocess.Popen(
+                self._command(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+            )
+            self.pidfile.write_text(f"{socket.gethostname()} {process.pid} {self.port}\n")
+            logger.info(f"Starting the MongoDB daemon (pid {process.pid})")
+            # A slow server is left to the next commands, a failed one is forgotten
+            if not self.wait_until_ready(process) and process.poll() is not None:
+                self.pidfile.unlink(missing_ok=True)
 
-                # If we reach here, the server did not start within the timeout period
-                logger.error("MongoDB server did not start within the timeout period.")
+    def stop_daemon(self) -> bool:
+        """
+        Stop the MongoDB daemon.
 
-        except Exception as e:
-            logger.error(f"Failed to start MongoDB server: {e}")
+        Returns:
+            bool: Whether a running daemon was stopped.
+        """
+        with self._lock():
+            pid = self.daemon_pid()
+            if pid is not None:
+                os.kill(pid, signal.SIGTERM)
+                # mongod flushes its data before exiting
+                for delay in _backoff(max(self.timeout, 60)):
+                    if not _is_alive(pid):
+                        break
+                    time.sleep(delay)
+                else:
+                    logger.error(f"The MongoDB daemon (pid {pid}) did not stop")
+                    return False
+                logger.info(f"MongoDB daemon (pid {pid}) stopped.")
+            self.pidfile.unlink(missing_ok=True)
+        return pid is not None
 
     def stop(self):
         """
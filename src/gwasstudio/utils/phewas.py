@@ -0,0 +1,116 @@
+"""
+PheWAS index
+============
+Variant-major copies of the TileDB datasets, ordered by CHR, POS and TRAITID, for the lookup of a few
+variants or small regions across all the traits of a project/study, at ``<uri>/__gwasstudio/phewas``.
+"""
+
+import pandas as pd
+import tiledb
+
+from gwasstudio import logger
+from gwasstudio.utils.tdb_schema import VariantMajorSchemaCreator, companion_uri, create_companion_dir, nonempty_regions
+
+PHEWAS_NAME = "phewas"
+
+
+def phewas_uri(uri: str) -> str:
+    """Return the URI of the PheWAS index of the array at ``uri``."""
+    return companion_uri(uri, PHEWAS_NAME)
+
+
+def has_phewas_index(uri: str, cfg: dict) -> bool:
+    """Return whether the array at ``uri`` has a PheWAS index."""
+    return tiledb.object_type(phewas_uri(uri), ctx=tiledb.Ctx(tiledb.Config(cfg))) == "array"
+
+
+def create_phewas_index(uri: str, cfg: dict, ingest_pval: bool) -> None:
+    """Create an empty PheWAS index for the array at ``uri``, with MLOG10P if ``ingest_pval``."""
+    logger.info(f"Creating the PheWAS index {phewas_uri(uri)}")
+    create_companion_dir(uri, cfg)
+    VariantMajorSchemaCreator(phewas_uri(uri), cfg, ingest_pval).create_schema()
+
+
+def resolve_phewas_index(uri: str, cfg: dict, requested: bool, new_array: bool, ingest_pval: bool) -> bool:
+    """
+    Return whether to fill the PheWAS index while ingesting into the array at ``uri``.
+
+    An existing index is always kept up to date. An index is only created together with a new array:
+    for an array with data, it has to be built by a backfill.
+
+    Args:
+        uri (str): URI of the array the data are ingested into.
+        cfg (dict): TileDB configuration.
+        requested (bool): Whether an index is requested.
+        new_array (bool): Whether the array has just been created.
+        ingest_pval (bool): Whether the array stores MLOG10P.
+
+    Returns:
+        bool: Whether there is an index to fill.
+    """
+    if has_phewas_index(uri, cfg):
+        return True
+    if not requested:
+        return False
+    if not new_array:
+        logger.warning(f"{uri} already has data: run `gwasstudio phewas-index --uri {uri}` to build its PheWAS index")
+        return False
+    create_phewas_index(uri, cfg, ingest_pval)
+    return True
+
+
+def write_phewas_index(df: pd.DataFrame, uri: str, cfg: dict) -> None:
+    """Append the variants of ``df`` to the PheWAS index of the array at ``uri``."""
+    tiledb.from_pandas(
+        uri=phewas_uri(uri),
+        dataframe=df,
+        index_dims=["CHR", "POS", "TRAITID"],
+        mode="append",
+        ctx=tiledb.Ctx(tiledb.Config(cfg)),
+    )
+
+
+def consolidate_phewas_index(uri: str, cfg: dict) -> None:
+    """
+    Consolidate the fragments of the PheWAS index of the array at ``uri`` into one and vacuum them.
+
+    Each ingested trait appends a fragment spanning the whole genome, which a variant lookup would
+    otherwise have to open; the index is consolidated once the traits of an ingestion are written.
+    """
+    ctx = tiledb.Ctx(tiledb.Config(cfg))
+    index_uri = phewas_uri(uri)
+    logger.info(f"Consolidating the PheWAS index {index_uri}")
+    tiledb.consolidate(index_uri, ctx=ctx)
+    tiledb.vacuum(index_uri, ctx=ctx)
+
+
+def backfill_phewas_index(uri: str, cfg: dict, chunk_size: int = 1_000_000) -> int:
+    """
+    Build the PheWAS index of the array at ``uri`` from its data, replacing any existing one.
+
+    The array is copied one region of ``chunk_size`` bp (with all its traits) at a time, then the
+    fragments of the index are consolidated.
+
+    Returns:
+        int: Number of variants in the index.
+    """
+    ctx = tiledb.Ctx(tiledb.Config(cfg))
+    index_uri = phewas_uri(uri)
+    if has_phewas_index(uri, cfg):
+        logger.info(f"Replacing the PheWAS index {index_uri}")
+        tiledb.Array.delete_array(index_uri, ctx=ctx)
+
+    total = 0
+    with tiledb.open(uri, mode="r", ctx=ctx) as arr:
+        create_phewas_index(uri, cfg, arr.schema.has_attr("MLOG10P"))
+        query = arr.query()
+        for chrom, start, end in nonempty_regions(arr, chunk_size):
+            df = query.df[chrom, :, start:end]
+            if not df.empty:
+                write_phewas_index(df, uri, cfg)
+                total += len(df)
+                logger.debug(f"{chrom}:{start}-{end}: {total} variants so far")
+
+    consolidate_phewas_index(uri, cfg)
+    logger.info(f"{total} variants written to {index_uri}")
+    return total
@@ -1,3 +1,8 @@
+import numpy as np
+import pandas as pd
+from numpy.typing import ArrayLike
+
+
 def is_multiallelic(snpid: str) -> bool:
     """
     Check if a SNP is multi-allelic.
@@ -19,3 +24,60 @@ def is_multiallelic(snpid: str) -> bool:
     _, _, EA, NEA = parts
 
     return len(EA) > 1 or len(NEA) > 1
+
+
+def multiallelic_mask(ea: pd.Series, nea: pd.Series) -> np.ndarray:
+    """
+    Vectorised counterpart of :func:`is_multiallelic`.
+
+    Args:
+        ea (pd.Series): Effect alleles.
+        nea (pd.Series): Non-effect alleles.
+
+    Returns:
+        np.ndarray: Boolean array, True where either allele has length > 1.
+    """
+    return ((ea.astype(str).str.len() > 1) | (nea.astype(str).str.len() > 1)).to_numpy()
+
+
+# Layout of the 64-bit variant keys: | 1 sign bit | 5 bits CHR | 28 bits POS | 30 bits allele hash |
+KEY_CHR_BITS = 5
+KEY_POS_BITS = 28
+KEY_ALLELE_BITS = 30
+
+
+def variant_key(chrom: ArrayLike, pos: ArrayLike, ea: ArrayLike, nea: ArrayLike) -> np.ndarray:
+    """
+    Encode variants as compact 64-bit integer keys, to be used instead of CHR:POS:EA:NEA strings for
+    joins, grouping and deduplication.
+
+    CHR and POS are packed exactly, so keys sort by chromosome then position; the alleles are
+    represented by a 30-bit hash of the (EA, NEA) pair, which only has to tell apart the alleles
+    found at the same position. The hash is deterministic across processes.
+
+    Args:
+        chrom (ArrayLike): Chromosomes (1-24).
+        pos (ArrayLike): Positions (< 2**28).
+        ea (ArrayLike): Effect alleles.
+        nea (ArrayLike): Non-effect alleles.
+
+    Returns:
+        np.ndarray: int64 keys.
+    """
+    alleles = pd.DataFrame({"EA": np.asarray(ea, dtype=object), "NEA": np.asarray(nea, dtype=object)})
+    allele_hash = (
+        pd.util.hash_pandas_object(alleles, index=False).to_numpy() >> np.uint64(64 - KEY_ALLELE_BITS)
+    ).astype(np.int64)
+    chrom = np.asarray(chrom, dtype=np.int64)
+    pos = np.asarray(pos, dtype=np.int64)
+    return (chrom << (KEY_POS_BITS + KEY_ALLELE_BITS)) | (pos << KEY_ALLELE_BITS) | allele_hash
+
+
+def key_chrom(keys: np.ndarray) -> np.ndarray:
+    """Return the chromosomes of variant keys built by :func:`variant_key`."""
+    return keys >> (KEY_POS_BITS + KEY_ALLELE_BITS)
+
+
+def key_pos(keys: np.ndarray) -> np.ndarray:
+    """Return the positions of variant keys built by :func:`variant_key`."""
+    return (keys >> KEY_ALLELE_BITS) & ((1 << KEY_POS_BITS) - 1)
@@ -0,0 +1,209 @@
+"""
+Read-through cache of TileDB fragments on the local disk of the Dask workers.
+
+TileDB fragments (and schema files) are immutable once written, so they can be cached by URI without any
+invalidation protocol: a consolidated or vacuumed array simply stops referencing the old fragments, which
+then age out of the cache. A read for a set of traits downloads only the fragments whose TRAITID domain
+covers those traits, and opens them through a throw-away local "mirror" array made of symlinks.
+
+The cache directory can be shared by several worker processes on the same node: downloads are atomic
+renames, and entries in use are protected from eviction by shared ``flock`` locks.
+"""
+
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator
+
+import tiledb
+
+from gwasstudio import logger
+from gwasstudio.utils.hashing import Hashing
+from gwasstudio.utils.path_joiner import join_path
+
+COMMITS_DIR = "__commits"
+FRAGMENTS_DIR = "__fragments"
+SCHEMA_DIR = "__schema"
+COPY_BUFSIZE = 8 * 1024 * 1024
+
+
+def _download(vfs: tiledb.VFS, src: str, dst: Path) -> int:
+    """Recursively copy ``src`` from any TileDB VFS backend to the local path ``dst``. Returns the bytes copied."""
+    if vfs.is_dir(src):
+        dst.mkdir(parents=True, exist_ok=True)
+        return sum(_download(vfs, child, dst / os.path.basename(child.rstrip("/"))) for child in vfs.ls(src))
+    with vfs.open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        shutil.copyfileobj(fsrc, fdst, COPY_BUFSIZE)
+    return dst.stat().st_size
+
+
+class FragmentCache:
+    """
+    Size-bounded LRU cache of immutable TileDB objects (fragments, schema files) stored under ``directory``.
+
+    Args:
+        directory (str | Path): Local directory holding the cache, e.g. under the worker ``--local-directory``.
+        max_bytes (int): Maximum size of the cache. Least recently used entries not in use are evicted
+            when it is exceeded.
+    """
+
+    def __init__(self, directory: str | Path, max_bytes: int):
+        self.directory = Path(directory)
+        self.entries_dir = self.directory / "entries"
+        self.mirrors_dir = self.directory / "mirrors"
+        self.entries_dir.mkdir(parents=True, exist_ok=True)
+        self.mirrors_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._domains: Dict[tuple, Dict[str, tuple]] = {}
+        self._lock = threading.Lock()
+
+    def stats(self) -> Dict[str, int]:
+        """Return the hit, miss and eviction counters of this process."""
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def _key(self, uri: str) -> str:
+        return f"{Hashing().compute_string_hash(uri)[:16]}_{os.path.basename(uri.rstrip('/'))}"
+
+    @contextmanager
+    def _pinned(self, key: str) -> Iterator[None]:
+        """Hold a shared lock on entry ``key`` so that it cannot be evicted."""
+        with open(self.entries_dir / f"{key}.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def fetch(self, vfs: tiledb.VFS, uri: str) -> Path:
+        """
+        Return the local copy of the immutable object ``uri``, downloading it on a miss.
+
+        The caller must hold the pin of the entry (see :meth:`open`).
+        """
+        key = self._key(uri)
+        path = self.entries_dir / key
+        meta = self.entries_dir / f"{key}.json"
+        if meta.exists():
+            os.utime(meta)
+            with self._lock:
+                self.hits += 1
+            return path
+
+        with self._lock:
+            self.misses += 1
+        tmp = Path(tempfile.mkdtemp(dir=self.entries_dir, prefix=".download-")) / key
+        try:
+            size = _download(vfs, uri, tmp)
+            try:
+                os.rename(tmp, path)
+            except OSError:
+                # Downloaded concurrently by another worker: keep its copy
+                logger.debug(f"{uri} already cached")
+            if not meta.exists():
+                meta.write_text(json.dumps({"uri": uri, "size": size}))
+        finally:
+            shutil.rmtree(tmp.parent, ignore_errors=True)
+        return path
+
+    def evict(self) -> None:
+        """Evict least recently used entries until the cache fits in ``max_bytes``."""
+        entries = []
+        for meta in self.entries_dir.glob("*.json"):
+            try:
+                entries.append((meta.stat().st_mtime, json.loads(meta.read_text())["size"], meta))
+            except (OSError, ValueError, KeyError):
+                continue
+        total = sum(size for _, size, _ in entries)
+        for _, size, meta in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            key = meta.name[: -len(".json")]
+            with open(self.entries_dir / f"{key}.lock", "a") as lock_file:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    continue  # in use
+                try:
+                    meta.unlink(missing_ok=True)
+                    entry = self.entries_dir / key
+                    if entry.is_dir():
+                        shutil.rmtree(entry, ignore_errors=True)
+                    else:
+                        entry.unlink(missing_ok=True)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+            total -= size
+            with self._lock:
+                self.evictions += 1
+
+    def _fragment_domains(self, uri: str, ctx: tiledb.Ctx) -> Dict[str, tuple]:
+        """Map the fragment URIs of ``uri`` to their TRAITID domain, reloading it when the fragments change."""
+        vfs = tiledb.VFS(ctx=ctx)
+        names = frozenset(os.path.basename(f.rstrip("/")) for f in vfs.ls(join_path(uri, FRAGMENTS_DIR)))
+        key = (uri, names)
+        domains = self._domains.get(key)
+        if domains is None:
+            domains = {
+                join_path(uri, FRAGMENTS_DIR, os.path.basename(fragment.uri.rstrip("/"))): fragment.nonempty_domain[1]
+                for fragment in tiledb.FragmentInfoList(uri, ctx=ctx)
+            }
+            with self._lock:
+                self._domains = {k: v for k, v in self._domains.items() if k[0] != uri}
+                self._domains[key] = domains
+        return domains
+
+    def _fragments_for(self, uri: str, ctx: tiledb.Ctx, traits: Iterable[str]) -> list[str]:
+        traits = sorted(set(traits))
+        return [
+            fragment
+            for fragment, (low, high) in self._fragment_domains(uri, ctx).items()
+            if any(low <= trait <= high for trait in traits)
+        ]
+
+    @contextmanager
+    def open(self, uri: str, ctx: tiledb.Ctx, traits: str | Iterable[str]) -> Iterator[tiledb.Array]:
+        """
+        Yield a read-only array holding the cached fragments of ``uri`` that contain ``traits``.
+
+        The returned array must only be queried for ``traits``: fragments of other traits are left out.
+
+        Args:
+            uri (str): URI of the (remote) TileDB array.
+            ctx (tiledb.Ctx): Context used to access the remote array.
+            traits (str | Iterable[str]): Trait(s) that will be read.
+        """
+        traits = [traits] if isinstance(traits, str) else list(traits)
+        vfs = tiledb.VFS(ctx=ctx)
+        fragments = self._fragments_for(uri, ctx, traits)
+        schema_files = vfs.ls(join_path(uri, SCHEMA_DIR))
+        started = time.monotonic()
+        misses = self.misses
+
+        with ExitStack() as stack:
+            mirror = Path(tempfile.mkdtemp(dir=self.mirrors_dir))
+            stack.callback(shutil.rmtree, mirror, ignore_errors=True)
+            for sub_dir in (SCHEMA_DIR, FRAGMENTS_DIR, COMMITS_DIR):
+                (mirror / sub_dir).mkdir()
+
+            for remote, sub_dir in [(f, SCHEMA_DIR) for f in schema_files] + [(f, FRAGMENTS_DIR) for f in fragments]:
+                stack.enter_context(self._pinned(self._key(remote)))
+                name = os.path.basename(remote.rstrip("/"))
+                (mirror / sub_dir / name).symlink_to(self.fetch(vfs, remote))
+                if sub_dir == FRAGMENTS_DIR:
+                    (mirror / COMMITS_DIR / f"{name}.wrt").touch()
+
+            logger.debug(f"{len(fragments)} fragments of {uri} ready in {time.monotonic() - started:.2f}s")
+            array = stack.enter_context(tiledb.open(str(mirror), mode="r", ctx=ctx))
+            yield array
+
+        if self.misses != misses:
+            self.evict()
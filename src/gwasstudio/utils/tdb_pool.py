@@ -0,0 +1,277 @@
+"""
+Worker-side pool of TileDB contexts and read-only array handles.
+
+Opening a TileDB array loads its schema, fragment list and fragment metadata; on S3 each of them is one
+or more round trips. Export tasks that target the same array on the same worker can share a single open
+handle and a single ``tiledb.Ctx`` (and hence its thread pools and caches) instead of paying that cost
+in every task.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator
+
+import tiledb
+from distributed import WorkerPlugin, get_worker
+
+from gwasstudio import logger
+from gwasstudio.utils import parse_uri
+from gwasstudio.utils.hashing import Hashing
+from gwasstudio.utils.path_joiner import join_path
+from gwasstudio.utils.tdb_cache import FragmentCache
+
+FRAGMENTS_DIR = "__fragments"
+
+
+def is_remote_uri(uri: str) -> bool:
+    """Return True if ``uri`` points to an object store rather than to the local filesystem."""
+    scheme, _, _ = parse_uri(uri)
+    return scheme not in ("", "file")
+
+
+def config_hash(cfg: Dict[str, Any] | None) -> str:
+    """Return a stable hash of a TileDB configuration dictionary."""
+    serialized = json.dumps({str(k): str(v) for k, v in (cfg or {}).items()}, sort_keys=True)
+    return Hashing().compute_string_hash(serialized)
+
+
+@dataclass
+class _Handle:
+    array: tiledb.Array
+    fragments: frozenset
+    checked_at: float
+    in_use: int = 0
+    evicted: bool = False
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class TileDBArrayPool:
+    """
+    LRU pool of read-only TileDB array handles sharing one ``tiledb.Ctx`` per configuration.
+
+    Handles are keyed by ``(uri, config hash, timestamp)``. Handles opened at the latest timestamp
+    (``timestamp=None``) are reopened when the fragment list of the array changes, which is checked
+    at most once every ``fragment_check_interval`` seconds.
+
+    Args:
+        max_handles (int): Maximum number of open handles kept in the pool.
+        fragment_check_interval (float): Minimum number of seconds between two fragment list checks.
+        nthreads (int | None): Number of threads of the worker; used to size the TileDB thread pools
+            when they are not set in the configuration.
+        cache (FragmentCache | None): Local cache used for the fragments of remote arrays.
+    """
+
+    def __init__(
+        self,
+        max_handles: int = 32,
+        fragment_check_interval: float = 10.0,
+        nthreads: int | None = None,
+        cache: FragmentCache | None = None,
+    ):
+        self.max_handles = max_handles
+        self.fragment_check_interval = fragment_check_interval
+        self.nthreads = nthreads
+        self.cache = cache
+        self._contexts: Dict[str, tiledb.Ctx] = {}
+        self._handles: OrderedDict[tuple, _Handle] = OrderedDict()
+        self._lock = threading.RLock()
+
+    def ctx(self, cfg: Dict[str, Any] | None) -> tiledb.Ctx:
+        """Return the shared context for ``cfg``, creating it on first use."""
+        key = config_hash(cfg)
+        with self._lock:
+            if key not in self._contexts:
+                self._contexts[key] = tiledb.Ctx(tiledb.Config(self._tune(cfg)))
+            return self._contexts[key]
+
+    def _tune(self, cfg: Dict[str, Any] | None) -> Dict[str, str]:
+        """
+        Add worker-specific defaults to ``cfg``.
+
+        TileDB sizes its thread pools on the hardware concurrency of the node, which on shared nodes is
+        much larger than the cores given to a worker. User-provided values always take precedence.
+        """
+        tuned = {str(k): str(v) for k, v in (cfg or {}).items()}
+        if self.nthreads:
+            for key in ("sm.compute_concurrency_level", "sm.io_concurrency_level"):
+                tuned.setdefault(key, str(self.nthreads))
+        return tuned
+
+    def _list_fragments(self, uri: str, ctx: tiledb.Ctx) -> frozenset:
+        vfs = tiledb.VFS(ctx=ctx)
+        fragments_uri = join_path(uri, FRAGMENTS_DIR)
+        try:
+            return frozenset(vfs.ls(fragments_uri)) if vfs.is_dir(fragments_uri) else frozenset()
+        except tiledb.TileDBError as e:
+            logger.debug(f"Unable to list fragments of {uri}: {e}")
+            return frozenset()
+
+    def _open(self, uri: str, cfg: Dict[str, Any] | None, timestamp: int | None) -> _Handle:
+        ctx = self.ctx(cfg)
+        fragments = self._list_fragments(uri, ctx) if timestamp is None else frozenset()
+        array = tiledb.open(uri, mode="r", ctx=ctx, timestamp=timestamp)
+        logger.debug(f"Opened TileDB array {uri}")
+        return _Handle(array=array, fragments=fragments, checked_at=time.monotonic())
+
+    def _is_stale(self, uri: str, handle: _Handle) -> bool:
+        """Return True if fragments were added to (or removed from) the array since ``handle`` was opened."""
+        now = time.monotonic()
+        with handle.lock:
+            if now - handle.checked_at < self.fragment_check_interval:
+                return False
+            handle.checked_at = now
+        return self._list_fragments(uri, handle.array.ctx) != handle.fragments
+
+    def _discard(self, key: tuple, handle: _Handle) -> None:
+        """Remove ``handle`` from the pool; it is closed as soon as no task uses it. Caller holds the lock."""
+        if self._handles.get(key) is handle:
+            del self._handles[key]
+        handle.evicted = True
+        if handle.in_use == 0:
+            handle.array.close()
+
+    def _acquire(self, key: tuple) -> _Handle | None:
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is not None:
+                self._handles.move_to_end(key)
+                handle.in_use += 1
+            return handle
+
+    def _insert(self, key: tuple, handle: _Handle) -> _Handle:
+        with self._lock:
+            pooled = self._handles.get(key)
+            if pooled is not None:
+                # Another task opened the same array meanwhile: keep a single handle
+                handle.array.close()
+                handle = pooled
+                self._handles.move_to_end(key)
+            else:
+                self._handles[key] = handle
+            handle.in_use += 1
+            while len(self._handles) > self.max_handles:
+                oldest_key, oldest = next(iter(self._handles.items()))
+                self._discard(oldest_key, oldest)
+            return handle
+
+    def _release(self, handle: _Handle) -> None:
+        with self._lock:
+            handle.in_use -= 1
+            if handle.evicted and handle.in_use == 0:
+                handle.array.close()
+
+    @contextmanager
+    def open(
+        self,
+        uri: str,
+        cfg: Dict[str, Any] | None = None,
+        timestamp: int | None = None,
+        traits: str | Iterable[str] | None = None,
+    ) -> Iterator[tiledb.Array]:
+        """
+        Yield a read-only handle on ``uri``, reusing a pooled one when available.
+
+        When a fragment cache is set and ``traits`` is given, remote arrays are read from the local copy
+        of the fragments holding ``traits`` instead; the handle must then only be queried for them.
+
+        Args:
+            uri (str): URI of the TileDB array.
+            cfg (dict, optional): TileDB configuration.
+            timestamp (int, optional): Open the array at this timestamp instead of the latest one.
+            traits (str | Iterable[str], optional): Traits that will be read through the handle.
+        """
+        if self.cache is not None and traits is not None and timestamp is None and is_remote_uri(uri):
+            with self.cache.open(uri, self.ctx(cfg), traits) as arr:
+                yield arr
+            return
+
+        key = (uri, config_hash(cfg), timestamp)
+        handle = self._acquire(key)
+        if handle is not None and timestamp is None and self._is_stale(uri, handle):
+            logger.debug(f"Fragments of {uri} changed, reopening the array")
+            with self._lock:
+                handle.in_use -= 1
+                self._discard(key, handle)
+            handle = None
+        if handle is None:
+            # Opening may take several round trips on S3: do it without holding the pool lock
+            handle = self._insert(key, self._open(uri, cfg, timestamp))
+
+        try:
+            yield handle.array
+        finally:
+            self._release(handle)
+
+    def close(self) -> None:
+        """Close every pooled handle and drop the shared contexts."""
+        with self._lock:
+            for handle in self._handles.values():
+                handle.array.close()
+            self._handles.clear()
+            self._contexts.clear()
+
+
+class TileDBPoolPlugin(WorkerPlugin):
+    """Dask worker plugin that attaches a :class:`TileDBArrayPool` to every worker."""
+
+    name = "gwasstudio-tiledb-pool"
+    cache_dirname = "gwasstudio_fragment_cache"
+
+    def __init__(
+        self,
+        max_handles: int = 32,
+        fragment_check_interval: float = 10.0,
+        cache_size: int = 0,
+        cache_dir: str | None = None,
+    ):
+        """
+        Args:
+            max_handles (int): Maximum number of open handles per worker.
+            fragment_check_interval (float): Minimum number of seconds between two fragment list checks.
+            cache_size (int): Size in bytes of the local fragment cache of each node; 0 disables it.
+            cache_dir (str, optional): Directory holding the fragment cache. Defaults to the worker
+                local directory, which does not survive the worker.
+        """
+        self.max_handles = max_handles
+        self.fragment_check_interval = fragment_check_interval
+        self.cache_size = cache_size
+        self.cache_dir = cache_dir
+        self.pool = None
+
+    def setup(self, worker):
+        cache = None
+        if self.cache_size > 0:
+            cache_dir = join_path(self.cache_dir or worker.local_directory, self.cache_dirname)
+            cache = FragmentCache(cache_dir, self.cache_size)
+        self.pool = TileDBArrayPool(
+            max_handles=self.max_handles,
+            fragment_check_interval=self.fragment_check_interval,
+            nthreads=worker.state.nthreads,
+            cache=cache,
+        )
+
+    def teardown(self, worker):
+        if self.pool is not None:
+            if self.pool.cache is not None:
+                logger.info(f"Fragment cache statistics: {self.pool.cache.stats()}")
+            self.pool.close()
+
+
+_local_pool = TileDBArrayPool()
+
+
+def get_array_pool() -> TileDBArrayPool:
+    """
+    Return the array pool of the current Dask worker.
+
+    Falls back to a process-wide pool when called outside a worker or when the plugin is not registered.
+    """
+    try:
+        plugin = get_worker().plugins.get(TileDBPoolPlugin.name)
+    except ValueError:
+        plugin = None
+    return plugin.pool if plugin is not None and plugin.pool is not None else _local_pool
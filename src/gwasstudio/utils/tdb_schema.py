@@ -1,9 +1,10 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List
 
 import tiledb
 
 from gwasstudio.utils.datatypes import DataType
 from gwasstudio.utils.enums import BaseEnum
+from gwasstudio.utils.path_joiner import join_path
 
 
 class AttributeEnum(BaseEnum):
@@ -122,3 +123,62 @@ class TileDBSchemaCreator:
             tiledb.Array.create(self.uri, schema, ctx=ctx)
         except Exception as e:
             raise RuntimeError(f"Failed to create TileDB schema: {e}")
+
+
+class VariantMajorSchemaCreator(TileDBSchemaCreator):
+    """
+    Schema of a variant-major copy of a dataset, with the dimensions ordered as CHR, POS, TRAITID.
+
+    All the traits of a variant are stored next to each other, so that the lookup of a few variants
+    across every trait reads a few tiles instead of the tiles of every trait.
+    """
+
+    def _create_dimensions(self) -> tiledb.Domain:
+        """
+        Create the dimensions for the TileDB schema, in variant-major order.
+
+        Returns:
+            tiledb.Domain: The domain containing the dimensions.
+        """
+        chrom, trait, pos = super()._create_dimensions()
+        return tiledb.Domain(chrom, pos, trait)
+
+
+def nonempty_regions(tiledb_array: tiledb.Array, chunk_size: int) -> Iterator[tuple[int, int, int]]:
+    """
+    Split the non-empty domain of a dataset into regions of at most ``chunk_size`` bp.
+
+    Args:
+        tiledb_array (tiledb.Array): An open dataset, in any dimension order.
+        chunk_size (int): Size of the regions (in bp).
+
+    Returns:
+        Iterator[tuple[int, int, int]]: Chromosome, start and end (inclusive) of each region.
+    """
+    domain = tiledb_array.nonempty_domain()
+    if domain is None:
+        return
+    bounds = {dim.name: bounds for dim, bounds in zip(tiledb_array.schema.domain, domain)}
+    chrom_min, chrom_max = (int(b) for b in bounds[DimensionEnum.DIM1.get_value()])
+    pos_min, pos_max = (int(b) for b in bounds[DimensionEnum.DIM3.get_value()])
+    for chrom in range(chrom_min, chrom_max + 1):
+        for start in range(pos_min, pos_max + 1, chunk_size):
+            yield chrom, start, min(start + chunk_size - 1, pos_max)
+
+
+# Directory of the companion arrays (top hits, PheWAS index) inside the array they are built from, so that
+# they can neither take the name of another project/study nor be listed among the datasets
+COMPANION_DIR = "__gwasstudio"
+
+
+def companion_uri(uri: str, name: str) -> str:
+    """Return the URI of the companion array ``name`` of the array at ``uri``."""
+    return join_path(uri, COMPANION_DIR, name)
+
+
+def create_companion_dir(uri: str, cfg: dict) -> None:
+    """Create the directory of the companion arrays of the array at ``uri``, if needed."""
+    vfs = tiledb.VFS(ctx=tiledb.Ctx(tiledb.Config(cfg)))
+    directory = join_path(uri, COMPANION_DIR)
+    if not vfs.is_dir(directory):
+        vfs.create_dir(directory)
@@ -0,0 +1,133 @@
+"""
+Top hits
+========
+Companion TileDB arrays holding only the variants of a project/study above a -log10(p-value) threshold.
+
+A companion array, at ``<uri>/__gwasstudio/tophits``, has the schema of the array it is built from, always
+with MLOG10P, and stores its threshold in the array metadata. Queries for variants above a threshold at least as high as the stored
+one can read the companion array instead of the full one.
+"""
+
+import numpy as np
+import pandas as pd
+import tiledb
+
+from gwasstudio import logger
+from gwasstudio.methods.dataframe import _get_log_p_value_from_z
+from gwasstudio.utils.tdb_schema import TileDBSchemaCreator, companion_uri, create_companion_dir, nonempty_regions
+
+TOPHITS_NAME = "tophits"
+THRESHOLD_KEY = "mlog10p_threshold"
+
+
+def tophits_uri(uri: str) -> str:
+    """Return the URI of the companion array of the array at ``uri``."""
+    return companion_uri(uri, TOPHITS_NAME)
+
+
+def get_tophits_threshold(uri: str, cfg: dict) -> float | None:
+    """
+    Return the threshold of the companion array of the array at ``uri``, or None if it does not exist.
+    """
+    ctx = tiledb.Ctx(tiledb.Config(cfg))
+    companion = tophits_uri(uri)
+    if tiledb.object_type(companion, ctx=ctx) != "array":
+        return None
+    with tiledb.open(companion, mode="r", ctx=ctx) as arr:
+        return float(arr.meta[THRESHOLD_KEY])
+
+
+def create_tophits_array(uri: str, cfg: dict, threshold: float) -> None:
+    """Create an empty companion array for the array at ``uri``, holding the variants above ``threshold``."""
+    companion = tophits_uri(uri)
+    logger.info(f"Creating the top hits array {companion} (MLOG10P > {threshold})")
+    create_companion_dir(uri, cfg)
+    TileDBSchemaCreator(companion, cfg, True).create_schema()
+    with tiledb.open(companion, mode="w", ctx=tiledb.Ctx(tiledb.Config(cfg))) as arr:
+        arr.meta[THRESHOLD_KEY] = float(threshold)
+
+
+def resolve_tophits_threshold(uri: str, cfg: dict, threshold: float | None, new_array: bool) -> float | None:
+    """
+    Return the threshold to fill the companion array with while ingesting into the array at ``uri``.
+
+    An existing companion array is always kept up to date, with its own threshold. A companion array is
+    only created together with a new array: for an array with data, it has to be built by a backfill.
+
+    Args:
+        uri (str): URI of the array the data are ingested into.
+        cfg (dict): TileDB configuration.
+        threshold (float | None): Requested threshold, None if not requested.
+        new_array (bool): Whether the array has just been created.
+
+    Returns:
+        float | None: The threshold, or None if there is no companion array to fill.
+    """
+    stored = get_tophits_threshold(uri, cfg)
+    if stored is not None:
+        if threshold is not None and threshold != stored:
+            logger.warning(f"The top hits array of {uri} keeps its threshold {stored} instead of {threshold}")
+        return stored
+    if threshold is None:
+        return None
+    if not new_array:
+        logger.warning(f"{uri} already has data: run `gwasstudio tophits --uri {uri}` to build its top hits array")
+        return None
+    create_tophits_array(uri, cfg, threshold)
+    return threshold
+
+
+def select_tophits(df: pd.DataFrame, threshold: float) -> pd.DataFrame:
+    """Return the variants of ``df`` with MLOG10P above ``threshold``, computing MLOG10P if needed."""
+    if "MLOG10P" not in df.columns:
+        df = df.assign(MLOG10P=_get_log_p_value_from_z(df["BETA"].to_numpy() / df["SE"].to_numpy()).astype(np.float32))
+    return df[df["MLOG10P"] > threshold]
+
+
+def write_tophits(df: pd.DataFrame, uri: str, cfg: dict, threshold: float) -> int:
+    """
+    Append the variants of ``df`` above ``threshold`` to the companion array of the array at ``uri``.
+
+    Returns:
+        int: Number of variants written.
+    """
+    hits = select_tophits(df, threshold)
+    if not hits.empty:
+        tiledb.from_pandas(
+            uri=tophits_uri(uri),
+            dataframe=hits,
+            index_dims=["CHR", "TRAITID", "POS"],
+            mode="append",
+            ctx=tiledb.Ctx(tiledb.Config(cfg)),
+        )
+    return len(hits)
+
+
+def backfill_tophits(uri: str, cfg: dict, threshold: float, chunk_size: int = 25_000_000) -> int:
+    """
+    Build the companion array of the array at ``uri`` from its data, replacing any existing one.
+
+    The array is read one region of ``chunk_size`` bp at a time; the threshold is pushed down to TileDB
+    when the array stores MLOG10P.
+
+    Returns:
+        int: Number of variants in the companion array.
+    """
+    ctx = tiledb.Ctx(tiledb.Config(cfg))
+    companion = tophits_uri(uri)
+    if tiledb.object_type(companion, ctx=ctx) == "array":
+        logger.info(f"Replacing the top hits array {companion}")
+        tiledb.Array.delete_array(companion, ctx=ctx)
+    create_tophits_array(uri, cfg, threshold)
+
+    total = 0
+    with tiledb.open(uri, mode="r", ctx=ctx) as arr:
+        # The condition is a float32 just below the threshold, never stricter; pandas then filters exactly
+        bound = float(np.nextafter(np.float32(threshold), np.float32(-np.inf)))
+        cond = f"MLOG10P > {bound}" if arr.schema.has_attr("MLOG10P") else None
+        query = arr.query(cond=cond) if cond else arr.query()
+        for chrom, start, end in nonempty_regions(arr, chunk_size):
+            total += write_tophits(query.df[chrom, :, start:end], uri, cfg, threshold)
+            logger.debug(f"{chrom}:{start}-{end}: {total} top hits so far")
+    logger.info(f"{total} variants with MLOG10P > {threshold} written to {companion}")
+    return total
@@ -0,0 +1,83 @@
+"""
+Trait statistics
+================
+Per-trait summary statistics computed at ingestion time, while the data of the trait are in memory.
+
+The statistics of a trait are stored as JSON in the metadata of its TileDB array, under the
+``stats_<TRAITID>`` key, and in the ``stats`` field of its metadata document.
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+import tiledb
+from scipy import stats as st
+
+STATS_PREFIX = "stats_"
+# -log10 of the genome-wide significance threshold, 5e-8
+GWS_MLOG10P = -np.log10(5e-8)
+# Median of the chi-squared distribution with one degree of freedom
+CHI2_MEDIAN = 0.454936423119572
+
+
+def _finite(value: float) -> float | None:
+    """Return ``value`` as a float, None if it is not finite (JSON has no NaN nor infinity)."""
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+def compute_trait_stats(df: pd.DataFrame) -> dict:
+    """
+    Compute the summary statistics of the variants of a trait.
+
+    MLOG10P is computed from BETA and SE when ``df`` does not have it.
+
+    Args:
+        df (pd.DataFrame): Variants of a trait, with CHR, POS, BETA and SE, and optionally MLOG10P.
+
+    Returns:
+        dict: ``n_variants``, ``pos_range`` (the min and max POS of each chromosome), ``max_mlog10p``,
+        ``min_pvalue``, ``lambda_gc`` (genomic-control lambda) and ``n_significant`` (variants with a
+        p-value below 5e-8).
+    """
+    z = df["BETA"].to_numpy(dtype=np.float64) / df["SE"].to_numpy(dtype=np.float64)
+    if "MLOG10P" in df.columns:
+        mlog10p = df["MLOG10P"].to_numpy(dtype=np.float64)
+    else:
+        # From the log of the survival function, to keep the smallest p-values from rounding to 0
+        mlog10p = -(st.norm.logsf(np.abs(z)) + np.log(2)) / np.log(10)
+
+    pos_range = df.groupby("CHR", observed=True)["POS"].agg(["min", "max"])
+    pos_range = zip(pos_range.index, pos_range["min"], pos_range["max"])
+    chi2 = np.square(z[np.isfinite(z)])
+    max_mlog10p = np.nanmax(mlog10p) if np.isfinite(mlog10p).any() else np.nan
+    return {
+        "n_variants": len(df),
+        "pos_range": {str(chrom): [int(start), int(end)] for chrom, start, end in pos_range},
+        "max_mlog10p": _finite(max_mlog10p),
+        "min_pvalue": _finite(10.0**-max_mlog10p),
+        "lambda_gc": _finite(np.median(chi2) / CHI2_MEDIAN) if chi2.size else None,
+        "n_significant": int(np.count_nonzero(mlog10p > GWS_MLOG10P)),
+    }
+
+
+def write_trait_stats(uri: str, cfg: dict, trait_id: str, stats: dict) -> None:
+    """Store the statistics of the trait ``trait_id`` in the metadata of the array at ``uri``."""
+    with tiledb.open(uri, mode="w", ctx=tiledb.Ctx(tiledb.Config(cfg))) as arr:
+        arr.meta[f"{STATS_PREFIX}{trait_id}"] = json.dumps(stats)
+
+
+def read_trait_stats(uri: str, cfg: dict) -> dict[str, dict]:
+    """
+    Return the statistics stored in the metadata of the array at ``uri``.
+
+    Returns:
+        dict[str, dict]: The statistics of each trait, by TRAITID.
+    """
+    with tiledb.open(uri, mode="r", ctx=tiledb.Ctx(tiledb.Config(cfg))) as arr:
+        return {
+            key.removeprefix(STATS_PREFIX): json.loads(value)
+            for key, value in arr.meta.items()
+            if key.startswith(STATS_PREFIX)
+        }
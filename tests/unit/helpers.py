@@ -0,0 +1,111 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import tiledb
+
+from gwasstudio.utils import process_and_ingest
+from gwasstudio.utils.hashing import Hashing
+from gwasstudio.utils.tdb_schema import TileDBSchemaCreator
+
+SUMSTATS_DTYPES = {
+    "CHR": np.uint8,
+    "POS": np.uint32,
+    "EAF": np.float32,
+    "SE": np.float32,
+    "BETA": np.float32,
+    "MLOG10P": np.float32,
+}
+
+
+def make_sumstats(n: int = 300, seed: int = 0, **columns) -> pd.DataFrame:
+    """
+    Summary statistics of ``n`` variants, as read from a file to ingest.
+
+    The variants are spread evenly over chromosomes 1 to 3, every 1000 bp, with alleles A/G, an EAF of 0.3 and a
+    standard error of 0.01; the effects and the -log10 p-values are drawn, with ``seed``, from N(0, 0.02) and an
+    exponential of mean 2. Any column can be given instead, as an array or a scalar.
+    """
+    rng = np.random.default_rng(seed)
+    per_chrom = -(-n // 3)
+    index = np.arange(n)
+    df = pd.DataFrame(
+        {
+            "CHR": index // per_chrom + 1,
+            "POS": (index % per_chrom + 1) * 1000,
+            "EA": "A",
+            "NEA": "G",
+            "EAF": 0.3,
+            "SE": 0.01,
+            "BETA": rng.normal(0, 0.02, n),
+            "MLOG10P": rng.exponential(2.0, n),
+        }
+    )
+    for name, values in columns.items():
+        df[name] = values
+    return df.astype(SUMSTATS_DTYPES)
+
+
+def append_trait(uri: str, trait: str) -> None:
+    """Write a fragment of ten constant variants of ``trait`` at positions 1 to 10 of chromosome 1."""
+    df = make_sumstats(10, CHR=1, POS=np.arange(1, 11), NEA="C", EAF=0.1, BETA=0.1, SE=0.1, MLOG10P=1.0)
+    df["TRAITID"] = trait
+    tiledb.from_pandas(uri=uri, dataframe=df, index_dims=["CHR", "TRAITID", "POS"], mode="append")
+
+
+class IngestedArrayTestCase(unittest.TestCase):
+    """
+    Test case with the files of ``n_traits`` traits written in a temporary directory, to be ingested into the
+    array at ``self.uri``.
+    """
+
+    n_traits = 3
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.uri = str(Path(self.tmpdir.name) / "project_study")
+        self.files = []
+        self.traits = []
+        for seed in range(self.n_traits):
+            self.add_trait(seed)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def sumstats(self, seed: int) -> pd.DataFrame:
+        """Summary statistics of the trait written with ``seed``."""
+        return make_sumstats(seed=seed)
+
+    def add_trait(self, seed: int) -> str:
+        """Write the file of one more trait and return its path."""
+        path = str(Path(self.tmpdir.name) / f"trait{seed}.parquet")
+        self.sumstats(seed).to_parquet(path)
+        self.files.append(path)
+        self.traits.append(Hashing().compute_hash(fpath=path))
+        return path
+
+    def ingest(
+        self,
+        files: list[str] | None = None,
+        ingest_pval: bool = True,
+        new_array: bool = True,
+        tophits_thr: float | None = None,
+        phewas_index: bool = False,
+    ) -> list[tuple[str, dict]]:
+        """Ingest ``files`` (all the files by default), creating the array first if ``new_array``."""
+        if new_array:
+            TileDBSchemaCreator(self.uri, {}, ingest_pval).create_schema()
+        return [
+            process_and_ingest(path, self.uri, {}, ingest_pval, tophits_thr, phewas_index)
+            for path in (self.files if files is None else files)
+        ]
+
+    def read(self, uri: str, columns: list[str] | None = None, by: tuple[str, ...] = ("TRAITID", "CHR", "POS")):
+        """Read the whole array at ``uri``, sorted ``by``."""
+        with tiledb.open(uri) as arr:
+            df = arr.query().df[:]
+        if columns is not None:
+            df = df[columns]
+        return df.sort_values(list(by), ignore_index=True)
@@ -1,7 +1,13 @@
 import unittest
+from unittest.mock import patch
 
 from gwasstudio.config_manager import ConfigurationManager
-from gwasstudio.mongo.connection_manager import MongoEngineConnectionManager, get_mec, get_mec_from_config
+from gwasstudio.mongo.connection_manager import (
+    MongoEngineConnectionManager,
+    _SharedConnection,
+    get_mec,
+    get_mec_from_config,
+)
 
 
 class TestMongoEngineConnectionManager(unittest.TestCase):
@@ -26,6 +32,59 @@ class TestMongoEngineConnectionManager(unittest.TestCase):
         cm = ConfigurationManager()
         mec = MongoEngineConnectionManager()
         self.assertEqual(mec.uri, cm.get_mdbc_uri)
+        self.assertEqual(mec.pool_size, cm.get_mdbc_pool_size)
+
+    def test_pool_size(self):
+        mec = MongoEngineConnectionManager(uri="test_uri", pool_size=8)
+        self.assertEqual(mec.pool_size, 8)
+
+
+@patch("gwasstudio.mongo.connection_manager.disconnect")
+@patch("gwasstudio.mongo.connection_manager.connect")
+class TestSharedConnection(unittest.TestCase):
+    def setUp(self):
+        self.shared = _SharedConnection()
+        patcher = patch("gwasstudio.mongo.connection_manager._shared_connection", self.shared)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_connection_is_reused(self, mock_connect, mock_disconnect):
+        mec = MongoEngineConnectionManager(uri="test_uri", pool_size=8)
+        with mec:
+            with mec:
+                self.assertEqual(self.shared.refs, 2)
+        with mec:
+            pass
+        mock_connect.assert_called_once_with(host="test_uri", maxPoolSize=8)
+        mock_disconnect.assert_not_called()
+        self.assertEqual(self.shared.refs, 0)
+
+    def test_other_uri(self, mock_connect, mock_disconnect):
+        with MongoEngineConnectionManager(uri="uri_a", pool_size=8):
+            with self.assertRaises(RuntimeError):
+                with MongoEngineConnectionManager(uri="uri_b", pool_size=8):
+                    pass
+        # Once the connection is released, it can be replaced
+        with MongoEngineConnectionManager(uri="uri_b", pool_size=8):
+            pass
+        self.assertEqual(mock_connect.call_count, 2)
+        mock_disconnect.assert_called_once()
+        self.assertEqual(self.shared.uri, "uri_b")
+
+    def test_fork(self, mock_connect, mock_disconnect):
+        with MongoEngineConnectionManager(uri="test_uri", pool_size=8):
+            pass
+        with patch("gwasstudio.mongo.connection_manager.os.getpid", return_value=-1):
+            with MongoEngineConnectionManager(uri="test_uri", pool_size=8):
+                self.assertEqual(self.shared.pid, -1)
+        self.assertEqual(mock_connect.call_count, 2)
+
+    def test_close(self, mock_connect, mock_disconnect):
+        with MongoEngineConnectionManager(uri="test_uri", pool_size=8):
+            pass
+        self.shared.close()
+        mock_disconnect.assert_called_once()
+        self.assertIsNone(self.shared.uri)
 
     # def test_enter(self):
     #
@@ -1,9 +1,19 @@
+import shutil
+import tempfile
 import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
 
+import numpy as np
 import pandas as pd
+import tiledb
+from dask.distributed import Client
 
-from gwasstudio.cli.export import create_output_prefix_dict
+from gwasstudio.cli.export import TRAIT_ANALYSES, _process_function_tasks, create_output_prefix_dict
+from gwasstudio.methods.extraction_methods import TraitFrame, extract_full_stats
+from gwasstudio.methods.locus_breaker import _process_locusbreaker
 from gwasstudio.utils.enums import MetadataEnum
+from gwasstudio.utils.tdb_schema import TileDBSchemaCreator
 
 
 class TestCreateOutputPrefixDict(unittest.TestCase):
@@ -55,3 +65,185 @@ class TestCreateOutputPrefixDict(unittest.TestCase):
         result = create_output_prefix_dict(df, output_prefix, source_id_column=self.source_id_field)
 
         self.assertEqual(result, {})
+
+
+class TestSharedScanExport(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.client = Client(processes=False, n_workers=1, threads_per_worker=2, dashboard_address=None)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.close()
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.uri = f"{self.tmpdir}/array"
+        TileDBSchemaCreator(self.uri, {}, True).create_schema()
+        rng = np.random.default_rng(0)
+        for trait in ("t1", "t2"):
+            df = pd.DataFrame(
+                {
+                    "CHR": np.repeat(np.array([1, 2], dtype=np.uint8), 50),
+                    "POS": np.tile(np.arange(1, 50001, 1000, dtype=np.uint32), 2),
+                    "EA": "A",
+                    "NEA": "C",
+                    "EAF": np.float32(0.2),
+                    "BETA": rng.normal(size=100).astype(np.float32),
+                    "SE": np.float32(0.1),
+                    "MLOG10P": rng.exponential(3, size=100).astype(np.float32),
+                    "TRAITID": trait,
+                }
+            )
+            tiledb.from_pandas(uri=self.uri, dataframe=df, index_dims=["CHR", "TRAITID", "POS"], mode="append")
+        self.bed = f"{self.tmpdir}/regions.bed"
+        Path(self.bed).write_text("1\t1000\t20000\n2\t5000\t9000\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _export(self, analyses: dict, batch_size: int = 0, **kwargs) -> None:
+        prefix = f"{self.tmpdir}/out"
+        _process_function_tasks(
+            self.uri,
+            {},
+            pd.Series(["t1", "t2"]),
+            "BETA,SE,EAF,MLOG10P,EA,NEA",
+            batch_size,
+            {"t1": f"{prefix}_t1", "t2": f"{prefix}_t2"},
+            "csv",
+            analyses=analyses,
+            dask_client=self.client,
+            output_prefix=prefix,
+            **kwargs,
+        )
+
+    def test_analyses_share_one_read_and_write_side_by_side(self):
+        plot = dict(plot_out=False, color_thr="red", s_value=5)
+        analyses = {
+            "full_stats": dict(pvalue_thr=0.0, **plot),
+            "regions_snps": dict(regions_snps=self.bed, pvalue_filt=0.0, **plot),
+            "locusbreaker": dict(
+                maf=0.01, hole_size=250000, pvalue_sig=5.0, pvalue_limit=3.3, phenovar=False, locus_flanks=100000
+            ),
+            "meta_analysis": {},
+        }
+        with patch.object(TraitFrame, "read", wraps=TraitFrame.read) as read:
+            self._export(analyses)
+        self.assertEqual(sorted(call.args[1] for call in read.call_args_list), ["t1", "t2"])
+
+        outputs = sorted(p.name for p in Path(self.tmpdir).glob("out*.csv"))
+        self.assertEqual(
+            outputs,
+            [
+                "out_meta_analysis.csv",
+                "out_t1.csv",
+                "out_t1_intervals.csv",
+                "out_t1_regions.csv",
+                "out_t1_segments.csv",
+                "out_t2.csv",
+                "out_t2_intervals.csv",
+                "out_t2_regions.csv",
+                "out_t2_segments.csv",
+            ],
+        )
+        full = pd.read_csv(f"{self.tmpdir}/out_t1.csv")
+        regions = pd.read_csv(f"{self.tmpdir}/out_t1_regions.csv")
+        self.assertEqual(len(full), 100)
+        self.assertEqual(regions.groupby("CHR").size().to_dict(), {1: 19, 2: 4})
+
+    def test_single_analysis_keeps_output_names(self):
+        plot = dict(plot_out=False, color_thr="red", s_value=5)
+        with patch.object(TraitFrame, "read") as read:
+            self._export({"regions_snps": dict(regions_snps=self.bed, pvalue_filt=0.0, **plot)})
+        read.assert_not_called()
+        self.assertTrue(Path(f"{self.tmpdir}/out_t1.csv").exists())
+        self.assertFalse(Path(f"{self.tmpdir}/out_t1_regions.csv").exists())
+
+    def test_locusbreaker_dataset(self):
+        locusbreaker = dict(
+            maf=0.01, hole_size=250000, pvalue_sig=5.0, pvalue_limit=3.3, phenovar=False, locus_flanks=100000
+        )
+        self._export({"locusbreaker": locusbreaker})
+        with patch("gwasstudio.cli.export.DATASET_PART_TRAITS", 1):
+            self._export({"locusbreaker": {**locusbreaker, "dataset": True}}, dataset_partition="project=p/study=s")
+
+        for name in ["segments", "intervals"]:
+            partition = Path(f"{self.tmpdir}/out_{name}/project=p/study=s")
+            self.assertEqual(sorted(p.name for p in partition.iterdir()), ["part-00000.parquet", "part-00001.parquet"])
+            dataset = pd.read_parquet(f"{self.tmpdir}/out_{name}")
+            self.assertEqual(dataset["project"].unique().tolist(), ["p"])
+            for trait in ["t1", "t2"]:
+                expected = pd.read_csv(f"{self.tmpdir}/out_{trait}_{name}.csv")
+                result = dataset[dataset["TRAITID"] == trait].drop(columns=["TRAITID", "project", "study"])
+                self.assertGreater(len(result), 0)
+                pd.testing.assert_frame_equal(result.reset_index(drop=True), expected, check_dtype=False)
+        self.assertFalse(Path(f"{self.tmpdir}/out_t1_segments.parquet").exists())
+
+        # A new export replaces the files of the previous one, one part per batch of traits
+        self._export({"locusbreaker": {**locusbreaker, "dataset": True}}, dataset_partition="project=p/study=s")
+        for name in ["segments", "intervals"]:
+            partition = Path(f"{self.tmpdir}/out_{name}/project=p/study=s")
+            self.assertEqual([p.name for p in partition.iterdir()], ["part-00000.parquet"])
+
+    def test_locusbreaker_dataset_batches(self):
+        locusbreaker = dict(
+            maf=0.01, hole_size=250000, pvalue_sig=5.0, pvalue_limit=3.3, phenovar=False, locus_flanks=100000
+        )
+        with patch.dict(TRAIT_ANALYSES, locusbreaker=MagicMock(wraps=_process_locusbreaker)):
+            self._export(
+                {"locusbreaker": {**locusbreaker, "dataset": True}}, batch_size=1, dataset_partition="project=p"
+            )
+            self.assertEqual(TRAIT_ANALYSES["locusbreaker"].call_count, 2)
+        partition = Path(f"{self.tmpdir}/out_segments/project=p")
+        self.assertEqual(sorted(p.name for p in partition.iterdir()), ["part-00000.parquet", "part-00001.parquet"])
+
+    def test_locus_merge(self):
+        locusbreaker = dict(
+            maf=0.01, hole_size=250000, pvalue_sig=5.0, pvalue_limit=3.3, phenovar=False, locus_flanks=100000
+        )
+        # The loci are collected from the runs of the locus-breaker, not computed again
+        with patch.dict(TRAIT_ANALYSES, locusbreaker=MagicMock(wraps=_process_locusbreaker)):
+            self._export({"locusbreaker": locusbreaker, "locus_merge": {}}, batch_size=1)
+            self.assertEqual(TRAIT_ANALYSES["locusbreaker"].call_count, 2)
+        regions = pd.read_csv(f"{self.tmpdir}/out_locus_regions.csv")
+        segments = [pd.read_csv(f"{self.tmpdir}/out_{trait}_segments.csv") for trait in ["t1", "t2"]]
+        self.assertEqual(regions["N_LOCI"].sum(), sum(len(df) for df in segments))
+        self.assertEqual(regions["N_TRAITS"].max(), 2)
+
+
+class TestTraitFrame(unittest.TestCase):
+    def test_matches_the_tiledb_array(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            uri = f"{tmpdir}/array"
+            TileDBSchemaCreator(uri, {}, True).create_schema()
+            df = pd.DataFrame(
+                {
+                    "CHR": np.array([1, 1, 2, 2], dtype=np.uint8),
+                    "POS": np.array([10, 20, 10, 30], dtype=np.uint32),
+                    "EA": "A",
+                    "NEA": "C",
+                    "EAF": np.float32(0.2),
+                    "BETA": np.float32(0.1),
+                    "SE": np.float32(0.1),
+                    "MLOG10P": np.array([1, 7, 2, 9], dtype=np.float32),
+                    "TRAITID": "t1",
+                }
+            )
+            tiledb.from_pandas(uri=uri, dataframe=df, index_dims=["CHR", "TRAITID", "POS"], mode="append")
+            with tiledb.open(uri) as arr:
+                frame = TraitFrame.read(arr, "t1")
+                attrs = ("MLOG10P", "BETA", "EA", "NEA")
+                for key in [(1, "t1", slice(15, 30)), (2, "t1", [10, 30]), (slice(None), "t1", [slice(1, 10)])]:
+                    pd.testing.assert_frame_equal(
+                        frame.query(attrs=attrs).df[key], arr.query(attrs=attrs).df[key], check_index_type=False
+                    )
+                pd.testing.assert_frame_equal(
+                    extract_full_stats(frame, "t1", None, False, "red", 5, 5.0, attrs),
+                    extract_full_stats(arr, "t1", None, False, "red", 5, 5.0, attrs),
+                )
+                with self.assertRaises(tiledb.TileDBError):
+                    frame.query(attrs=("PVAL",))
+        finally:
+            shutil.rmtree(tmpdir)
@@ -0,0 +1,117 @@
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+import tiledb
+
+from gwasstudio.methods.extraction_methods import _merge_windows, extract_regions_leadsnps
+from gwasstudio.utils.tdb_schema import TileDBSchemaCreator
+
+ATTRIBUTES = ("BETA", "SE", "EAF", "MLOG10P", "EA", "NEA")
+
+
+def _write_array(uri: str, df: pd.DataFrame) -> None:
+    TileDBSchemaCreator(uri, {}, True).create_schema()
+    tiledb.from_pandas(uri=uri, dataframe=df, index_dims=["CHR", "TRAITID", "POS"], mode="append")
+
+
+class TestExtractRegionsLeadSnps(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.uri = f"{self.tmpdir}/array"
+        df = pd.DataFrame(
+            {
+                "CHR": np.array([1, 1, 1, 1, 1, 2], dtype=np.uint8),
+                "POS": np.array([100, 200, 300, 400, 5000, 100], dtype=np.uint32),
+                "EA": ["A", "AT", "C", "G", "A", "A"],
+                "NEA": ["C", "A", "G", "T", "G", "C"],
+                "EAF": np.array([0.1] * 6, dtype=np.float32),
+                "BETA": np.array([0.1, 0.2, 0.3, 0.4, 0.5, 0.6], dtype=np.float32),
+                "SE": np.array([0.1] * 6, dtype=np.float32),
+                "MLOG10P": np.array([1.0, 8.0, 8.0, 2.0, 9.0, 3.0], dtype=np.float32),
+                "TRAITID": "trait1",
+            }
+        )
+        _write_array(self.uri, df)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _run(self, trait_snps: pd.DataFrame) -> pd.DataFrame:
+        with tiledb.open(self.uri, mode="r") as arr:
+            return extract_regions_leadsnps(
+                arr, "trait1", None, trait_snps, cis_flanks=250, trans_flanks=10000, attributes=ATTRIBUTES
+            )
+
+    def test_lead_prefers_biallelic_on_ties(self):
+        trait_snps = pd.DataFrame(
+            {"SOURCE_ID": ["s1"], "CHR": [1], "POS": [100], "EA": ["A"], "NEA": ["C"], "CIS_TRANS": ["cis"]}
+        )
+        result = self._run(trait_snps)
+
+        self.assertEqual(result.loc[0, "SOURCEID_SNP"], "s1:1:100:A:C")
+        self.assertEqual(result.loc[0, "SNPID_LEAD"], "1:300:C:G")
+        self.assertAlmostEqual(result.loc[0, "MLOG10P_LEAD"], 8.0)
+        self.assertEqual(result.loc[0, "SNPID_EXACT"], "1:100:A:C")
+        self.assertAlmostEqual(result.loc[0, "BETA_EXACT"], 0.1, places=6)
+
+    def test_trans_window_and_missing_exact(self):
+        trait_snps = pd.DataFrame(
+            {"SOURCE_ID": ["s1"], "CHR": [1], "POS": [400], "EA": ["A"], "NEA": ["C"], "CIS_TRANS": ["trans"]}
+        )
+        result = self._run(trait_snps)
+
+        self.assertEqual(result.loc[0, "SNPID_LEAD"], "1:5000:A:G")
+        self.assertTrue(pd.isna(result.loc[0, "SNPID_EXACT"]))
+        self.assertTrue(np.isnan(result.loc[0, "MLOG10P_EXACT"]))
+
+    def test_empty_region_and_output_order(self):
+        trait_snps = pd.DataFrame(
+            {
+                "SOURCE_ID": ["s1", "s2", "s3"],
+                "CHR": [2, 1, 3],
+                "POS": [100, 2500, 100],
+                "EA": ["A", "A", "A"],
+                "NEA": ["C", "C", "C"],
+                "CIS_TRANS": ["cis", "cis", "cis"],
+            }
+        )
+        result = self._run(trait_snps)
+
+        self.assertEqual(
+            list(result.columns),
+            [
+                "SOURCEID_SNP",
+                "SNPID_LEAD",
+                "MLOG10P_LEAD",
+                "BETA_LEAD",
+                "SE_LEAD",
+                "SNPID_EXACT",
+                "MLOG10P_EXACT",
+                "BETA_EXACT",
+                "SE_EXACT",
+            ],
+        )
+        self.assertEqual(result["SOURCEID_SNP"].tolist(), ["s2:1:2500:A:C", "s1:2:100:A:C", "s3:3:100:A:C"])
+        self.assertTrue(result.loc[0, ["SNPID_LEAD", "SNPID_EXACT"]].isna().all())
+        self.assertEqual(result.loc[1, "SNPID_LEAD"], "2:100:A:C")
+        self.assertTrue(result.loc[2, ["SNPID_LEAD", "SNPID_EXACT"]].isna().all())
+
+
+class TestMergeWindows(unittest.TestCase):
+    def test_overlapping_and_adjacent_windows_are_merged(self):
+        starts = np.array([500, 1, 11, 1000])
+        ends = np.array([600, 10, 20, 2000])
+        self.assertEqual(_merge_windows(starts, ends), [slice(1, 20), slice(500, 600), slice(1000, 2000)])
+
+    def test_nested_windows(self):
+        starts = np.array([1, 5, 50])
+        ends = np.array([100, 10, 60])
+        self.assertEqual(_merge_windows(starts, ends), [slice(1, 100)])
+
+    def test_distant_windows_are_not_merged(self):
+        starts = np.array([1, 240000000])
+        ends = np.array([1000000, 249000000])
+        self.assertEqual(_merge_windows(starts, ends), [slice(1, 1000000), slice(240000000, 249000000)])
@@ -0,0 +1,181 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import tiledb
+
+from gwasstudio.methods.dataframe import process_dataframe
+from gwasstudio.methods.locus_breaker import (
+    _locus_breaker,
+    _process_locusbreaker,
+    _read_locus_windows,
+    locus_table,
+    merge_loci,
+)
+from gwasstudio.utils.tdb_schema import TileDBSchemaCreator
+
+
+def _trait(chrom: list[int], pos: list[int], mlog10p: list[float]) -> pd.DataFrame:
+    n = len(pos)
+    df = pd.DataFrame(
+        {
+            "CHR": np.array(chrom, dtype=np.uint8),
+            "TRAITID": "trait",
+            "POS": np.array(pos, dtype=np.uint32),
+            "BETA": np.full(n, 0.1, dtype=np.float32),
+            "SE": np.full(n, 0.01, dtype=np.float32),
+            "EAF": np.full(n, 0.2, dtype=np.float32),
+            "EA": ["A"] * n,
+            "NEA": ["G"] * n,
+            "MLOG10P": np.array(mlog10p, dtype=np.float32),
+        }
+    )
+    return process_dataframe(df)
+
+
+class TestLocusBreaker(unittest.TestCase):
+    def test_loci_and_intervals(self):
+        df = _trait(
+            chrom=[1, 1, 1, 1, 1, 2, 2],
+            pos=[50000, 120000, 130000, 900000, 950000, 500000, 510000],
+            mlog10p=[4.0, 9.0, 9.0, 6.0, 2.0, 4.0, 4.5],
+        )
+        segments, intervals = _locus_breaker(df, hole_size=250000, locus_flanks=100000)
+
+        # Chromosome 2 has no variant above pvalue_sig; ties pick the first variant
+        self.assertEqual(segments["SNPID"].tolist(), ["1:120000:A:G", "1:900000:A:G"])
+        self.assertEqual(segments["snp_MLOG10P"].tolist(), [9.0, 6.0])
+        self.assertEqual(segments.columns[0], "snp_MLOG10P")
+        self.assertEqual(segments["CHR"].dtype, np.uint8)
+
+        # The first locus starts at 1 because the flank would go below the chromosome start
+        self.assertEqual(intervals["locus"].tolist(), ["1:1:230000"] * 3 + ["1:800000:1000000"])
+        self.assertEqual(intervals["POS"].tolist(), [50000, 120000, 130000, 900000])
+        self.assertNotIn("S", intervals.columns)
+        self.assertEqual(intervals["POS"].dtype, np.int64)
+        self.assertEqual(intervals["MLOG10P"].dtype, np.float64)
+
+    def test_flanks_pull_in_variants_of_neighbouring_segments(self):
+        df = _trait(chrom=[3, 3], pos=[1000000, 1300000], mlog10p=[8.0, 4.0])
+        segments, intervals = _locus_breaker(df, hole_size=250000, locus_flanks=400000)
+
+        self.assertEqual(segments["POS"].tolist(), [1000000])
+        self.assertEqual(intervals["locus"].unique().tolist(), ["3:600000:1400000"])
+        self.assertEqual(intervals["POS"].tolist(), [1000000, 1300000])
+
+    def test_no_significant_locus(self):
+        df = _trait(chrom=[1, 1], pos=[100, 200], mlog10p=[4.0, 4.5])
+        segments, intervals = _locus_breaker(df)
+        self.assertTrue(segments.empty)
+        self.assertTrue(intervals.empty)
+        self.assertEqual(intervals.columns[0], "locus")
+
+    def test_empty_input(self):
+        segments, intervals = _locus_breaker(_trait(chrom=[], pos=[], mlog10p=[]))
+        self.assertTrue(segments.empty)
+        self.assertTrue(intervals.empty)
+
+
+class TestMergeLoci(unittest.TestCase):
+    @staticmethod
+    def _loci(trait, rows):
+        return pd.DataFrame(
+            [(trait, c, s, e, f"{c}:{s}:A:G", p) for c, s, e, p in rows],
+            columns=["TRAITID", "CHR", "START", "END", "SNPID", "MLOG10P"],
+        )
+
+    def test_locus_table(self):
+        df = _trait(chrom=[1, 1, 2], pos=[120000, 900000, 500000], mlog10p=[9.0, 6.0, 8.0])
+        table = locus_table("t1", *_locus_breaker(df, hole_size=250000, locus_flanks=100000))
+        self.assertEqual(table["START"].tolist(), [20000, 800000, 400000])
+        self.assertEqual(table["END"].tolist(), [220000, 1000000, 600000])
+        self.assertEqual(table["SNPID"].tolist(), ["1:120000:A:G", "1:900000:A:G", "2:500000:A:G"])
+        self.assertEqual(table["TRAITID"].unique().tolist(), ["t1"])
+        self.assertTrue(locus_table("t2", *_locus_breaker(_trait(chrom=[], pos=[], mlog10p=[]))).empty)
+
+    def test_overlapping_loci_are_merged_across_traits(self):
+        regions = merge_loci(
+            [
+                # A long locus of t1 covers two loci of t2 that do not overlap each other
+                self._loci("t1", [(1, 100, 1000, 8.0), (2, 100, 200, 6.0)]),
+                self._loci("t2", [(1, 150, 300, 12.0), (1, 900, 1200, 7.0), (1, 1201, 1300, 9.0)]),
+                self._loci("t3", [(2, 200, 400, 7.0)]),
+                self._loci("t4", []),
+            ]
+        )
+        self.assertEqual(regions["REGION"].tolist(), ["1:100:1200", "1:1201:1300", "2:100:400"])
+        self.assertEqual(regions["N_LOCI"].tolist(), [3, 1, 2])
+        self.assertEqual(regions["N_TRAITS"].tolist(), [2, 1, 2])
+        self.assertEqual(regions["TRAITS"].tolist(), ["t1;t2;t2", "t2", "t1;t3"])
+        self.assertEqual(regions["LEAD_SNPS"].iloc[2], "2:100:A:G;2:200:A:G")
+        self.assertEqual(regions["TOP_TRAIT"].tolist(), ["t2", "t2", "t3"])
+        self.assertEqual(regions["TOP_MLOG10P"].tolist(), [12.0, 9.0, 7.0])
+
+    def test_no_loci(self):
+        regions = merge_loci([self._loci("t1", [])])
+        self.assertTrue(regions.empty)
+        self.assertEqual(regions.columns[0], "REGION")
+
+
+class TestTwoPhaseRead(unittest.TestCase):
+    params = dict(maf=0.05, hole_size=250000, pvalue_sig=5, pvalue_limit=3.3, locus_flanks=100000)
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.uri = str(Path(cls.tmpdir.name) / "study")
+        TileDBSchemaCreator(cls.uri, {}, True).create_schema()
+        rng = np.random.default_rng(0)
+        frames = []
+        for trait, peaks in [("signal", [2, 9]), ("null", [])]:
+            n = 2000
+            mlog10p = rng.uniform(0, 3.4, n)
+            mlog10p[[100 * p for p in peaks]] = 12.0
+            frames.append(
+                pd.DataFrame(
+                    {
+                        "CHR": np.repeat(np.array([1, 2], dtype=np.uint8), n // 2),
+                        "TRAITID": trait,
+                        "POS": np.tile(np.arange(1, n // 2 + 1, dtype=np.uint32) * 20000, 2),
+                        "BETA": rng.normal(0, 0.1, n).astype(np.float32),
+                        "SE": np.full(n, 0.01, dtype=np.float32),
+                        "EAF": rng.uniform(0, 1, n).astype(np.float32),
+                        "EA": "A",
+                        "NEA": "G",
+                        "MLOG10P": mlog10p.astype(np.float32),
+                    }
+                )
+            )
+        tiledb.from_pandas(
+            uri=cls.uri, dataframe=pd.concat(frames), index_dims=["CHR", "TRAITID", "POS"], mode="append"
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    def _full_read(self, arr, trait):
+        df = arr.query().df[:, trait, :]
+        df = df[(df["EAF"] >= self.params["maf"]) & (df["EAF"] <= 1 - self.params["maf"])]
+        kwargs = {k: v for k, v in self.params.items() if k != "maf"}
+        return _locus_breaker(process_dataframe(df), **kwargs)
+
+    def test_same_result_as_full_read(self):
+        with tiledb.open(self.uri) as arr:
+            for trait in ["signal", "null"]:
+                expected = self._full_read(arr, trait)
+                result = _process_locusbreaker(arr, trait, phenovar=False, **self.params)
+                for exp, res in zip(expected, result):
+                    pd.testing.assert_frame_equal(res, exp)
+
+    def test_only_locus_windows_are_read(self):
+        with tiledb.open(self.uri) as arr:
+            df = _read_locus_windows(arr, "signal", **self.params)
+            segments, _ = self._full_read(arr, "signal")
+        self.assertEqual(len(segments), 2)
+        self.assertLess(len(df), 200)
+        self.assertTrue((df["MLOG10P"] >= 3.3).all())
+        for chrom, pos in zip(segments["CHR"], segments["POS"]):
+            self.assertIn(pos, df.loc[df["CHR"] == chrom, "POS"].tolist())
@@ -0,0 +1,133 @@
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+import tiledb
+
+from gwasstudio.methods.meta_analysis import (
+    _InverseVarianceAccumulator,
+    _meta_analysis,
+    _meta_analysis_partition,
+    meta_analysis_partitions,
+)
+from gwasstudio.utils.snps import variant_key
+from gwasstudio.utils.tdb_schema import TileDBSchemaCreator
+
+
+def _inverse_variance(betas: np.ndarray, ses: np.ndarray) -> tuple[float, float, float]:
+    """Textbook fixed-effect meta-analysis of one variant: effect, standard error and I²."""
+    weights = 1 / ses**2
+    beta = np.sum(weights * betas) / np.sum(weights)
+    q = np.sum(weights * (betas - beta) ** 2)
+    i_squared = max(0.0, (q - (len(betas) - 1)) / q * 100) if len(betas) > 1 else 0.0
+    return beta, np.sqrt(1 / np.sum(weights)), i_squared
+
+
+class TestInverseVarianceAccumulator(unittest.TestCase):
+    def test_streaming_sums_match_the_closed_form(self):
+        rng = np.random.default_rng(0)
+        betas = rng.normal(size=(5, 3))
+        ses = rng.uniform(0.05, 0.5, size=(5, 3))
+        betas[1, 2] = np.nan  # variant 2 missing from study 1
+
+        accumulator = _InverseVarianceAccumulator()
+        for study in range(5):
+            keys = np.array([30, 10, 20], dtype=np.int64)
+            accumulator.add(keys, betas[study, [2, 0, 1]], ses[study, [2, 0, 1]])
+        result = accumulator.result()
+
+        np.testing.assert_array_equal(result["KEY"], [10, 20, 30])
+        for variant in range(3):
+            present = ~np.isnan(betas[:, variant])
+            beta, se, i_squared = _inverse_variance(betas[present, variant], ses[present, variant])
+            self.assertAlmostEqual(result["BETA"][variant], beta)
+            self.assertAlmostEqual(result["SE"][variant], se)
+            self.assertAlmostEqual(result["I_SQUARED"][variant], i_squared)
+
+    def test_single_study_has_no_heterogeneity(self):
+        accumulator = _InverseVarianceAccumulator()
+        accumulator.add(np.array([1, 2], dtype=np.int64), np.array([0.3, -0.1]), np.array([0.1, 0.2]))
+        result = accumulator.result()
+        np.testing.assert_allclose(result["BETA"], [0.3, -0.1])
+        np.testing.assert_array_equal(result["I_SQUARED"], [0, 0])
+
+
+class TestMetaAnalysis(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.uri = f"{self.tmpdir}/array"
+        TileDBSchemaCreator(self.uri, {}, True).create_schema()
+        studies = {
+            "t1": ([1, 1, 2], [100, 200, 100], ["A", "A", "G"], [0.2, 0.1, -0.3]),
+            "t2": ([1, 1, 2], [100, 200, 5000000], ["A", "T", "G"], [0.4, 0.1, 0.5]),
+        }
+        for trait, (chrom, pos, ea, beta) in studies.items():
+            df = pd.DataFrame(
+                {
+                    "CHR": np.array(chrom, dtype=np.uint8),
+                    "POS": np.array(pos, dtype=np.uint32),
+                    "EA": ea,
+                    "NEA": "C",
+                    "EAF": np.float32(0.2),
+                    "BETA": np.array(beta, dtype=np.float32),
+                    "SE": np.float32(0.1),
+                    "MLOG10P": np.float32(1.0),
+                    "TRAITID": trait,
+                }
+            )
+            tiledb.from_pandas(uri=self.uri, dataframe=df, index_dims=["CHR", "TRAITID", "POS"], mode="append")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_variants_are_aligned_on_position_and_alleles(self):
+        with tiledb.open(self.uri) as arr:
+            result = _meta_analysis(arr, ["t1", "t2"])
+
+        # Sorted by position; alleles at the same position are ordered as first seen
+        self.assertEqual(result["SNP"].str.split(":").str[1].astype(int).tolist(), [100, 200, 200, 100, 5000000])
+        self.assertEqual(sorted(result["SNP"]), ["1:100:A:C", "1:200:A:C", "1:200:T:C", "2:100:G:C", "2:5000000:G:C"])
+        self.assertEqual(result["TRAITID"].unique().tolist(), ["t1_t2"])
+        result = result.set_index("SNP")
+        self.assertAlmostEqual(result.loc["1:100:A:C", "BETA"], 0.3, places=6)
+        self.assertAlmostEqual(result.loc["1:100:A:C", "SE"], 0.1 / np.sqrt(2), places=6)
+        self.assertAlmostEqual(result.loc["1:200:A:C", "BETA"], 0.1, places=6)
+        self.assertAlmostEqual(result.loc["1:200:A:C", "SE"], 0.1, places=6)
+
+    def test_alleles_with_the_same_hash_are_kept_apart(self):
+        # Both pairs have the same 30-bit allele hash in variant_key
+        self.assertEqual(*variant_key(1, [300, 300], ["CTAAA", "GCGTGTGA"], ["A", "A"]))
+        for trait, ea, beta in [("t3", "CTAAA", 0.2), ("t4", "GCGTGTGA", 0.6)]:
+            df = pd.DataFrame(
+                {
+                    "CHR": np.array([1], dtype=np.uint8),
+                    "POS": np.array([300], dtype=np.uint32),
+                    "EA": ea,
+                    "NEA": "A",
+                    "EAF": np.float32(0.2),
+                    "BETA": np.array([beta], dtype=np.float32),
+                    "SE": np.float32(0.1),
+                    "MLOG10P": np.float32(1.0),
+                    "TRAITID": trait,
+                }
+            )
+            tiledb.from_pandas(uri=self.uri, dataframe=df, index_dims=["CHR", "TRAITID", "POS"], mode="append")
+
+        with tiledb.open(self.uri) as arr:
+            result = _meta_analysis_partition(arr, ["t3", "t4"], chrom=1).set_index("SNP")
+        self.assertEqual(sorted(result.index), ["1:300:CTAAA:A", "1:300:GCGTGTGA:A"])
+        self.assertAlmostEqual(result.loc["1:300:CTAAA:A", "BETA"], 0.2, places=6)
+        self.assertAlmostEqual(result.loc["1:300:GCGTGTGA:A", "BETA"], 0.6, places=6)
+
+    def test_region_partitions_give_the_same_result(self):
+        with tiledb.open(self.uri) as arr:
+            by_chromosome = _meta_analysis(arr, ["t1", "t2"])
+            by_region = _meta_analysis(arr, ["t1", "t2"], chunk_size=100000000)
+        pd.testing.assert_frame_equal(by_chromosome, by_region)
+
+    def test_partitions_cover_the_domain(self):
+        self.assertEqual(len(meta_analysis_partitions()), 24)
+        partitions = meta_analysis_partitions(100000000)
+        self.assertEqual(partitions[:3], [(1, 1, 100000000), (1, 100000001, 200000000), (1, 200000001, 250000000)])
@@ -1,16 +1,30 @@
 import json
+import tempfile
 import unittest
 from collections import namedtuple
 from pathlib import Path
+from unittest.mock import patch
 
+import mongomock
 import pandas as pd
+from mongoengine import connect, disconnect, get_connection
+from mongomock.collection import BulkOperationBuilder
 from ruamel.yaml import YAML
 
+from gwasstudio.mongo.indexes import index_status
+from gwasstudio.mongo.models import DataProfile
 from gwasstudio.utils import generate_random_word
 from gwasstudio.utils import lower_and_replace
 from gwasstudio.utils.enums import MetadataEnum
 from gwasstudio.utils.hashing import Hashing
-from gwasstudio.utils.metadata import load_search_topics, load_metadata, process_row
+from gwasstudio.utils.metadata import (
+    dataframe_from_mongo_objs,
+    ingest_metadata,
+    load_search_topics,
+    load_metadata,
+    process_row,
+    projection_fields,
+)
 
 
 class TestLoadSearchTopics(unittest.TestCase):
@@ -180,3 +194,120 @@ class TestLoadSearchTopics(unittest.TestCase):
         # Check if the nested key handling is skipped
         self.assertNotIn("json_field", metadata)
         self.assertEqual(metadata["other_field"], "other_value")
+
+    def test_projection_fields(self):
+        fields = ["project", "data_id", "notes_source_id", "trait.desc", "trait_tissue", "stats_n_variants", "unknown"]
+        self.assertEqual(projection_fields(fields), ["data_id", "notes", "project", "stats", "trait"])
+
+
+class TestDataframeFromMongoObjs(unittest.TestCase):
+    def setUp(self):
+        self.objs = [
+            {"data_id": "d1", "trait": '{"desc": "a", "protein_ids": "P29459|P29460"}', "total": '{"samples": 10}'},
+            {"data_id": "d2", "trait": '{"desc": "b", "protein_ids": "Q1"}', "total": "{}"},
+            {"data_id": "d3", "trait": '{"desc": "c"}'},
+        ]
+
+    def test_columns(self):
+        meta_df = dataframe_from_mongo_objs(["data_id", "trait.desc", "total_samples"], self.objs)
+        self.assertEqual(meta_df.columns.tolist(), ["data_id", "trait_desc", "total_samples"])
+        self.assertEqual(meta_df["trait_desc"].tolist(), ["a", "b", "c"])
+        self.assertEqual(meta_df["total_samples"].tolist()[0], 10)
+        self.assertTrue(meta_df["total_samples"].iloc[1:].isna().all())
+
+    def test_link_id_substring_match(self):
+        search_topics = {"trait": [{"protein_ids": "P29460"}, {"protein_ids": "P29459"}, {"protein_ids": "Q1"}]}
+        meta_df = dataframe_from_mongo_objs(["data_id"], self.objs, search_topics=search_topics)
+        # A row is repeated for each of its matches, in the order of the search
+        self.assertEqual(meta_df["data_id"].tolist(), ["d1", "d1", "d2"])
+        self.assertEqual(meta_df["link_id"].tolist(), ["P29460", "P29459", "Q1"])
+        self.assertEqual(meta_df["trait_protein_ids"].tolist(), ["P29459|P29460", "P29459|P29460", "Q1"])
+
+    def test_link_id_exact_match(self):
+        search_topics = {"trait": [{"protein_ids": "Q1"}]}
+        meta_df = dataframe_from_mongo_objs(["data_id"], self.objs[1:2], search_topics=search_topics, exact_match=True)
+        self.assertEqual(meta_df["link_id"].tolist(), ["Q1"])
+
+
+_add_update = BulkOperationBuilder.add_update
+
+
+def add_update(self, selector, doc, multi, upsert, collation=None, array_filters=None, hint=None, sort=None):
+    """``add_update`` of mongomock, taking the ``sort`` passed by recent pymongo releases (ignored)"""
+    return _add_update(self, selector, doc, multi, upsert, collation=collation, array_filters=array_filters, hint=hint)
+
+
+class TestBulkIngestMetadata(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        connect(
+            "mongoenginetest",
+            host="mongodb://localhost",
+            mongo_client_class=mongomock.MongoClient,
+            uuidRepresentation="standard",
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        disconnect()
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        rows = ["project\tstudy\tfile_path\tcategory\ttrait_desc\tnotes_sex\ttotal_samples"]
+        for i in range(3):
+            path = Path(self.tmpdir.name) / f"trait{i}.tsv"
+            path.write_text(generate_random_word(64))
+            rows.append(f"Project A\tStudy {i % 2}\t{path}\tGWAS\tdesc {i}\tMales\t{100 + i}")
+        self.metadata = Path(self.tmpdir.name) / "metadata.tsv"
+        self.metadata.write_text("\n".join(rows))
+        patchers = [
+            patch("gwasstudio.mongo.models.get_mec", return_value=get_connection()),
+            patch("gwasstudio.utils.metadata.get_mec", return_value=get_connection()),
+            patch.object(BulkOperationBuilder, "add_update", add_update),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        DataProfile.objects().delete()
+        self.tmpdir.cleanup()
+
+    def _documents(self) -> list[dict]:
+        docs = DataProfile.objects().order_by("data_id").exclude("id", "creation_date", "modification_date")
+        return [doc for doc in docs.as_pymongo()]
+
+    def test_bulk_matches_single_saves(self):
+        df = load_metadata(self.metadata)
+        ingest_metadata(df)
+        expected = self._documents()
+        DataProfile.objects().delete()
+
+        counts = ingest_metadata(df, bulk=True, batch_size=2)
+        self.assertEqual(counts, {"inserted": 3, "updated": 0})
+        self.assertEqual(self._documents(), expected)
+        self.assertEqual(json.loads(expected[0]["trait"])["desc"][:5], "desc ")
+
+    def test_bulk_updates_and_keeps_other_fields(self):
+        df = load_metadata(self.metadata)
+        ingest_metadata(df, bulk=True)
+        created = {doc.data_id: doc.creation_date for doc in DataProfile.objects()}
+        DataProfile.objects().update(stats=json.dumps({"n_variants": 10}))
+
+        df["notes_sex"] = "Females"
+        counts = ingest_metadata(df, bulk=True)
+        self.assertEqual(counts, {"inserted": 0, "updated": 3})
+        for doc in DataProfile.objects():
+            self.assertEqual(doc.notes["sex"], "Females")
+            self.assertEqual(doc.stats, {"n_variants": 10})
+            self.assertEqual(doc.creation_date, created[doc.data_id])
+
+    def test_indexes_created_on_request(self):
+        df = load_metadata(self.metadata)
+        ingest_metadata(df, bulk=True)
+        statuses = {index["name"]: index["status"] for index in index_status(DataProfile)}
+        self.assertEqual(statuses["data_id_1_project_1_study_1"], "missing")
+
+        ingest_metadata(df, bulk=True, with_indexes=True)
+        self.addCleanup(DataProfile._get_collection().drop_indexes)
+        self.assertEqual({index["status"] for index in index_status(DataProfile)}, {"present"})
@@ -0,0 +1,86 @@
+import unittest
+
+import mongomock
+from mongoengine import connect, disconnect, get_connection
+
+from gwasstudio.mongo.indexes import create_indexes, index_status, plan_summary
+from gwasstudio.mongo.models import DataProfile, EnhancedDataProfile
+
+COLLSCAN = {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}}
+FETCH = {
+    "queryPlanner": {
+        "winningPlan": {
+            "stage": "FETCH",
+            "inputStage": {"stage": "IXSCAN", "indexName": "_cls_1_project_1_study_1"},
+        }
+    },
+    "executionStats": {"totalKeysExamined": 12, "totalDocsExamined": 12, "nReturned": 10},
+}
+# Plan of the slot-based execution engine
+COVERED = {
+    "queryPlanner": {
+        "winningPlan": {
+            "queryPlan": {
+                "stage": "PROJECTION_COVERED",
+                "inputStage": {"stage": "IXSCAN", "indexName": "data_id_1_project_1_study_1"},
+            }
+        }
+    }
+}
+
+
+class TestIndexes(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        connect(
+            "mongoenginetest",
+            host="mongodb://localhost",
+            mongo_client_class=mongomock.MongoClient,
+            uuidRepresentation="standard",
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        disconnect()
+
+    def tearDown(self):
+        DataProfile._get_collection().drop_indexes()
+
+    def test_create_indexes(self):
+        statuses = {index["name"]: index["status"] for index in index_status(DataProfile)}
+        self.assertEqual(statuses["_cls_1_category_1_project_1_study_1"], "missing")
+        self.assertEqual(statuses["data_id_1_project_1_study_1"], "missing")
+        self.assertEqual(statuses["trait_text"], "missing")
+
+        self.assertGreater(create_indexes(DataProfile), 0)
+        self.assertEqual({index["status"] for index in index_status(DataProfile)}, {"present"})
+        self.assertEqual(create_indexes(DataProfile), 0)
+
+    def test_extra_index(self):
+        DataProfile._get_collection().create_index("notes")
+        statuses = {index["name"]: index["status"] for index in index_status(DataProfile)}
+        self.assertEqual(statuses["notes_1"], "extra")
+
+    def test_text_criterion(self):
+        query, jds = EnhancedDataProfile(mec=get_connection())._search_filter(
+            False, False, {"text": "insulin", "project": "p"}
+        )
+        self.assertIn({"$text": {"$search": "insulin", "$caseSensitive": False}}, query["$and"])
+        self.assertEqual(jds, {})
+
+
+class TestPlanSummary(unittest.TestCase):
+    def test_collection_scan(self):
+        self.assertEqual(plan_summary(COLLSCAN), {"stages": ["COLLSCAN"], "indexes": [], "covered": False})
+
+    def test_index_scan(self):
+        summary = plan_summary(FETCH)
+        self.assertEqual(summary["stages"], ["FETCH", "IXSCAN"])
+        self.assertEqual(summary["indexes"], ["_cls_1_project_1_study_1"])
+        self.assertFalse(summary["covered"])
+        self.assertEqual((summary["keys_examined"], summary["docs_examined"], summary["returned"]), (12, 12, 10))
+
+    def test_covered(self):
+        summary = plan_summary(COVERED)
+        self.assertEqual(summary["stages"], ["PROJECTION_COVERED", "IXSCAN"])
+        self.assertTrue(summary["covered"])
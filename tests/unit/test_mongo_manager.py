@@ -1,8 +1,16 @@
+import socket
 import subprocess
+import sys
+import tempfile
+import time
 import unittest
+from pathlib import Path
 from unittest.mock import patch, MagicMock
 
-from gwasstudio.utils.mongo_manager import MongoDBManager
+from gwasstudio.utils.mongo_manager import MongoDBManager, _cmdline, _is_alive
+
+# Stands for mongod
+SERVER = [sys.executable, "-c", "import time; time.sleep(60)"]
 
 
 class TestMongoDBManager(unittest.TestCase):
@@ -88,3 +96,100 @@ class TestMongoDBManager(unittest.TestCase):
 
         # Assert that the logger was called to indicate the server is stopped
         mock_logger.info.assert_called_with("MongoDB server stopped.")
+
+
+class TestMongoDBDaemon(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dbpath = Path(self.tmpdir.name) / "mongo_db"
+        patchers = [
+            patch.object(
+                MongoDBManager, "_command", return_value=SERVER + ["--dbpath", str(self.dbpath), "--port", "27018"]
+            ),
+            patch.object(MongoDBManager, "ping", return_value=True),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        MongoDBManager(dbpath=self.dbpath, daemon=True).stop_daemon()
+        self.tmpdir.cleanup()
+
+    def test_start_reuse_and_stop(self):
+        manager = MongoDBManager(dbpath=self.dbpath, daemon=True)
+        manager.start()
+        pid = manager.daemon_pid()
+        self.assertTrue(_is_alive(pid))
+        self.assertEqual(manager.pidfile.read_text().split(), [socket.gethostname(), str(pid), "27018"])
+
+        # The next commands reuse the daemon
+        with patch("gwasstudio.utils.mongo_manager.subprocess.Popen") as mock_popen:
+            other = MongoDBManager(dbpath=self.dbpath, daemon=True)
+            other.start()
+            del other
+        mock_popen.assert_not_called()
+        self.assertTrue(_is_alive(pid))
+
+        self.assertTrue(manager.stop_daemon())
+        self.assertFalse(_is_alive(pid))
+        self.assertFalse(manager.pidfile.exists())
+        self.assertFalse(manager.stop_daemon())
+
+    def test_stale_pidfile(self):
+        manager = MongoDBManager(dbpath=self.dbpath, daemon=True)
+        process = subprocess.Popen([sys.executable, "-c", "pass"])
+        process.wait()
+        manager.pidfile.write_text(f"{socket.gethostname()} {process.pid} 27018\n")
+        self.assertIsNone(manager.daemon_pid())
+
+        self.assertFalse(manager.pidfile.exists())
+
+        manager.start()
+        self.assertNotEqual(manager.daemon_pid(), process.pid)
+
+    def test_reused_pid(self):
+        manager = MongoDBManager(dbpath=self.dbpath, daemon=True)
+        # Another process with the pid of a crashed daemon
+        process = subprocess.Popen(SERVER)
+        self.addCleanup(process.wait)
+        self.addCleanup(process.kill)
+        manager.pidfile.write_text(f"{socket.gethostname()} {process.pid} 27018\n")
+        with patch.object(MongoDBManager, "ping", return_value=False):
+            self.assertIsNone(manager.daemon_pid())
+            self.assertFalse(manager.pidfile.exists())
+
+            manager.pidfile.write_text(f"{socket.gethostname()} {process.pid} 27018\n")
+            self.assertFalse(manager.stop_daemon())
+        self.assertIsNone(process.poll())
+
+    def test_daemon_of_another_node(self):
+        manager = MongoDBManager(dbpath=self.dbpath, daemon=True)
+        manager.pidfile.write_text("another-node 1 27018\n")
+        with self.assertRaises(RuntimeError):
+            manager.start()
+        manager.pidfile.unlink()
+
+    def test_not_ready(self):
+        manager = MongoDBManager(dbpath=self.dbpath, daemon=True, timeout=0.2)
+        with patch.object(MongoDBManager, "ping", return_value=False):
+            manager.start()
+        # A slow daemon is kept for the next commands
+        self.assertIsNotNone(manager.daemon_pid())
+
+    def test_reuse_not_ready(self):
+        manager = MongoDBManager(dbpath=self.dbpath, daemon=True)
+        manager.start()
+        # The command line of the daemon is read once it is executed
+        while not _cmdline(manager.daemon_pid()):
+            time.sleep(0.01)
+        with patch.object(MongoDBManager, "ping", return_value=False):
+            with self.assertRaises(RuntimeError):
+                MongoDBManager(dbpath=self.dbpath, daemon=True, timeout=0.2).start()
+
+    def test_failed(self):
+        manager = MongoDBManager(dbpath=self.dbpath, daemon=True, timeout=1)
+        with patch.object(MongoDBManager, "_command", return_value=[sys.executable, "-c", "exit(1)"]):
+            with patch.object(MongoDBManager, "ping", return_value=False):
+                manager.start()
+        self.assertFalse(manager.pidfile.exists())
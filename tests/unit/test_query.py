@@ -1,9 +1,22 @@
 import unittest
+from unittest.mock import patch
 
 import mongomock
 from mongoengine import connect, disconnect, get_connection
 
-from gwasstudio.mongo.models import EnhancedDataProfile, Ancestry, Build
+from mongomock.collection import BulkOperationBuilder
+from mongomock.store import ServerStore
+
+from gwasstudio.mongo.connection_manager import _SharedConnection, close_connection, get_mec
+from gwasstudio.mongo.models import DataProfile, EnhancedDataProfile, Ancestry, Build
+from gwasstudio.utils.metadata import dataframe_from_mongo_objs, migrate_json_fields, query_mongo_obj
+
+_add_update = BulkOperationBuilder.add_update
+
+
+def add_update(self, selector, doc, multi, upsert, collation=None, array_filters=None, hint=None, sort=None):
+    """``add_update`` of mongomock, taking the ``sort`` passed by recent pymongo releases (ignored)"""
+    return _add_update(self, selector, doc, multi, upsert, collation=collation, array_filters=array_filters, hint=hint)
 
 
 class TestEnhancedDataProfileQuery(unittest.TestCase):
@@ -99,3 +112,127 @@ class TestEnhancedDataProfileQuery(unittest.TestCase):
         profiles = EnhancedDataProfile(mec=self.mec).query(tags="tag1")
         self.assertEqual(len(profiles), 1)
         self.assertIn(self.profile1.view(), profiles)
+
+    def test_search_intersects_the_criteria(self):
+        profiles = EnhancedDataProfile(mec=self.mec).search(
+            project="Project2", data_ids=["data_id1", "data_id2", "data_id3"], build=Build.GRCH37
+        )
+        self.assertEqual(profiles, [self.profile3.view()])
+
+    def test_search_by_trait_list(self):
+        trait = [{"desc": "descriptionB", "tissue": "blood"}, {"desc": "descriptionA"}]
+        profiles = EnhancedDataProfile(mec=self.mec).search(trait=trait, data_ids=["data_id1", "data_id2"])
+        self.assertEqual(len(profiles), 2)
+        self.assertIn(self.profile1.view(), profiles)
+        self.assertIn(self.profile2.view(), profiles)
+
+        profiles = EnhancedDataProfile(mec=self.mec).search(trait=[{"desc": "description"}], exact_match=True)
+        self.assertEqual(profiles, [])
+        profiles = EnhancedDataProfile(mec=self.mec).search(trait=[{"desc": "DESCRIPTIONA"}], case_sensitive=True)
+        self.assertEqual(profiles, [])
+
+    def test_query_mongo_obj_fields(self):
+        search = {"project": "project2", "trait": {"tissue": "blood"}}
+        fields = ["project", "data_id", "total_samples"]
+        profiles = query_mongo_obj(search, EnhancedDataProfile(mec=self.mec), fields=fields)
+        # The searched JSON fields are returned too, to check the documents against
+        self.assertEqual([set(p) for p in profiles], [{"_id", "_cls", "project", "data_id", "total", "trait"}])
+        meta_df = dataframe_from_mongo_objs(fields, profiles)
+        self.assertEqual(
+            meta_df.to_dict("records"), [{"project": "project2", "data_id": "data_id2", "total_samples": 20}]
+        )
+
+    def test_query_mongo_obj_matches_query(self):
+        search = {"trait": [{"desc": "descriptionA"}, {"tissue": "blood"}], "project": "project2"}
+        profiles = query_mongo_obj(search, EnhancedDataProfile(mec=self.mec))
+        self.assertEqual(sorted(p["data_id"] for p in profiles), ["data_id2", "data_id3"])
+
+
+class TestEnhancedDataProfileQueryEmbedded(TestEnhancedDataProfileQuery):
+    """The same queries, with the JSON fields stored as embedded documents."""
+
+    def setUp(self) -> None:
+        patcher = patch("gwasstudio.mongo.models.embedded_json", return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super().setUp()
+
+    def test_stored_as_embedded_documents(self):
+        doc = DataProfile._get_collection().find_one({"data_id": "data_id2"})
+        self.assertEqual(doc["trait"], {"desc": "descriptionB", "tissue": "blood"})
+        # The keys are filtered server-side
+        self.assertEqual(DataProfile.objects(__raw__={"trait.tissue": "blood"}).count(), 1)
+
+    def test_modify(self):
+        self.assertTrue(
+            EnhancedDataProfile(mec=self.mec, project="project1", data_id="data_id1").modify(notes={"source_id": "S1"})
+        )
+        profiles = EnhancedDataProfile(mec=self.mec).search(notes={"source_id": "s1"}, exact_match=True)
+        self.assertEqual([p["data_id"] for p in profiles], ["data_id1"])
+
+    def test_dataframe(self):
+        objs = EnhancedDataProfile(mec=self.mec).search(project="project2")
+        meta_df = dataframe_from_mongo_objs(["data_id", "trait_desc", "trait_tissue"], objs)
+        self.assertEqual(meta_df["trait_desc"].tolist(), ["descriptionB", "descriptionA"])
+        self.assertEqual(meta_df["trait_tissue"].tolist()[0], "blood")
+
+
+class TestSearchConnection(unittest.TestCase):
+    """A search in a process without an open connection, as the CLI commands."""
+
+    def setUp(self) -> None:
+        # The data outlive the clients, as on a server
+        store = ServerStore()
+
+        def mock_connect(host, maxPoolSize):
+            return connect(
+                "mongoenginetest",
+                host=host,
+                maxPoolSize=maxPoolSize,
+                mongo_client_class=mongomock.MongoClient,
+                uuidRepresentation="standard",
+                _store=store,
+            )
+
+        disconnect()
+        patchers = [
+            patch("gwasstudio.mongo.connection_manager._shared_connection", _SharedConnection()),
+            patch("gwasstudio.mongo.connection_manager.connect", side_effect=mock_connect),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(disconnect)
+
+    def test_search_opens_the_connection(self):
+        mec = get_mec(uri="mongodb://localhost")
+        with mec:
+            EnhancedDataProfile(
+                mec=mec, project="project1", study="study1", data_id="data_id1", trait="{}", build=Build.GRCH38
+            ).save()
+        close_connection()
+
+        profiles = EnhancedDataProfile(mec=mec).search(project="project1", only=["data_id"])
+        self.assertEqual([p["data_id"] for p in profiles], ["data_id1"])
+
+
+class TestMigrateJsonFields(TestEnhancedDataProfileQuery):
+    def setUp(self) -> None:
+        patcher = patch.object(BulkOperationBuilder, "add_update", add_update)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super().setUp()
+
+    def test_migrate(self):
+        with patch("gwasstudio.utils.metadata.get_mec", return_value=self.mec):
+            self.assertEqual(migrate_json_fields(True), 3)
+            with patch("gwasstudio.mongo.models.embedded_json", return_value=True):
+                profiles = EnhancedDataProfile(mec=self.mec).search(trait={"desc": "descriptionA"}, exact_match=True)
+                self.assertEqual(sorted(p["data_id"] for p in profiles), ["data_id1", "data_id3"])
+            self.assertIn("trait.desc_1", DataProfile._get_collection().index_information())
+            # Already migrated
+            self.assertEqual(migrate_json_fields(True), 0)
+
+            self.assertEqual(migrate_json_fields(False), 3)
+        doc = DataProfile._get_collection().find_one({"data_id": "data_id2"})
+        self.assertEqual(doc["total"], '{"samples": "20"}')
@@ -0,0 +1,98 @@
+from pathlib import Path
+
+import pandas as pd
+import tiledb
+
+from gwasstudio.cli.export import _plan_export
+from gwasstudio.utils.export_plan import cell_bytes, plan_group, suggest_cluster
+from gwasstudio.utils.trait_stats import STATS_PREFIX
+
+from .helpers import IngestedArrayTestCase, make_sumstats
+
+
+class TestExportPlan(IngestedArrayTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ingest()
+
+    def sumstats(self, seed: int) -> pd.DataFrame:
+        return make_sumstats(seed=seed, MLOG10P=1.0)
+
+    def test_cell_bytes(self):
+        with tiledb.open(self.uri) as arr:
+            # CHR, POS, BETA and SE, plus TRAITID and EA as variable-sized values
+            self.assertEqual(cell_bytes(arr.schema, ["BETA", "SE", "EA"]), 1 + 4 + 4 + 4 + 64 + 64)
+
+    def test_whole_traits(self):
+        plan = plan_group(self.uri, {}, self.traits[:2], ["BETA", "SE"])
+        self.assertEqual(plan["TRAITID"].tolist(), self.traits[:2])
+        self.assertEqual(plan["CELLS"].tolist(), [300, 300])
+        self.assertEqual(plan["FRAGMENTS"].tolist(), [1, 1])
+        self.assertEqual(set(plan["SOURCE"]), {"stats"})
+        self.assertEqual(plan["BYTES"].tolist(), [300 * 77, 300 * 77])
+
+    def test_regions(self):
+        # The variants are at 1000, 2000, ..., 100000 on chromosomes 1 to 3
+        regions = pd.DataFrame({"CHR": [1, 4], "START": [1000, 1], "END": [50499, 1000]})
+        plan = plan_group(self.uri, {}, self.traits[:1], None, regions)
+        self.assertEqual(plan["CELLS"].tolist(), [50])
+        self.assertEqual(plan["FRAGMENTS"].tolist(), [1])
+
+        plan = plan_group(self.uri, {}, self.traits[:1], None, regions.iloc[1:])
+        self.assertEqual(plan["CELLS"].tolist(), [0])
+        self.assertEqual(plan["FRAGMENTS"].tolist(), [0])
+
+    def test_without_stats(self):
+        with tiledb.open(self.uri, mode="w") as arr:
+            for trait in self.traits:
+                del arr.meta[f"{STATS_PREFIX}{trait}"]
+        # A single fragment then holds the three traits
+        tiledb.consolidate(self.uri)
+        tiledb.vacuum(self.uri)
+
+        plan = plan_group(self.uri, {}, self.traits, ["BETA"])
+        self.assertEqual(set(plan["SOURCE"]), {"fragments"})
+        self.assertEqual(plan["CELLS"].tolist(), [300, 300, 300])
+        self.assertEqual(plan["FRAGMENTS"].tolist(), [1, 1, 1])
+
+    def test_overlapping_fragments(self):
+        # A fragment of the three traits, then one per trait of a later ingestion
+        tiledb.consolidate(self.uri)
+        tiledb.vacuum(self.uri)
+        self.ingest([self.add_trait(seed) for seed in range(3, 6)], new_array=False)
+
+        plan = plan_group(self.uri, {}, self.traits + ["missing"], ["BETA"])
+        bounds = [frag.nonempty_domain[1] for frag in tiledb.array_fragments(self.uri)]
+        expected = [sum(low <= trait <= high for low, high in bounds) for trait in self.traits + ["missing"]]
+        self.assertEqual(plan["FRAGMENTS"].tolist(), expected)
+        self.assertEqual(plan["FRAGMENTS"].tolist()[-1], 0)
+
+    def test_suggest_cluster(self):
+        # 1 GiB tasks: 4 fit in a 16 GiB worker with 8 threads
+        cluster = suggest_cluster(2**30, 200, 16 * 2**30, 8)
+        self.assertEqual(cluster["task_memory"], 3 * 2**30)
+        self.assertEqual(cluster["tasks_per_worker"], 5)
+        self.assertEqual(cluster["workers"], 10)
+        self.assertEqual(cluster["batch_size"], 50)
+        self.assertTrue(cluster["fits"])
+        self.assertFalse(suggest_cluster(2**30, 10, 2**30, 8)["fits"])
+
+    def test_plan_export(self):
+        meta_df = pd.DataFrame(
+            {"project": "project", "study": ["study", "study", "study", "x"], "data_id": self.traits + ["missing"]}
+        )
+        prefix = str(Path(self.tmpdir.name) / "out")
+        plan = _plan_export(
+            self.tmpdir.name,
+            {},
+            meta_df,
+            {"full_stats": {}, "meta_analysis": {"chunk_size": 0}},
+            "BETA,SE",
+            None,
+            False,
+            0.0,
+            {"memory_per_worker": "4GiB", "cores_per_worker": 2},
+            prefix,
+        )
+        self.assertEqual(len(plan), 3)
+        pd.testing.assert_frame_equal(pd.read_csv(f"{prefix}_plan.csv"), plan, check_dtype=False)
@@ -0,0 +1,102 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import mongomock
+import pandas as pd
+from mongoengine import connect, disconnect, get_connection
+
+from gwasstudio.mongo.models import Ancestry, Build, DataProfile, EnhancedDataProfile
+from gwasstudio.utils.metadata import dataframe_from_mongo_objs
+from gwasstudio.utils.metadata_snapshot import (
+    load_metadata_snapshot,
+    search_metadata_snapshot,
+    write_metadata_snapshot,
+)
+
+SEARCHES = [
+    {"project": "project2"},
+    {"project": "PROJECT1", "tags": "tag2"},
+    {"build": Build.GRCH37},
+    {"population": [Ancestry.ICELANDIC.value]},
+    {"data_ids": ["data_id1", "data_id3", "missing"]},
+    {"trait": [{"desc": "descriptionA"}]},
+    {"trait": [{"desc": "DESCRIPTION"}, {"tissue": "blood"}], "project": "project2"},
+    {"trait": {"tissue": "blood"}, "notes": {"source_id": "gcst"}},
+    {"category": "missing"},
+]
+
+
+class TestMetadataSnapshot(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        connect(
+            "mongoenginetest",
+            host="mongodb://localhost",
+            mongo_client_class=mongomock.MongoClient,
+            uuidRepresentation="standard",
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        disconnect()
+
+    def setUp(self):
+        self.mec = get_connection()
+        profiles = [
+            dict(project="project1", study="study1", data_id="data_id1", tags=["tag1", "tag2"], build=Build.GRCH37),
+            dict(project="project2", study="study2", data_id="data_id2", population=[Ancestry.ICELANDIC.value]),
+            dict(project="project2", study="study3", data_id="data_id3", build=Build.GRCH37),
+        ]
+        traits = ['{"desc": "descriptionA"}', '{"desc": "descriptionB", "tissue": "blood"}', '{"desc": "descriptionA"}']
+        for profile, trait in zip(profiles, traits):
+            EnhancedDataProfile(mec=self.mec, trait=trait, total='{"samples": 10}', **profile).save()
+        EnhancedDataProfile(mec=self.mec, project="project2", data_id="data_id2").modify(notes={"source_id": "GCST1"})
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmpdir.name) / "snapshot.parquet"
+        with patch("gwasstudio.utils.metadata_snapshot.get_mec", return_value=self.mec):
+            self.assertEqual(write_metadata_snapshot(self.path), 3)
+        self.snapshot = load_metadata_snapshot(self.path)
+
+    def tearDown(self):
+        DataProfile.objects().delete()
+        self.tmpdir.cleanup()
+
+    def test_keys_columns(self):
+        self.assertEqual(self.snapshot["trait.tissue"].tolist()[1], "blood")
+        self.assertEqual(self.snapshot["total.samples"].tolist(), ["10", "10", "10"])
+
+    def test_search_matches_mongodb(self):
+        profile = EnhancedDataProfile(mec=self.mec)
+        for search in SEARCHES:
+            for case_sensitive in (False, True):
+                for exact_match in (False, True):
+                    with self.subTest(search=search, case_sensitive=case_sensitive, exact_match=exact_match):
+                        expected = profile.search(case_sensitive, exact_match, **search)
+                        found = search_metadata_snapshot(self.snapshot, search, case_sensitive, exact_match)
+                        self.assertEqual([d["data_id"] for d in found], [d["data_id"] for d in expected])
+
+    def test_records_build_the_same_dataframe(self):
+        fields = [
+            "project",
+            "study",
+            "data_id",
+            "build",
+            "population",
+            "trait_desc",
+            "total_samples",
+            "notes_source_id",
+        ]
+        expected = dataframe_from_mongo_objs(list(fields), EnhancedDataProfile(mec=self.mec).search(study="study2"))
+        found = dataframe_from_mongo_objs(list(fields), search_metadata_snapshot(self.snapshot, {"study": "study2"}))
+        pd.testing.assert_frame_equal(found, expected)
+
+    def test_text(self):
+        found = search_metadata_snapshot(self.snapshot, {"text": "descriptionb other"})
+        self.assertEqual([d["data_id"] for d in found], ["data_id2"])
+        self.assertEqual(search_metadata_snapshot(self.snapshot, {"text": "description"}), [])
+
+    def test_no_criteria(self):
+        self.assertEqual(search_metadata_snapshot(self.snapshot, None), [])
@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+from pathlib import Path
+
+import pandas as pd
+import tiledb
+
+from gwasstudio.cli.export import _export_phewas
+from gwasstudio.cli.ingest import ingest_to_fs
+from gwasstudio.methods.extraction_methods import extract_phewas
+from gwasstudio.utils.phewas import backfill_phewas_index, has_phewas_index, phewas_uri, resolve_phewas_index
+from gwasstudio.utils.tdb_schema import TileDBSchemaCreator
+
+from .helpers import IngestedArrayTestCase
+
+
+class TestPhewasIndex(IngestedArrayTestCase):
+    def _ingest(self, phewas_index: bool = True, new_array: bool = True) -> bool:
+        if new_array:
+            TileDBSchemaCreator(self.uri, {}, True).create_schema()
+        phewas_index = resolve_phewas_index(self.uri, {}, phewas_index, new_array, True)
+        self.ingest(new_array=False, phewas_index=phewas_index)
+        return phewas_index
+
+    def _read(self, uri: str) -> pd.DataFrame:
+        columns = ["CHR", "TRAITID", "POS", "BETA", "SE", "EAF", "EA", "NEA", "MLOG10P"]
+        return self.read(uri, columns, by=("CHR", "POS", "TRAITID"))
+
+    def test_ingest_fills_the_index(self):
+        self.assertTrue(self._ingest())
+        with tiledb.open(phewas_uri(self.uri)) as arr:
+            self.assertEqual([dim.name for dim in arr.schema.domain], ["CHR", "POS", "TRAITID"])
+        pd.testing.assert_frame_equal(self._read(phewas_uri(self.uri)), self._read(self.uri))
+        # The index is inside the array, not listed among the datasets
+        datasets = []
+        tiledb.ls(self.tmpdir.name, lambda uri, kind: datasets.append((Path(uri).name, kind)))
+        self.assertEqual(datasets, [("project_study", "array")])
+
+    def test_ingest_consolidates_the_index(self):
+        ctx = SimpleNamespace(obj={"dask": {"deployment": None}})
+        stats = ingest_to_fs(ctx, self.files, self.uri, True, phewas_index=True)
+        self.assertEqual(sorted(stats), sorted(self.traits))
+        # One fragment per trait in the array, a single one in the index
+        self.assertEqual(len(tiledb.array_fragments(self.uri)), 3)
+        self.assertEqual(len(tiledb.array_fragments(phewas_uri(self.uri))), 1)
+        pd.testing.assert_frame_equal(self._read(phewas_uri(self.uri)), self._read(self.uri))
+
+    def test_backfill(self):
+        TileDBSchemaCreator(self.uri, {}, True).create_schema()
+        self.assertFalse(self._ingest(new_array=False))
+        self.assertFalse(has_phewas_index(self.uri, {}))
+
+        self.assertEqual(backfill_phewas_index(self.uri, {}, chunk_size=50_000), 900)
+        pd.testing.assert_frame_equal(self._read(phewas_uri(self.uri)), self._read(self.uri))
+        self.assertEqual(len(tiledb.array_fragments(phewas_uri(self.uri))), 1)
+        # Later ingestions keep the index up to date
+        self.assertTrue(resolve_phewas_index(self.uri, {}, False, False, True))
+
+    def test_lookup_with_and_without_index(self):
+        self._ingest()
+        snps = pd.DataFrame({"CHR": [1, 3, 3], "START": [2000, 5000, 99000], "END": [2001, 5001, 99001]})
+        regions = pd.DataFrame({"CHR": [2, 2], "START": [0, 9500], "END": [3000, 10000]})
+        traits = self.traits[:2]
+        for query in [snps, regions]:
+            with tiledb.open(self.uri) as arr, tiledb.open(phewas_uri(self.uri)) as index:
+                expected = extract_phewas(arr, traits, query, attributes=["BETA", "SE", "EA", "NEA", "MLOG10P"])
+                result = extract_phewas(index, traits, query, attributes=["BETA", "SE", "EA", "NEA", "MLOG10P"])
+            pd.testing.assert_frame_equal(result, expected)
+            self.assertEqual(set(result["TRAITID"]), set(traits))
+            self.assertEqual(result.columns[0], "SNPID")
+        self.assertEqual(result["POS"].tolist(), [1000, 1000, 2000, 2000, 3000, 3000, 10000, 10000])
+
+    def test_export(self):
+        self._ingest()
+        meta_df = pd.DataFrame(
+            {
+                "project": "project",
+                "study": "study",
+                "data_id": self.traits,
+                "trait": ["a", "b", "c"],
+                "output_prefix": "x",
+            }
+        )
+        bed = Path(self.tmpdir.name) / "snps.csv"
+        bed.write_text("CHR,POS\n1,2000\nchr2,3000\n")
+        prefix = str(Path(self.tmpdir.name) / "out")
+        _export_phewas(self.tmpdir.name, {}, meta_df, str(bed), "BETA,SE,EA,NEA,MLOG10P", prefix, "csv", False)
+
+        df = pd.read_csv(f"{prefix}_phewas.csv")
+        self.assertEqual(len(df), 6)
+        self.assertEqual(sorted(df["meta_trait"].unique()), ["a", "b", "c"])
+        self.assertNotIn("meta_output_prefix", df.columns)
@@ -0,0 +1,33 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from gwasstudio.utils.snps import key_chrom, key_pos, variant_key
+
+
+class TestVariantKey(unittest.TestCase):
+    def test_chromosome_and_position_are_packed_exactly(self):
+        keys = variant_key([1, 23, 24], [1, 123456, 250000000], ["A", "AT", "G"], ["C", "A", "T"])
+        self.assertEqual(keys.dtype, np.int64)
+        self.assertTrue((keys > 0).all())
+        np.testing.assert_array_equal(key_chrom(keys), [1, 23, 24])
+        np.testing.assert_array_equal(key_pos(keys), [1, 123456, 250000000])
+
+    def test_keys_sort_by_chromosome_then_position(self):
+        chrom = [2, 1, 1, 10]
+        pos = [5, 200, 100, 1]
+        keys = variant_key(chrom, pos, ["A"] * 4, ["C"] * 4)
+        self.assertEqual(np.argsort(keys).tolist(), [2, 1, 0, 3])
+
+    def test_alleles_are_part_of_the_key(self):
+        keys = variant_key([1, 1, 1, 1], [100] * 4, ["A", "C", "A", "A"], ["C", "A", "C", "G"])
+        self.assertEqual(keys[0], keys[2])
+        self.assertEqual(len(set(keys.tolist())), 3)
+
+    def test_accepts_series_and_is_deterministic(self):
+        df = pd.DataFrame({"CHR": np.uint8([1]), "POS": np.uint32([10]), "EA": ["A"], "NEA": ["G"]})
+        self.assertEqual(
+            variant_key(df["CHR"], df["POS"], df["EA"], df["NEA"])[0],
+            variant_key([1], [10], np.array(["A"]), np.array(["G"]))[0],
+        )
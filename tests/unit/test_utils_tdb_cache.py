@@ -0,0 +1,99 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+import tiledb
+
+from gwasstudio.utils.tdb_cache import FragmentCache
+from gwasstudio.utils.tdb_pool import TileDBArrayPool, is_remote_uri
+from gwasstudio.utils.tdb_schema import TileDBSchemaCreator
+
+from .helpers import append_trait
+
+
+class TestFragmentCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.uri = f"{self.tmpdir}/array"
+        TileDBSchemaCreator(self.uri, {}, True).create_schema()
+        for trait in ("t1", "t2", "t3"):
+            append_trait(self.uri, trait)
+        self.ctx = tiledb.Ctx()
+        self.cache_dir = Path(self.tmpdir) / "cache"
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_reads_only_fragments_of_requested_traits(self):
+        cache = FragmentCache(self.cache_dir, max_bytes=10**9)
+        with cache.open(self.uri, self.ctx, "t2") as arr:
+            df = arr.query().df[:]
+        self.assertEqual(df["TRAITID"].unique().tolist(), ["t2"])
+        self.assertEqual(len(df), 10)
+
+        with cache.open(self.uri, self.ctx, ["t1", "t3"]) as arr:
+            df = arr.query().df[:]
+        self.assertEqual(sorted(df["TRAITID"].unique()), ["t1", "t3"])
+
+    def test_hits_and_misses(self):
+        cache = FragmentCache(self.cache_dir, max_bytes=10**9)
+        with cache.open(self.uri, self.ctx, "t1"):
+            pass
+        misses = cache.stats()["misses"]
+        self.assertGreater(misses, 0)
+        self.assertEqual(cache.stats()["hits"], 0)
+
+        with cache.open(self.uri, self.ctx, "t1") as arr:
+            self.assertEqual(len(arr.query().df[:, "t1", :]), 10)
+        self.assertEqual(cache.stats()["misses"], misses)
+        self.assertEqual(cache.stats()["hits"], misses)
+
+    def test_cache_is_shared_through_the_directory(self):
+        with FragmentCache(self.cache_dir, max_bytes=10**9).open(self.uri, self.ctx, "t1"):
+            pass
+        other = FragmentCache(self.cache_dir, max_bytes=10**9)
+        with other.open(self.uri, self.ctx, "t1"):
+            pass
+        self.assertEqual(other.stats()["misses"], 0)
+
+    def test_eviction_keeps_the_cache_bounded(self):
+        cache = FragmentCache(self.cache_dir, max_bytes=1)
+        with cache.open(self.uri, self.ctx, "t1") as arr:
+            # Entries in use are not evicted
+            self.assertEqual(len(arr.query().df[:]), 10)
+        self.assertGreater(cache.stats()["evictions"], 0)
+        self.assertEqual(list((self.cache_dir / "entries").glob("*.json")), [])
+
+        with cache.open(self.uri, self.ctx, "t1") as arr:
+            self.assertEqual(len(arr.query().df[:]), 10)
+
+    def test_new_fragments_are_picked_up(self):
+        cache = FragmentCache(self.cache_dir, max_bytes=10**9)
+        with cache.open(self.uri, self.ctx, "t4") as arr:
+            self.assertEqual(len(arr.query().df[:]), 0)
+        append_trait(self.uri, "t4")
+        with cache.open(self.uri, self.ctx, "t4") as arr:
+            self.assertEqual(len(arr.query().df[:]), 10)
+
+
+class TestArrayPoolWithCache(unittest.TestCase):
+    def test_is_remote_uri(self):
+        self.assertTrue(is_remote_uri("s3://bucket/array"))
+        self.assertFalse(is_remote_uri("/data/array"))
+        self.assertFalse(is_remote_uri("file:///data/array"))
+
+    def test_local_arrays_bypass_the_cache(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            uri = f"{tmpdir}/array"
+            TileDBSchemaCreator(uri, {}, True).create_schema()
+            append_trait(uri, "t1")
+            cache = FragmentCache(Path(tmpdir) / "cache", max_bytes=10**9)
+            pool = TileDBArrayPool(cache=cache)
+            with pool.open(uri, {}, traits="t1") as arr:
+                self.assertEqual(len(arr.query().df[:]), 10)
+            self.assertEqual(cache.stats(), {"hits": 0, "misses": 0, "evictions": 0})
+            pool.close()
+        finally:
+            shutil.rmtree(tmpdir)
@@ -0,0 +1,83 @@
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+
+from gwasstudio.utils.tdb_pool import TileDBArrayPool, TileDBPoolPlugin, config_hash, get_array_pool
+from gwasstudio.utils.tdb_schema import TileDBSchemaCreator
+
+from .helpers import append_trait
+
+
+class TestTileDBArrayPool(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.uris = [f"{self.tmpdir}/array_{i}" for i in range(3)]
+        for uri in self.uris:
+            TileDBSchemaCreator(uri, {}, True).create_schema()
+            append_trait(uri, "trait1")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_config_hash_is_order_independent(self):
+        self.assertEqual(config_hash({"a": 1, "b": "2"}), config_hash({"b": 2, "a": "1"}))
+        self.assertNotEqual(config_hash({"a": 1}), config_hash({"a": 2}))
+
+    def test_handle_and_ctx_are_reused(self):
+        pool = TileDBArrayPool()
+        with pool.open(self.uris[0], {}) as first:
+            pass
+        with pool.open(self.uris[0], {}) as second:
+            self.assertIs(first, second)
+            self.assertTrue(second.isopen)
+        self.assertIs(pool.ctx({}), first.ctx)
+        pool.close()
+
+    def test_lru_eviction_closes_idle_handles(self):
+        pool = TileDBArrayPool(max_handles=2)
+        handles = []
+        for uri in self.uris:
+            with pool.open(uri, {}) as arr:
+                handles.append(arr)
+        self.assertFalse(handles[0].isopen)
+        self.assertTrue(handles[1].isopen)
+        self.assertTrue(handles[2].isopen)
+        pool.close()
+
+    def test_eviction_waits_for_handles_in_use(self):
+        pool = TileDBArrayPool(max_handles=1)
+        with pool.open(self.uris[0], {}) as busy:
+            with pool.open(self.uris[1], {}):
+                self.assertTrue(busy.isopen)
+            self.assertEqual(len(busy.query().df[:, "trait1", :]), 10)
+        self.assertFalse(busy.isopen)
+        pool.close()
+
+    def test_new_fragments_trigger_reopen(self):
+        pool = TileDBArrayPool(fragment_check_interval=0)
+        with pool.open(self.uris[0], {}) as arr:
+            self.assertEqual(len(arr.query().df[:]), 10)
+        append_trait(self.uris[0], "trait2")
+        with pool.open(self.uris[0], {}) as arr:
+            self.assertEqual(len(arr.query().df[:]), 20)
+        pool.close()
+
+    def test_thread_pools_sized_on_worker_threads(self):
+        pool = TileDBArrayPool(nthreads=3)
+        self.assertEqual(pool.ctx({}).config()["sm.compute_concurrency_level"], "3")
+        user_cfg = {"sm.io_concurrency_level": "8"}
+        self.assertEqual(pool.ctx(user_cfg).config()["sm.io_concurrency_level"], "8")
+
+
+class TestTileDBPoolPlugin(unittest.TestCase):
+    def test_setup_and_teardown(self):
+        plugin = TileDBPoolPlugin(max_handles=4)
+        plugin.setup(SimpleNamespace(state=SimpleNamespace(nthreads=2)))
+        self.assertEqual(plugin.pool.max_handles, 4)
+        self.assertEqual(plugin.pool.nthreads, 2)
+        plugin.teardown(None)
+
+    def test_get_array_pool_outside_worker(self):
+        self.assertIsInstance(get_array_pool(), TileDBArrayPool)
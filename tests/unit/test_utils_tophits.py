@@ -0,0 +1,73 @@
+from pathlib import Path
+
+import pandas as pd
+import tiledb
+
+from gwasstudio.cli.export import _route_to_tophits
+from gwasstudio.utils.tdb_schema import TileDBSchemaCreator
+from gwasstudio.utils.tophits import (
+    backfill_tophits,
+    get_tophits_threshold,
+    resolve_tophits_threshold,
+    select_tophits,
+    tophits_uri,
+)
+
+from .helpers import IngestedArrayTestCase
+
+
+class TestTopHits(IngestedArrayTestCase):
+    n_traits = 2
+
+    def _ingest(self, ingest_pval: bool = True, tophits_thr: float | None = 5.0, new_array: bool = True):
+        if new_array:
+            TileDBSchemaCreator(self.uri, {}, ingest_pval).create_schema()
+        threshold = resolve_tophits_threshold(self.uri, {}, tophits_thr, new_array)
+        self.ingest(ingest_pval=ingest_pval, new_array=False, tophits_thr=threshold)
+        return threshold
+
+    def test_ingest_fills_the_top_hits_array(self):
+        self.assertEqual(self._ingest(), 5.0)
+        self.assertEqual(get_tophits_threshold(self.uri, {}), 5.0)
+        full = self.read(self.uri)
+        hits = self.read(tophits_uri(self.uri))
+        self.assertGreater(len(hits), 0)
+        pd.testing.assert_frame_equal(hits, full[full["MLOG10P"] > 5.0].reset_index(drop=True))
+        # The companion array is inside the array, not listed among the datasets
+        datasets = []
+        tiledb.ls(self.tmpdir.name, lambda uri, kind: datasets.append((Path(uri).name, kind)))
+        self.assertEqual(datasets, [("project_study", "array")])
+
+    def test_existing_array_needs_a_backfill(self):
+        TileDBSchemaCreator(self.uri, {}, True).create_schema()
+        self.assertIsNone(self._ingest(new_array=False))
+        self.assertIsNone(get_tophits_threshold(self.uri, {}))
+
+        backfill_tophits(self.uri, {}, 4.0, chunk_size=100_000_000)
+        full = self.read(self.uri)
+        pd.testing.assert_frame_equal(
+            self.read(tophits_uri(self.uri)), full[full["MLOG10P"] > 4.0].reset_index(drop=True)
+        )
+        # Later ingestions keep the companion array up to date with its own threshold
+        self.assertEqual(resolve_tophits_threshold(self.uri, {}, 6.0, False), 4.0)
+        self.assertEqual(resolve_tophits_threshold(self.uri, {}, None, False), 4.0)
+
+    def test_backfill_computes_the_pvalues(self):
+        self._ingest(ingest_pval=False, tophits_thr=None)
+        self.assertEqual(backfill_tophits(self.uri, {}, 3.0), len(select_tophits(self.read(self.uri), 3.0)))
+        hits = self.read(tophits_uri(self.uri))
+        self.assertTrue((hits["MLOG10P"] > 3.0).all())
+
+        # A second backfill replaces the array
+        backfill_tophits(self.uri, {}, 8.0)
+        self.assertEqual(get_tophits_threshold(self.uri, {}), 8.0)
+        self.assertTrue((self.read(tophits_uri(self.uri))["MLOG10P"] > 8.0).all())
+
+    def test_export_routing(self):
+        self._ingest()
+        full_stats = {"full_stats": {}}
+        self.assertEqual(_route_to_tophits(self.uri, {}, full_stats, 5.0), tophits_uri(self.uri))
+        self.assertEqual(_route_to_tophits(self.uri, {}, full_stats, 7.3), tophits_uri(self.uri))
+        self.assertEqual(_route_to_tophits(self.uri, {}, full_stats, 4.0), self.uri)
+        self.assertEqual(_route_to_tophits(self.uri, {}, {**full_stats, "locusbreaker": {}}, 7.3), self.uri)
+        self.assertEqual(_route_to_tophits(f"{self.uri}_other", {}, full_stats, 7.3), f"{self.uri}_other")
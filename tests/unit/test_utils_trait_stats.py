@@ -0,0 +1,82 @@
+import json
+import unittest
+from unittest.mock import patch
+
+import mongomock
+import pandas as pd
+from mongoengine import connect, disconnect, get_connection
+
+from gwasstudio.mongo.models import DataProfile, EnhancedDataProfile
+from gwasstudio.utils.metadata import dataframe_from_mongo_objs, ingest_trait_stats
+from gwasstudio.utils.trait_stats import compute_trait_stats, read_trait_stats
+
+from .helpers import IngestedArrayTestCase, make_sumstats
+
+
+def _sumstats() -> pd.DataFrame:
+    return make_sumstats(
+        5,
+        CHR=[1, 1, 1, 2, 2],
+        POS=[100, 5000, 900, 20, 70],
+        SE=0.1,
+        BETA=[0.0, 0.1, -0.2, 0.6, 1.0],
+        MLOG10P=[0.0, 0.5, 1.3, 8.0, 22.0],
+    )
+
+
+class TestComputeTraitStats(unittest.TestCase):
+    def test_stats(self):
+        stats = compute_trait_stats(_sumstats())
+        self.assertEqual(stats["n_variants"], 5)
+        self.assertEqual(stats["pos_range"], {"1": [100, 5000], "2": [20, 70]})
+        self.assertAlmostEqual(stats["max_mlog10p"], 22.0)
+        self.assertAlmostEqual(stats["min_pvalue"], 1e-22)
+        # median chi2 of z = [0, 1, -2, 6, 10]
+        self.assertAlmostEqual(stats["lambda_gc"], 4.0 / 0.454936423119572, places=5)
+        self.assertEqual(stats["n_significant"], 2)
+
+    def test_stats_without_mlog10p(self):
+        stats = compute_trait_stats(_sumstats().drop(columns="MLOG10P"))
+        self.assertEqual(stats["n_significant"], 2)
+        self.assertGreater(stats["max_mlog10p"], 8.0)
+        json.dumps(stats, allow_nan=False)
+
+
+class TestIngestTraitStats(IngestedArrayTestCase):
+    n_traits = 1
+
+    @classmethod
+    def setUpClass(cls):
+        connect(
+            "mongoenginetest",
+            host="mongodb://localhost",
+            mongo_client_class=mongomock.MongoClient,
+            uuidRepresentation="standard",
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        disconnect()
+
+    def tearDown(self):
+        DataProfile.objects().delete()
+        super().tearDown()
+
+    def sumstats(self, seed: int) -> pd.DataFrame:
+        return _sumstats()
+
+    def test_stats_in_tiledb_and_mongo(self):
+        [(trait_id, stats)] = self.ingest()
+        self.assertEqual(trait_id, self.traits[0])
+        self.assertEqual(read_trait_stats(self.uri, {}), {trait_id: stats})
+
+        with patch("gwasstudio.mongo.models.get_mec", return_value=get_connection()):
+            EnhancedDataProfile(project="project", study="study", data_id=trait_id).save()
+            updated = ingest_trait_stats({"project": "project", "study": "study"}, {trait_id: stats, "missing": stats})
+        self.assertEqual(updated, 1)
+
+        objs = list(DataProfile.objects(data_id=trait_id).as_pymongo())
+        meta_df = dataframe_from_mongo_objs(["data_id", "stats_n_variants", "stats_lambda_gc", "stats_pos_range"], objs)
+        self.assertEqual(meta_df.loc[0, "stats_n_variants"], 5)
+        self.assertAlmostEqual(meta_df.loc[0, "stats_lambda_gc"], stats["lambda_gc"])
+        self.assertEqual(meta_df.loc[0, "stats_pos_range"], {"1": [100, 5000], "2": [20, 70]})